@@ -0,0 +1,311 @@
+"""
+Benchmark of the hot lookup indexes (migration 6_20261019130000_update).
+
+Fills a scratch MySQL database with a generated catalog, then measures the
+handlers of /story, /item, /series/lookup, /latest and /story_submissions
+and the query plans of their queries, first without the indexes (migration
+downgraded) and then with them. It also lists the indexes that the foreign
+keys of stories.series_id and series_tags_rel.tag_id can use at each step,
+to check what the downgrade leaves behind.
+
+BENCHMARK_DATABASE_NAME names an existing scratch database. Its chatficdb
+tables are dropped and recreated, so it must not be the application's
+database. The other connection settings come from the usual DATABASE_*
+variables.
+
+Usage:
+    BENCHMARK_DATABASE_NAME=chatficdb_benchmark \\
+        python benchmarks/index_benchmark.py --series 20000 --stories 200000
+"""
+import argparse
+import asyncio
+import copy
+import importlib.util
+import os
+import random
+import statistics
+import string
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tortoise import Tortoise, connections  # noqa: E402
+
+import settings  # noqa: E402
+from database import models  # noqa: E402
+
+MIGRATION_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "migrations", "models", "6_20261019130000_update.py"
+)
+USERNAMES = [f"user{number}" for number in range(500)]
+# Foreign key columns that are the first column of a migration 6 index:
+FOREIGN_KEY_COLUMNS = (("stories", "series_id"), ("series_tags_rel", "tag_id"))
+# Children first, for the foreign keys:
+TABLES = ("submission_events", "story_submissions", "series_tags_rel",
+          "stories", "series", "tags")
+
+
+def _global_id() -> str:
+    return "".join(random.choices(string.ascii_letters + string.digits, k=16))
+
+
+def _load_migration():
+    spec = importlib.util.spec_from_file_location("index_migration",
+                                                  MIGRATION_PATH)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration
+
+
+async def _run_statements(db, script: str) -> None:
+    for statement in script.split(";"):
+        if statement.strip():
+            await db.execute_script(statement)
+
+
+async def init_database(database: str) -> None:
+    config = copy.deepcopy(settings.TORTOISE_CONFIG)
+    config["connections"]["default"]["credentials"]["database"] = database
+    config["apps"]["models"]["models"] = ["database.models"]
+    await Tortoise.init(config=config)
+    db = connections.get("default")
+    for table in TABLES:
+        await db.execute_script(f"DROP TABLE IF EXISTS `{table}`")
+    await Tortoise.generate_schemas()
+
+
+async def populate(db, num_series: int, num_stories: int,
+                   num_submissions: int, num_tags: int) -> dict:
+    now = datetime.now()
+    await db.execute_many(
+        "INSERT INTO `tags` (`tag`) VALUES (%s)",
+        [[f"tag{number}"] for number in range(num_tags)]
+    )
+    series_ids = [_global_id() for _ in range(num_series)]
+    await db.execute_many(
+        "INSERT INTO `series` (`name`, `seriesGlobalId`, `creator`,"
+        " `episodes`) VALUES (%s, %s, %s, %s)",
+        [[f"Series {number}", series_ids[number], random.choice(USERNAMES), 0]
+         for number in range(num_series)]
+    )
+    await db.execute_many(
+        "INSERT INTO `series_tags_rel` (`series_id`, `tag_id`)"
+        " VALUES (%s, %s)",
+        [[series, tag]
+         for series in range(1, num_series + 1)
+         for tag in random.sample(range(1, num_tags + 1), 3)]
+    )
+
+    story_ids = [_global_id() for _ in range(num_stories)]
+    rows = []
+    for number in range(num_stories):
+        # Mostly released stories, some scheduled for the coming weeks:
+        release_date = now + timedelta(
+            minutes=random.randint(-365 * 24 * 60, 21 * 24 * 60)
+        )
+        rows.append([
+            f"Episode {number}", "Description", "Author",
+            random.choice(USERNAMES), story_ids[number],
+            random.randint(1, num_series), release_date, False
+        ])
+        if len(rows) == 5000:
+            await _insert_stories(db, rows)
+            rows = []
+    if rows:
+        await _insert_stories(db, rows)
+
+    rows = [
+        [f"Submission {number}", random.choice(USERNAMES),
+         random.randint(1, num_series),
+         now - timedelta(minutes=random.randint(0, 365 * 24 * 60)),
+         60, random.choice([None, random.randint(1, num_stories)])]
+        for number in range(num_submissions)
+    ]
+    await db.execute_many(
+        "INSERT INTO `story_submissions` (`title`, `username`, `series_id`,"
+        " `submission_date`, `status`, `story_id`)"
+        " VALUES (%s, %s, %s, %s, %s, %s)",
+        rows
+    )
+    return {"series_ids": series_ids, "story_ids": story_ids,
+            "num_tags": num_tags}
+
+
+async def _insert_stories(db, rows) -> None:
+    await db.execute_many(
+        "INSERT INTO `stories` (`title`, `description`, `author`,"
+        " `username`, `storyGlobalId`, `series_id`, `release_date`,"
+        " `exclude_from_rss`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+        rows
+    )
+
+
+def cases(data: dict) -> dict:
+    """
+    Handler calls of each endpoint, and the queryset whose plan is shown.
+    """
+    from endpoints import stories
+    from endpoints.submissions import filter_submissions
+
+    def random_story():
+        return random.choice(data["story_ids"])
+
+    def random_tags(count):
+        return random.sample(range(1, data["num_tags"] + 1), count)
+
+    async def story_submissions():
+        query = filter_submissions(random.choice(USERNAMES), "all", None)
+        await query.count()
+        await query.offset(0).limit(11)
+
+    return {
+        "/story": (
+            lambda: stories.get_story(storyGlobalId=random_story()),
+            lambda: models.Story.filter(storyGlobalId=random_story(),
+                                        release_date__lte=datetime.now())
+        ),
+        "/item": (
+            lambda: stories.check_item_exists(
+                item_id=random.choice(data["series_ids"])
+            ),
+            lambda: models.Series.filter(
+                seriesGlobalId=random.choice(data["series_ids"])
+            )
+        ),
+        "/series/lookup": (
+            lambda: stories.lookup_series_by_stories(
+                story_ids=[random_story() for _ in range(20)]
+            ),
+            lambda: models.Story.filter(
+                storyGlobalId__in=[random_story() for _ in range(20)]
+            )
+        ),
+        "/latest": (
+            lambda: stories.get_latest_series(offset=0, exclude_tags=None,
+                                              include_tags=None),
+            lambda: models.Series.filter(
+                stories__release_date__lt=datetime.now()
+            ).order_by("-idseries").distinct().limit(10)
+        ),
+        "/latest (tags)": (
+            lambda: stories.get_latest_series(
+                offset=0, exclude_tags=random_tags(1),
+                include_tags=random_tags(2)
+            ),
+            None
+        ),
+        "/story_submissions": (
+            story_submissions,
+            lambda: filter_submissions(random.choice(USERNAMES), "all",
+                                       None).limit(11)
+        ),
+    }
+
+
+async def measure(benchmark_cases: dict, runs: int) -> dict:
+    results = {}
+    for name, (call, plan_query) in benchmark_cases.items():
+        timings = []
+        for _ in range(runs):
+            started_at = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                # 404s of /item and 403s of /story are expected.
+                pass
+            timings.append((time.perf_counter() - started_at) * 1000)
+        timings.sort()
+        plan = []
+        if plan_query:
+            plan = await connections.get("default").execute_query_dict(
+                f"EXPLAIN {plan_query().sql()}"
+            )
+        results[name] = {
+            "p50": statistics.median(timings),
+            "p95": timings[int(len(timings) * 0.95) - 1],
+            "plan": [
+                f"{row.get('table')}:{row.get('type')}"
+                f"/{row.get('key') or '-'}/{row.get('rows')}"
+                for row in plan
+            ],
+        }
+    return results
+
+
+async def foreign_key_indexes(db) -> list[str]:
+    """
+    The indexes starting with a column of FOREIGN_KEY_COLUMNS.
+    """
+    rows = await db.execute_query_dict(
+        "SELECT `TABLE_NAME`, `INDEX_NAME`, `COLUMN_NAME`"
+        " FROM information_schema.STATISTICS"
+        " WHERE `TABLE_SCHEMA` = DATABASE() AND `SEQ_IN_INDEX` = 1"
+    )
+    return sorted(
+        f"{row['TABLE_NAME']}.{row['COLUMN_NAME']}: {row['INDEX_NAME']}"
+        for row in rows
+        if (row["TABLE_NAME"], row["COLUMN_NAME"]) in FOREIGN_KEY_COLUMNS
+    )
+
+
+def report(without_indexes: dict, with_indexes: dict,
+           key_indexes: dict) -> None:
+    print(f"{'endpoint':<20}{'p50 before':>12}{'p50 after':>12}"
+          f"{'p95 before':>12}{'p95 after':>12}")
+    for name, before in without_indexes.items():
+        after = with_indexes[name]
+        print(f"{name:<20}{before['p50']:>10.2f}ms{after['p50']:>10.2f}ms"
+              f"{before['p95']:>10.2f}ms{after['p95']:>10.2f}ms")
+    print("\nQuery plans (table:access type/key/estimated rows):")
+    for name, before in without_indexes.items():
+        if before["plan"]:
+            print(f"{name}\n  before: {', '.join(before['plan'])}"
+                  f"\n  after:  {', '.join(with_indexes[name]['plan'])}")
+    print("\nIndexes usable by the foreign keys:")
+    for step, indexes in key_indexes.items():
+        print(f"  {step}: {', '.join(indexes) or 'none'}")
+
+
+async def main(args) -> None:
+    database = os.getenv("BENCHMARK_DATABASE_NAME")
+    if not database or database == settings.DATABASE_SETTINGS["database"]:
+        sys.exit("Set BENCHMARK_DATABASE_NAME to a scratch database name.")
+
+    await init_database(database)
+    db = connections.get("default")
+    try:
+        print("Generating data...")
+        data = await populate(db, args.series, args.stories,
+                              args.submissions, args.tags)
+        migration = _load_migration()
+        benchmark_cases = cases(data)
+        key_indexes = {"created": await foreign_key_indexes(db)}
+
+        await _run_statements(db, await migration.downgrade(db))
+        key_indexes["downgraded"] = await foreign_key_indexes(db)
+        await db.execute_script("ANALYZE TABLE `series`, `stories`,"
+                                " `series_tags_rel`, `story_submissions`")
+        without_indexes = await measure(benchmark_cases, args.runs)
+
+        await _run_statements(db, await migration.upgrade(db))
+        key_indexes["upgraded"] = await foreign_key_indexes(db)
+        await db.execute_script("ANALYZE TABLE `series`, `stories`,"
+                                " `series_tags_rel`, `story_submissions`")
+        with_indexes = await measure(benchmark_cases, args.runs)
+
+        report(without_indexes, with_indexes, key_indexes)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--series", type=int, default=20000)
+    parser.add_argument("--stories", type=int, default=200000)
+    parser.add_argument("--submissions", type=int, default=100000)
+    parser.add_argument("--tags", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
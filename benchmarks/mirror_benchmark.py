@@ -0,0 +1,146 @@
+"""
+Benchmark of the catalog mirror (database/mirror.py) against MySQL.
+
+Fills a scratch MySQL database with a generated catalog (like
+index_benchmark.py), then measures the read-only catalog handlers first on
+MySQL and then on the in-memory mirror, and prints their p50 and p99.
+
+BENCHMARK_DATABASE_NAME names an existing scratch database. Its chatficdb
+tables are dropped and recreated, so it must not be the application's
+database. The other connection settings come from the usual DATABASE_*
+variables.
+
+Usage:
+    BENCHMARK_DATABASE_NAME=chatficdb_benchmark \\
+        python benchmarks/mirror_benchmark.py --series 5000 --stories 50000
+"""
+import argparse
+import asyncio
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tortoise import Tortoise, connections  # noqa: E402
+
+import settings  # noqa: E402
+from database.mirror import catalog_mirror  # noqa: E402
+from index_benchmark import TABLES, populate  # noqa: E402
+
+
+async def init_databases(database: str) -> None:
+    config = copy.deepcopy(settings.TORTOISE_CONFIG)
+    config["connections"]["default"]["credentials"]["database"] = database
+    config["connections"].pop("read", None)
+    config["connections"][settings.MIRROR_CONNECTION_NAME] = {
+        "engine": "tortoise.backends.sqlite",
+        "credentials": {"file_path": ":memory:", "foreign_keys": "OFF"},
+    }
+    config["routers"] = ["database.routing.ReadReplicaRouter"]
+    config["apps"]["models"]["models"] = ["database.models"]
+    settings.READ_CONNECTION_NAME = "default"
+    await Tortoise.init(config=config)
+    db = connections.get("default")
+    for table in TABLES + ("catalog_changes",):
+        await db.execute_script(f"DROP TABLE IF EXISTS `{table}`")
+    await Tortoise.generate_schemas()
+
+
+def cases(data: dict) -> dict:
+    from endpoints import stories
+
+    def random_story():
+        return random.choice(data["story_ids"])
+
+    return {
+        "/story": lambda: stories.get_story(storyGlobalId=random_story()),
+        "/stories": lambda: stories.get_stories(
+            page=random.randint(1, 20), seriesGlobalId=None,
+            from_series_of_story=None, sort_by="-date", tags_required=[],
+            include_upcoming=0, authorization=None, username=None
+        ),
+        "/stories (series)": lambda: stories.get_stories(
+            page=1, seriesGlobalId=random.choice(data["series_ids"]),
+            from_series_of_story=None, sort_by="date", tags_required=[],
+            include_upcoming=0, authorization=None, username=None
+        ),
+        "/series": lambda: stories.get_series(
+            page=random.randint(1, 20), storyGlobalId=None, sort_by="new",
+            tags_required=["tag1"], include_drafts=False, authorization=None,
+            creator=None
+        ),
+        "/latest": lambda: stories.get_latest_series(
+            offset=random.randint(0, 50), exclude_tags=None, include_tags=None
+        ),
+        "/series/lookup": lambda: stories.lookup_series_by_stories(
+            story_ids=[random_story() for _ in range(20)]
+        ),
+    }
+
+
+async def measure(benchmark_cases: dict, runs: int) -> dict:
+    results = {}
+    for name, call in benchmark_cases.items():
+        timings = []
+        for _ in range(runs):
+            started_at = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                # 403s of /story are expected.
+                pass
+            timings.append((time.perf_counter() - started_at) * 1000)
+        timings.sort()
+        results[name] = {
+            "p50": timings[len(timings) // 2],
+            "p99": timings[max(int(len(timings) * 0.99) - 1, 0)],
+        }
+    return results
+
+
+def report(mysql: dict, mirror: dict, load_seconds: float) -> None:
+    print(f"Mirror loaded in {load_seconds:.2f}s\n")
+    print(f"{'endpoint':<20}{'p50 mysql':>12}{'p50 mirror':>12}"
+          f"{'p99 mysql':>12}{'p99 mirror':>12}")
+    for name, before in mysql.items():
+        after = mirror[name]
+        print(f"{name:<20}{before['p50']:>10.2f}ms{after['p50']:>10.2f}ms"
+              f"{before['p99']:>10.2f}ms{after['p99']:>10.2f}ms")
+
+
+async def main(args) -> None:
+    database = os.getenv("BENCHMARK_DATABASE_NAME")
+    if not database or database == settings.DATABASE_SETTINGS["database"]:
+        sys.exit("Set BENCHMARK_DATABASE_NAME to a scratch database name.")
+
+    await init_databases(database)
+    try:
+        print("Generating data...")
+        data = await populate(connections.get("default"), args.series,
+                              args.stories, args.submissions, args.tags)
+        benchmark_cases = cases(data)
+
+        mysql = await measure(benchmark_cases, args.runs)
+
+        started_at = time.perf_counter()
+        await catalog_mirror.create_schema()
+        await catalog_mirror.full_sync()
+        load_seconds = time.perf_counter() - started_at
+        mirror = await measure(benchmark_cases, args.runs)
+
+        report(mysql, mirror, load_seconds)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--series", type=int, default=5000)
+    parser.add_argument("--stories", type=int, default=50000)
+    parser.add_argument("--submissions", type=int, default=10000)
+    parser.add_argument("--tags", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
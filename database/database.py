@@ -1,4 +1,6 @@
-from tortoise import Tortoise, run_async
+import logging
+
+from tortoise import Tortoise, connections, run_async
 
 import settings
 
@@ -13,3 +15,17 @@ async def init():
 
 def run():
     run_async(init())
+
+
+async def prewarm_connection_pools():
+    """
+    Open the connection pools at startup, instead of on the first requests.
+
+    The first query creates the pool (tortoise creates it lazily), which
+    opens DATABASE_POOL_MINSIZE connections.
+    """
+    for name in connections.db_config:
+        try:
+            await connections.get(name).execute_query("SELECT 1")
+        except Exception as e:
+            logging.error(f"Couldn't open the {name} connection pool: {e}")
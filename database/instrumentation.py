@@ -0,0 +1,186 @@
+"""
+Query instrumentation for the Tortoise MySQL client.
+
+Every query of the application (ORM generated or RawSQL) goes through one of
+the execute_* methods of tortoise's MySQLClient, or of its TransactionWrapper
+inside transactions. instrument_mysql_client() wraps those methods once per
+process to:
+- time each query for the Prometheus metrics,
+- send queries slower than SLOW_QUERY_THRESHOLD_MS to the slow query log,
+  with the endpoint that ran them, and capture the EXPLAIN output of slow
+  SELECTs once per query shape when SLOW_QUERY_EXPLAIN is on,
+- retry SELECTs that fail with a transient connection error (dropped
+  connection, "Packet sequence number wrong"), with backoff, up to
+  DATABASE_READ_RETRIES times. Only reads outside of transactions are
+  retried: they are idempotent, and nothing else ran on their connection.
+It also records how long requests wait for a pool connection and how much of
+the pool is in use.
+
+execute_query_dict is left alone, it calls execute_query.
+"""
+import asyncio
+import logging
+import random
+import time
+from functools import wraps
+
+from tortoise.backends.base.client import PoolConnectionWrapper
+from tortoise.backends.mysql.client import MySQLClient, TransactionWrapper, \
+    errors as mysql_errors
+from tortoise.exceptions import DBConnectionError, OperationalError
+
+from helpers.metrics import DB_QUERY_RETRIES, current_request_stats, \
+    record_pool_usage, record_query
+from helpers.slow_queries import record_slow_query, store_explain
+from settings import DATABASE_READ_RETRIES, SLOW_QUERY_EXPLAIN, \
+    SLOW_QUERY_THRESHOLD_MS
+
+_INSTRUMENTED_METHODS = (
+    (MySQLClient, "execute_insert"),
+    (MySQLClient, "execute_many"),
+    (MySQLClient, "execute_query"),
+    (MySQLClient, "execute_script"),
+    (TransactionWrapper, "execute_many"),
+)
+# Queries run outside of a request (startup, background tasks):
+BACKGROUND_ENDPOINT = "background"
+
+# Client errors: server has gone away, lost connection during query, lost
+# connection at handshake.
+TRANSIENT_MYSQL_ERROR_CODES = {2006, 2013, 2055}
+TRANSIENT_ERROR_MESSAGES = ("Packet sequence number wrong",)
+RETRY_BACKOFF_SECONDS = 0.1
+
+_uninstrumented_execute_query = MySQLClient.execute_query
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def _explain(client, query: str, values) -> None:
+    # A transaction may be over by now, explain on the pool instead:
+    client = getattr(client, "_parent", client)
+    try:
+        _, plan = await _uninstrumented_execute_query(
+            client, f"EXPLAIN {query}", values
+        )
+    except Exception as e:
+        logging.error(f"Couldn't explain slow query: {e}")
+        return
+    await asyncio.to_thread(store_explain, query, plan)
+
+
+async def _handle_slow_query(client, query: str, values, elapsed_ms: float,
+                             endpoint: str) -> None:
+    needs_explain = await asyncio.to_thread(
+        record_slow_query, query, elapsed_ms, endpoint
+    )
+    if needs_explain and SLOW_QUERY_EXPLAIN and _is_read(query):
+        await _explain(client, query, values)
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """
+    Whether a query failed because of its connection rather than because
+    of the query, so running it again on another connection can succeed.
+    """
+    if isinstance(exc, (DBConnectionError, ConnectionError,
+                        asyncio.IncompleteReadError,
+                        mysql_errors.InterfaceError)):
+        return True
+    if isinstance(exc, OperationalError):
+        cause = exc.args[0] if exc.args else None
+        code = getattr(cause, "args", (None,))[0] if cause else None
+        if code in TRANSIENT_MYSQL_ERROR_CODES:
+            return True
+        return any(message in str(exc) for message in TRANSIENT_ERROR_MESSAGES)
+    return False
+
+
+def _is_read(query: str) -> bool:
+    return query.lstrip(" (").upper().startswith("SELECT")
+
+
+def _retried(method):
+    @wraps(method)
+    async def retried(self, query, *args, **kwargs):
+        if isinstance(self, TransactionWrapper) or not _is_read(query):
+            return await method(self, query, *args, **kwargs)
+        for attempt in range(DATABASE_READ_RETRIES + 1):
+            try:
+                return await method(self, query, *args, **kwargs)
+            except Exception as e:
+                if attempt == DATABASE_READ_RETRIES \
+                        or not is_transient_error(e):
+                    raise
+                DB_QUERY_RETRIES.labels(type(e).__name__).inc()
+                logging.warning(
+                    f"Retrying query after transient error (attempt "
+                    f"{attempt + 1}): {e}"
+                )
+                # Exponential backoff with jitter, so the workers don't
+                # reconnect in lockstep:
+                await asyncio.sleep(
+                    RETRY_BACKOFF_SECONDS * 2 ** attempt
+                    * random.uniform(0.5, 1.5)
+                )
+
+    retried.__instrumented__ = True
+    return retried
+
+
+def _timed(method):
+    @wraps(method)
+    async def timed(self, query, *args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return await method(self, query, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            record_query(query, elapsed)
+            if elapsed * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+                stats = current_request_stats()
+                endpoint = stats.endpoint if stats else BACKGROUND_ENDPOINT
+                values = args[0] if args else kwargs.get("values")
+                # Logged off the request path:
+                task = asyncio.create_task(_handle_slow_query(
+                    self, query, values, elapsed * 1000, endpoint
+                ))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+
+    timed.__instrumented__ = True
+    return timed
+
+
+def _instrument_pool(wrapper_class) -> None:
+    enter = wrapper_class.__aenter__
+    exit_ = wrapper_class.__aexit__
+
+    async def __aenter__(self):
+        started_at = time.perf_counter()
+        connection = await enter(self)
+        record_pool_usage(self.client.connection_name, self.pool,
+                          time.perf_counter() - started_at)
+        return connection
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await exit_(self, exc_type, exc_val, exc_tb)
+        record_pool_usage(self.client.connection_name, self.pool)
+
+    __aenter__.__instrumented__ = True
+    wrapper_class.__aenter__ = __aenter__
+    wrapper_class.__aexit__ = __aexit__
+
+
+def instrument_mysql_client() -> None:
+    for client_class, name in _INSTRUMENTED_METHODS:
+        method = client_class.__dict__[name]
+        if getattr(method, "__instrumented__", False):
+            continue
+        method = _timed(method)
+        if name == "execute_query":
+            method = _retried(method)
+        setattr(client_class, name, method)
+
+    if not getattr(PoolConnectionWrapper.__aenter__, "__instrumented__",
+                   False):
+        _instrument_pool(PoolConnectionWrapper)
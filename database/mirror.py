@@ -0,0 +1,223 @@
+"""
+Per-worker in-memory read mirror of the catalog.
+
+With CATALOG_MIRROR_ENABLED, every gunicorn worker keeps a copy of the
+series, stories, tags and series_tags_rel tables in an in-memory SQLite
+database (the "mirror" tortoise connection). Once the first copy is loaded,
+ReadReplicaRouter sends the reads of read_only handlers on these models to
+the mirror, so the catalog endpoints run the same ORM queries without a
+network round trip.
+
+The mirror is refreshed every CATALOG_MIRROR_REFRESH_SECONDS from the
+catalog change log (helpers/catalog_changes.py) and from the highest
+idseries and idstory it has, and it is copied in full every FULL_SYNC_SECONDS
+to pick up edits and deletes made outside of the API. It is read from the
+read replica when there is one.
+
+Reads that must see a write of the same request (read_from_primary) and
+MySQL specific raw SQL (skip_mirror) still go to MySQL. The text columns
+of the mirror are created with COLLATE NOCASE, so equality filters, IN
+lookups and ordering ignore case like MySQL's default collation does (for
+ASCII letters only, SQLite doesn't fold other characters).
+
+Classes:
+- CatalogMirror
+
+Functions:
+- start_catalog_mirror / stop_catalog_mirror: Start and stop the refresh
+  task of the worker.
+"""
+import asyncio
+import logging
+import time
+
+from tortoise import connections
+
+import settings
+from database.models import CatalogChange, Series, SeriesTagsRel, Story, Tag
+from helpers.catalog_changes import SERIES_TAGS, STORY
+
+MIRRORED_MODELS = (Series, Tag, SeriesTagsRel, Story)
+FULL_SYNC_SECONDS = 3600
+SYNC_CHUNK_SIZE = 1000
+
+
+def _columns(model) -> list[str]:
+    return list(model._meta.fields_db_projection)
+
+
+class CatalogMirror:
+
+    def __init__(self):
+        self.ready = False
+        # Last catalog change applied to the mirror:
+        self.seq = 0
+        self._max_series_id = 0
+        self._max_story_id = 0
+        self._synced_at = 0.0
+        self._task: asyncio.Task | None = None
+
+    def serves(self, model) -> bool:
+        return self.ready and model in MIRRORED_MODELS
+
+    @staticmethod
+    def _source():
+        return connections.get(settings.READ_CONNECTION_NAME)
+
+    @staticmethod
+    def _mirror():
+        return connections.get(settings.MIRROR_CONNECTION_NAME)
+
+    async def create_schema(self) -> None:
+        client = self._mirror()
+        base_generator = client.schema_generator
+
+        class MirrorSchemaGenerator(base_generator):
+            def _get_models_to_create(self, models_to_create) -> None:
+                models_to_create.extend(MIRRORED_MODELS)
+
+            def _create_string(self, db_column, field_type, *args,
+                               **kwargs) -> str:
+                if field_type.startswith(("VARCHAR", "TEXT")):
+                    field_type += " COLLATE NOCASE"
+                return super()._create_string(db_column, field_type, *args,
+                                              **kwargs)
+
+        generator = MirrorSchemaGenerator(client)
+        await generator.generate_from_string(
+            generator.get_create_schema_sql(safe=True)
+        )
+
+    async def _copy(self, model, rows: list[dict]) -> None:
+        pk = model._meta.db_pk_column
+        for start in range(0, len(rows), SYNC_CHUNK_SIZE):
+            await model.bulk_create(
+                [model(**row) for row in rows[start:start + SYNC_CHUNK_SIZE]],
+                on_conflict=[pk],
+                update_fields=[column for column in _columns(model)
+                               if column != pk],
+                using_db=self._mirror()
+            )
+
+    async def _copy_where(self, model, **filters) -> None:
+        rows = await model.filter(**filters).using_db(
+            self._source()
+        ).values(*_columns(model))
+        await self._copy(model, rows)
+
+    async def full_sync(self) -> None:
+        """
+        Copy the catalog tables and drop the rows deleted from MySQL.
+        """
+        seqs = await CatalogChange.all().using_db(self._source()).order_by(
+            "-seq"
+        ).limit(1).values_list("seq", flat=True)
+        for model in MIRRORED_MODELS:
+            pk = model._meta.pk_attr
+            rows = await model.all().using_db(self._source()).values(
+                *_columns(model)
+            )
+            await self._copy(model, rows)
+            deleted = set(await model.all().using_db(
+                self._mirror()
+            ).values_list(pk, flat=True)) - {row[pk] for row in rows}
+            if deleted:
+                await model.filter(**{f"{pk}__in": list(deleted)}).using_db(
+                    self._mirror()
+                ).delete()
+            if model is Series:
+                self._max_series_id = max(
+                    (row[pk] for row in rows), default=0
+                )
+            elif model is Story:
+                self._max_story_id = max((row[pk] for row in rows), default=0)
+        self.seq = seqs[0] if seqs else 0
+        self._synced_at = time.monotonic()
+        self.ready = True
+
+    async def refresh(self) -> None:
+        """
+        Apply the catalog changes and copy the rows created since the last
+        refresh.
+        """
+        if time.monotonic() - self._synced_at >= FULL_SYNC_SECONDS:
+            await self.full_sync()
+            return
+
+        changes = await CatalogChange.filter(seq__gt=self.seq).using_db(
+            self._source()
+        ).order_by("seq").values("seq", "kind", "entity_id")
+        series_ids = {change["entity_id"] for change in changes
+                      if change["kind"] != STORY}
+        story_ids = {change["entity_id"] for change in changes
+                     if change["kind"] == STORY}
+        tags_changed = {change["entity_id"] for change in changes
+                        if change["kind"] == SERIES_TAGS}
+
+        stories = await Story.filter(idstory__gt=self._max_story_id).using_db(
+            self._source()
+        ).values("idstory", "series_id")
+        story_ids.update(story["idstory"] for story in stories)
+        series_ids.update(story["series_id"] for story in stories)
+        new_series = await Series.filter(
+            idseries__gt=self._max_series_id
+        ).using_db(self._source()).values_list("idseries", flat=True)
+        series_ids.update(new_series)
+
+        if series_ids:
+            await self._copy_where(Series, idseries__in=series_ids)
+        if story_ids:
+            await self._copy_where(Story, idstory__in=story_ids)
+        if tags_changed:
+            await self._copy_where(Tag)
+            await SeriesTagsRel.filter(series_id__in=tags_changed).using_db(
+                self._mirror()
+            ).delete()
+            await self._copy_where(SeriesTagsRel,
+                                   series_id__in=tags_changed)
+
+        if changes:
+            self.seq = changes[-1]["seq"]
+        self._max_story_id = max(story_ids | {self._max_story_id})
+        self._max_series_id = max(set(new_series) | {self._max_series_id})
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            try:
+                if self.ready:
+                    await self.refresh()
+                else:
+                    await self.create_schema()
+                    await self.full_sync()
+                    logging.info("Catalog mirror loaded")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The mirror serves its last copy until the next refresh.
+                logging.error(f"Couldn't refresh the catalog mirror: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.ready = False
+
+
+catalog_mirror = CatalogMirror()
+
+
+def start_catalog_mirror(interval: float) -> None:
+    catalog_mirror.start(interval)
+
+
+async def stop_catalog_mirror() -> None:
+    await catalog_mirror.stop()
@@ -107,6 +107,7 @@ class Series(Model):
 
     class Meta:
         table = "series"
+        indexes = (("seriesGlobalId",),)
 
     class PydanticMeta:
         computed = ["numStories", "tagList"]
@@ -122,6 +123,8 @@ class SeriesTagsRel(Model):
 
     class Meta:
         table = "series_tags_rel"
+        # Tag filters of /series, /stories and /latest start from the tag:
+        indexes = (("tag_id", "series_id"),)
 
 
 SeriesTagsRel_Pydantic = pydantic_model_creator(SeriesTagsRel,
@@ -159,14 +162,49 @@ class StorySubmission(Model):
     status = fields.IntEnumField(SubmissionStatus,
                                  default=SubmissionStatus.WAITING_VALIDATION,
                                  null=False)
+    # No longer written, processing steps are recorded as SubmissionEvent
+    # rows. Kept for the logs of older submissions.
     logs = fields.TextField(null=True)
     story = fields.ForeignKeyField('models.Story', related_name='submission', null=True)
 
     class Meta:
         table = "story_submissions"
+        indexes = (("username", "submission_date"), ("storyGlobalId",))
 
 
 
+class SubmissionEvent(Model):
+    """
+    Represents one step in the processing of a story submission.
+
+    Rows are only ever inserted, so recording a step is a cheap insert instead
+    of rewriting the submission's logs column. They also keep per-stage
+    timings for latency statistics.
+
+    Attributes:
+        submission (ForeignKeyRelation): The submission this event belongs to.
+        stage (str): Processing stage, e.g. "preprocess", "upload",
+            "postprocess".
+        status (SubmissionStatus | None): The submission's status after this
+            step, None for informational events.
+        message (str | None): Log message of this step.
+        duration_ms (int | None): How long the step took, in milliseconds.
+        created_at (datetime): When the step finished.
+    """
+    id = fields.BigIntField(pk=True)
+    submission = fields.ForeignKeyField('models.StorySubmission',
+                                        related_name='events')
+    stage = fields.CharField(max_length=32)
+    status = fields.IntEnumField(SubmissionStatus, null=True)
+    message = fields.TextField(null=True)
+    duration_ms = fields.IntField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "submission_events"
+        indexes = (("submission_id", "created_at"), ("stage", "created_at"))
+
+
 class Story(Model):
     """
     Represents a story in the database.
@@ -192,6 +230,12 @@ class Story(Model):
 
     class Meta:
         table = "stories"
+        indexes = (
+            ("storyGlobalId", "release_date"),
+            ("release_date",),
+            # Published stories of a series (/latest, /series, /stories):
+            ("series_id", "release_date"),
+        )
 
 
 Story_Pydantic = pydantic_model_creator(Story, name="Story")
@@ -207,6 +251,37 @@ class Tag(Model):
         table = "tags"
 
 
+class CatalogChange(Model):
+    """
+    One change of the public catalog, for the incremental sync API.
+
+    Rows are only ever inserted by the write paths (and by the periodic
+    release task), so aggregators can follow the catalog by asking for the
+    changes after the last seq they have seen.
+
+    Attributes:
+        seq (int): Change sequence, increases with every change.
+        kind (str): "series", "story" or "series_tags".
+        op (str): "created", "updated", "released" or "published".
+        entity_id (int): idseries of series and series_tags changes, idstory
+            of story changes.
+        global_id (str | None): seriesGlobalId or storyGlobalId of the entity.
+        created_at (datetime): When the change was recorded.
+        dedupe_key (str | None): Changes with the same key are recorded once,
+            e.g. the release of a story.
+    """
+    seq = fields.BigIntField(pk=True)
+    kind = fields.CharField(max_length=16)
+    op = fields.CharField(max_length=16)
+    entity_id = fields.IntField()
+    global_id = fields.CharField(max_length=45, null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    dedupe_key = fields.CharField(max_length=64, null=True, unique=True)
+
+    class Meta:
+        table = "catalog_changes"
+
+
 Series_Pydantic = pydantic_model_creator(Series,
                                          name="Series")
 SeriesIn_Pydantic = pydantic_model_creator(Series,
@@ -225,6 +300,12 @@ Tortoise.init_models(["database.models"], "models")
 # https://tortoise.github.io/contrib/pydantic.html#relations-early-init
 
 SeriesWithRels_Pydantic = pydantic_model_creator(Series, name="SeriesWithRels")
+# For the catalog responses, which don't return the submissions. These can
+# be read from the catalog mirror (database/mirror.py), which doesn't hold
+# them:
+SeriesCatalog_Pydantic = pydantic_model_creator(Series, name="SeriesCatalog",
+                                                exclude=("submissions",
+                                                         "stories.submission"))
 
 Story_Submission_Pydantic = pydantic_model_creator(StorySubmission,
                                                    name="StorySubmission")
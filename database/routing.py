@@ -0,0 +1,86 @@
+"""
+Read replica routing.
+
+When a read replica is configured (DATABASE_READ_HOST), tortoise asks
+ReadReplicaRouter which connection each query should use. Reads go to the
+replica only inside handlers decorated with read_only, everything else
+(writes, the huey tasks, and reads that must see a write that just
+happened) stays on the primary.
+
+Without a replica READ_CONNECTION_NAME is "default" and read_only changes
+nothing.
+
+With the catalog mirror (CATALOG_MIRROR_ENABLED, see database/mirror.py),
+the reads of read_only handlers on the mirrored models go to the worker's
+in-memory copy once it is loaded, unless the handler calls read_from_primary
+or skip_mirror.
+
+Classes:
+- ReadReplicaRouter: Tortoise router, registered in settings.TORTOISE_CONFIG.
+
+Functions:
+- read_only: Decorator routing the reads of a handler to the replica.
+- read_from_primary: Send the remaining reads of the current handler to the
+  primary, e.g. when a user lists their own drafts.
+- skip_mirror: Send the remaining reads of the current handler to MySQL, e.g.
+  for MySQL specific raw SQL.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+import settings
+from database.mirror import catalog_mirror
+
+_read_from_replica: ContextVar[bool] = ContextVar(
+    "read_from_replica", default=False
+)
+_read_from_mirror: ContextVar[bool] = ContextVar(
+    "read_from_mirror", default=True
+)
+
+
+class ReadReplicaRouter:
+
+    def db_for_read(self, model):
+        if _read_from_replica.get():
+            if _read_from_mirror.get() and catalog_mirror.serves(model):
+                return settings.MIRROR_CONNECTION_NAME
+            return settings.READ_CONNECTION_NAME
+        # None falls back to the model's default connection (the primary).
+        return None
+
+    def db_for_write(self, model):
+        return None
+
+
+def read_only(func):
+    """
+    Route the reads of an async handler to the read replica.
+    """
+    @wraps(func)
+    async def wrapped(*args, **kwargs):
+        token = _read_from_replica.set(True)
+        mirror_token = _read_from_mirror.set(True)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _read_from_mirror.reset(mirror_token)
+            _read_from_replica.reset(token)
+
+    return wrapped
+
+
+def read_from_primary() -> None:
+    """
+    Route the remaining reads of the current read_only handler to the
+    primary.
+    """
+    _read_from_replica.set(False)
+
+
+def skip_mirror() -> None:
+    """
+    Route the remaining reads of the current read_only handler to MySQL (the
+    replica when there is one) instead of the catalog mirror.
+    """
+    _read_from_mirror.set(False)
@@ -0,0 +1,78 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from pydantic.types import NonNegativeInt
+from starlette.responses import StreamingResponse
+
+from endpoints.response_models import CatalogChangeModel, \
+    CatalogChangesResponse
+from helpers.auth import enforce_specific_username_or_admin
+from helpers.catalog_changes import get_changes
+from helpers.catalog_export import export_catalog, gzip_stream
+
+router = APIRouter()
+
+
+@router.get(
+    "/changes", response_model=CatalogChangesResponse, tags=["catalog"]
+)
+# Not read_only: a replica can show a change after higher ones, and the
+# cursor must not move past it (see get_changes).
+async def get_catalog_changes(
+        since: NonNegativeInt = Query(
+            0, description="Cursor of the previous response, 0 for all"
+                           " changes"
+        ),
+        limit: int = Query(500, ge=1, le=1000),
+) -> CatalogChangesResponse:
+    """
+    Changes of the catalog (series created or published, series tags
+    updated, stories released) after a cursor, oldest first.
+
+    Aggregators keep the cursor of the last response and only fetch the
+    entities that changed since, instead of crawling /series and /stories.
+    Changes of draft series are left out. A series gets a "published"
+    change with its first released story, fetch the whole series then.
+    """
+    try:
+        changes, cursor, has_more = await get_changes(since, limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail="Error fetching catalog changes"
+        ) from e
+    return CatalogChangesResponse(
+        changes=[
+            CatalogChangeModel(
+                seq=change.seq, kind=change.kind, op=change.op,
+                entity_id=change.entity_id, global_id=change.global_id,
+                created_at=change.created_at
+            ) for change in changes
+        ],
+        cursor=cursor,
+        has_more=has_more
+    )
+
+
+@router.get("/export", tags=["catalog"])
+async def export_full_catalog(
+        authorization: Optional[str] = Header(
+            None, convert_underscores=False
+        ),
+        accept_encoding: Optional[str] = Header(None),
+):
+    """
+    Every published series with its tags and released stories, one JSON
+    object per line (NDJSON), gzip compressed unless the client doesn't
+    accept gzip. Admin only.
+
+    Follow /changes afterwards to stay up to date.
+    """
+    enforce_specific_username_or_admin(authorization, None)
+    headers = {"Content-Disposition": 'attachment; filename="catalog.ndjson"'}
+    stream = export_catalog()
+    if accept_encoding and "gzip" in accept_encoding:
+        stream = gzip_stream(stream)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        stream, media_type="application/x-ndjson", headers=headers
+    )
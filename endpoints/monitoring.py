@@ -0,0 +1,117 @@
+import asyncio
+import os
+from secrets import compare_digest
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from starlette.responses import FileResponse, Response
+
+import settings
+from endpoints.response_models import ProfileListResponse, \
+    SlowQueryListResponse, SlowQueryShape
+from helpers.auth import enforce_specific_username_or_admin
+from helpers.metrics import render_metrics
+from helpers.profiling import PROFILE_ID_PATTERN
+from helpers.slow_queries import get_slow_queries, clear_slow_queries, \
+    SLOW_QUERY_ORDERS
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(
+        authorization: Optional[str] = Header(None, convert_underscores=False)
+):
+    """
+    Prometheus metrics of all gunicorn workers and the huey consumer. Needs
+    the METRICS_AUTH_TOKEN or the admin token.
+    """
+    if not (settings.METRICS_AUTH_TOKEN and authorization and compare_digest(
+            authorization.encode(),
+            f"Bearer {settings.METRICS_AUTH_TOKEN}".encode())):
+        enforce_specific_username_or_admin(authorization, None)
+    # Reads the metric files of every process:
+    body, content_type = await asyncio.to_thread(render_metrics)
+    return Response(content=body, media_type=content_type)
+
+
+@router.get("/profiles", response_model=ProfileListResponse, tags=["misc"])
+async def list_profiles(
+        authorization: Optional[str] = Header(None, convert_underscores=False)
+) -> ProfileListResponse:
+    """
+    Stored request profiles (requested with profile=store), newest first.
+    Admin only.
+    """
+    enforce_specific_username_or_admin(authorization, None)
+    try:
+        profiles = [
+            name for name in os.listdir(settings.PROFILES_DIR)
+            if PROFILE_ID_PATTERN.match(name)
+        ]
+    except FileNotFoundError:
+        profiles = []
+    return ProfileListResponse(
+        profiles=sorted(profiles, key=lambda name: int(name.split("-")[0]),
+                        reverse=True)
+    )
+
+
+@router.get("/profiles/{profile_id}", response_class=FileResponse,
+            tags=["misc"])
+async def get_profile(
+        profile_id: str,
+        authorization: Optional[str] = Header(None, convert_underscores=False)
+):
+    """
+    HTML report of a stored request profile. Admin only.
+    """
+    enforce_specific_username_or_admin(authorization, None)
+    path = os.path.join(settings.PROFILES_DIR, profile_id)
+    if not PROFILE_ID_PATTERN.match(profile_id) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/html")
+
+
+@router.get("/slow_queries", response_model=SlowQueryListResponse,
+            tags=["misc"])
+async def list_slow_queries(
+        order_by: str = Query(
+            "total",
+            description="Sort by 'total', 'max', 'count' or 'recent'"
+        ),
+        limit: int = Query(50, ge=1, le=500),
+        authorization: Optional[str] = Header(None, convert_underscores=False)
+) -> SlowQueryListResponse:
+    """
+    Queries slower than SLOW_QUERY_THRESHOLD_MS, aggregated by shape, with
+    the endpoints that ran them and their EXPLAIN output when captured.
+    Admin only.
+    """
+    enforce_specific_username_or_admin(authorization, None)
+    if order_by not in SLOW_QUERY_ORDERS:
+        raise HTTPException(status_code=400, detail="Invalid order_by value")
+    try:
+        queries = await asyncio.to_thread(get_slow_queries, order_by, limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reading slow queries: {str(e)}"
+        )
+    return SlowQueryListResponse(
+        threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+        queries=[SlowQueryShape(**query) for query in queries]
+    )
+
+
+@router.delete("/slow_queries", tags=["misc"])
+async def reset_slow_queries(
+        authorization: Optional[str] = Header(None, convert_underscores=False)
+):
+    """
+    Forget the collected slow queries, e.g. after adding an index. Admin
+    only.
+    """
+    enforce_specific_username_or_admin(authorization, None)
+    await asyncio.to_thread(clear_slow_queries)
+    return {"success": True}
@@ -12,6 +12,8 @@ class TagsResponse(BaseModel):
 class ServerMetadataResponse(BaseModel):
     theme: MetadataTheme
     tags: Dict[int, str]
+    # URLs of the static catalog snapshot (landing, series, tags, program):
+    snapshots: Optional[Dict[str, str]] = None
 
     # Include other metadata fields from settings.SERVER_METADATA
     class Config:
@@ -39,6 +41,20 @@ class StoryResponse(BaseModel):
     patreonusername: Optional[str] = ""
     cdn: str = ""
 
+class StoryBatchItem(BaseModel):
+    # "published", "unpublished" or "not_found":
+    status: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    author: Optional[str] = None
+    patreonusername: Optional[str] = None
+
+
+class StoryBatchResponse(BaseModel):
+    cdn: str
+    stories: Dict[str, StoryBatchItem]
+
+
 class StoryReleaseResponse(BaseModel):
     idstory: int
     storyGlobalId: Optional[str] = None
@@ -57,11 +73,28 @@ class StoryBasicModel(BaseModel):
     release_date: Optional[datetime.datetime] = None
 
 
+# Sparse fieldsets (fields=) only return the fields that were requested:
+class StoryPartialModel(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    author: Optional[str] = None
+    patreonusername: Optional[str] = None
+    storyGlobalId: Optional[str] = None
+    cdn: Optional[str] = None
+    release_date: Optional[datetime.datetime] = None
+
+
 class StoriesResponse(BaseModel):
     isFound: bool
     next: Optional[int]
     page: int
     stories: List[StoryBasicModel]
+    # Served from the last good response while the database is unavailable:
+    stale: bool = False
+
+
+class PartialStoriesResponse(StoriesResponse):
+    stories: List[StoryPartialModel]
 
 
 class SeriesBasicModel(BaseModel):
@@ -74,24 +107,54 @@ class SeriesBasicModel(BaseModel):
     tagList: List[str]
 
 
+class SeriesPartialModel(BaseModel):
+    idseries: Optional[int] = None
+    name: Optional[str] = None
+    seriesGlobalId: Optional[str] = None
+    creator: Optional[str] = None
+    episodes: Optional[int] = None
+    numStories: Optional[int] = None
+    tagList: Optional[List[str]] = None
+
+
 class SeriesResponse(BaseModel):
     isFound: bool
     offset: int
     next: Optional[int]
     page: int
     series: List[SeriesBasicModel]
+    stale: bool = False
+
+
+class PartialSeriesResponse(SeriesResponse):
+    series: List[SeriesPartialModel]
+
+
+class SearchSeriesModel(BaseModel):
+    idseries: int
+    name: str
+    seriesGlobalId: str
+    creator: str
+    tagList: List[str]
+
+
+class SearchResponse(BaseModel):
+    isFound: bool
+    series: List[SearchSeriesModel]
+    stories: List[StoryBasicModel]
 
 
 class LatestSeriesResponse(BaseModel):
     isFound: bool
     offset: int
     series: List[SeriesBasicModel]
+    stale: bool = False
 
 
 class WeeklyProgramStory(BaseModel):
     idstory: int
-    title: str
-    description: str
+    title: Optional[str]
+    description: Optional[str]
     release_date: str
     storyGlobalId: Optional[str]
     series_name: Optional[str]
@@ -104,6 +167,25 @@ class WeeklyProgramResponse(BaseModel):
     message: Optional[str] = None
 
 
+class ProgramWeek(BaseModel):
+    week_start_date: str
+    week_end_date: str
+    stories: List[WeeklyProgramStory]
+
+
+class ProgramCalendarResponse(BaseModel):
+    timezone: str
+    weeks: List[ProgramWeek]
+
+
+class BootstrapResponse(BaseModel):
+    # Responses of /, /tags, /landing and /program:
+    metadata: ServerMetadataResponse
+    tags: TagsResponse
+    landing: Dict[str, Any]
+    program: WeeklyProgramResponse
+
+
 class StorySubmissionResponse(BaseModel):
     idstorysubmission: int
     title: Optional[str]
@@ -126,6 +208,44 @@ class SubmissionListResponse(BaseModel):
     page: int
     next_page: Optional[int]
 
+class SubmissionSeriesSummary(BaseModel):
+    idseries: int
+    name: Optional[str] = None
+    seriesGlobalId: Optional[str] = None
+
+
+class StorySubmissionSummary(BaseModel):
+    idstorysubmission: int
+    title: Optional[str]
+    description: Optional[str]
+    author: Optional[str]
+    storyGlobalId: Optional[str]
+    series: SubmissionSeriesSummary
+    submission_date: datetime.datetime
+    status: SubmissionStatus
+    story_id: Optional[int] = None
+    story: Optional[StoryReleaseResponse] = None
+
+
+class SubmissionSummaryListResponse(BaseModel):
+    submissions: List[StorySubmissionSummary]
+    total: int
+    page: int
+    next_page: Optional[int]
+
+class SubmissionStageStats(BaseModel):
+    stage: str
+    status: Optional[SubmissionStatus]
+    count: int
+    avg_ms: Optional[float]
+    min_ms: Optional[int]
+    max_ms: Optional[int]
+
+
+class SubmissionStageStatsResponse(BaseModel):
+    since: datetime.datetime
+    stages: List[SubmissionStageStats]
+
 class SubmissionToStoryRequest(BaseModel):
     release_date: Optional[str] = None
     exclude_from_rss: bool = False
@@ -136,3 +256,41 @@ class SubmissionToStoryResponse(BaseModel):
     story_id: Optional[int] = None
     storyGlobalId: Optional[str] = None
 
+
+
+class ProfileListResponse(BaseModel):
+    profiles: List[str]
+
+
+class SlowQueryShape(BaseModel):
+    shape_id: str
+    shape: str
+    example: str
+    count: int
+    avg_ms: float
+    max_ms: float
+    total_ms: float
+    last_seen: datetime.datetime
+    endpoints: Dict[str, int]
+    explain: Optional[List[Dict[str, Any]]] = None
+
+
+class SlowQueryListResponse(BaseModel):
+    threshold_ms: int
+    queries: List[SlowQueryShape]
+
+
+class CatalogChangeModel(BaseModel):
+    seq: int
+    kind: str
+    op: str
+    entity_id: int
+    global_id: Optional[str] = None
+    created_at: datetime.datetime
+
+
+class CatalogChangesResponse(BaseModel):
+    changes: List[CatalogChangeModel]
+    # Pass as `since` to get the following changes:
+    cursor: int
+    has_more: bool
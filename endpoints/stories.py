@@ -1,32 +1,48 @@
-import asyncio
+import hashlib
 import json
 import logging
 import os
-from datetime import datetime, timedelta
-from typing import List, Optional
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Union
 
 import feedgenerator  # Install it using: pip install feedgenerator
 import pytz
 from fastapi import APIRouter, HTTPException, Query, Header
+from fastapi.encoders import jsonable_encoder
 from fastapi_utilities import repeat_every
 from pydantic.types import PositiveInt, NonNegativeInt
-from starlette.responses import FileResponse
-from tortoise.exceptions import OperationalError
+from starlette.responses import FileResponse, Response
 # import Q from tortoise orm:
 from tortoise.expressions import Subquery, RawSQL
-from tortoise.transactions import atomic
+from tortoise.functions import Count
 
 import settings
 from database import models
 from database.models import SeriesIn_Pydantic
+from database.routing import read_only, read_from_primary, skip_mirror
 from endpoints.response_models import ItemExistsResponse, StoryResponse, \
     ServerMetadataResponse, MetadataTheme, SeriesLookupResponse, \
     StoryBasicModel, StoriesResponse, SeriesBasicModel, SeriesResponse, \
     LatestSeriesResponse, WeeklyProgramResponse, SeriesTagsResponse, \
-    TagsResponse
+    TagsResponse, StoryBatchItem, StoryBatchResponse, BootstrapResponse, \
+    WeeklyProgramStory, ProgramWeek, ProgramCalendarResponse, SearchResponse, \
+    SearchSeriesModel, StoryPartialModel, PartialStoriesResponse, \
+    SeriesPartialModel, PartialSeriesResponse
 from helpers.utils import getUniqueRandomStoryKey
+from helpers.cache import single_flight, TTLCache
+from helpers.catalog_snapshot import snapshot_urls
+from helpers.catalog_changes import record_change, SERIES, SERIES_TAGS, \
+    CREATED, UPDATED
+from helpers.fallback import CircuitBreaker, LastKnownGood
+from helpers.feeds import add_story_item, feed_response, get_series_feed, \
+    get_tag_feed
 from helpers.auth import validate_admin_token, \
     validate_and_decode_jwt_from_bearer, enforce_specific_username_or_admin
+from helpers.metrics import record_cache_lookup
+from helpers.release_index import release_index
+from helpers.search_index import search_index
+from helpers.story_lookup import is_unknown_story_id, \
+    remember_unknown_story_ids
 
 S3_LINK = settings.S3_LINK
 FEED_PATH = "/feed.xml"
@@ -34,12 +50,36 @@ FEED_PATH = "/feed.xml"
 router = APIRouter()
 
 CACHED_WEEKLY_PROGRAM_PATH = "./cached_program_weekly.json"
+PROGRAM_CALENDAR_MAX_WEEKS = 12
 logging.getLogger().setLevel(
     logging.INFO if settings.DEBUG else logging.WARNING
 )
 
+# Catalog listings are served from their last good response while MySQL is
+# slow or down, see helpers/fallback.py:
+CATALOG_BREAKER = CircuitBreaker(
+    "catalog",
+    failure_threshold=settings.CIRCUIT_BREAKER_FAILURES,
+    reset_seconds=settings.CIRCUIT_BREAKER_RESET_SECONDS
+)
+STORIES_FALLBACK = LastKnownGood(
+    "/stories", CATALOG_BREAKER, settings.CATALOG_QUERY_BUDGET_SECONDS
+)
+SERIES_FALLBACK = LastKnownGood(
+    "/series", CATALOG_BREAKER, settings.CATALOG_QUERY_BUDGET_SECONDS
+)
+LATEST_SERIES_FALLBACK = LastKnownGood(
+    "/latest", CATALOG_BREAKER, settings.CATALOG_QUERY_BUDGET_SECONDS
+)
+# Body and ETag of /bootstrap:
+_bootstrap_cache = TTLCache(maxsize=1, ttl=30, name="bootstrap")
+
+STORY_BATCH_LIMIT = 100
+SEARCH_RESULTS_LIMIT = 50
+
 
 @router.get('/item', response_model=ItemExistsResponse, tags=["misc"])
+@read_only
 async def check_item_exists(
         item_id: str = Query(
             "", description="Series ID"
@@ -73,12 +113,17 @@ async def check_item_exists(
 
 
 @router.get("/story", response_model=StoryResponse, tags=["stories & series"])
+@read_only
+@single_flight
 async def get_story(
         storyGlobalId: str = Query(
             "", description="Story's Global ID"
         )
 ) -> StoryResponse:
     try:
+        # Ids probed by scrapers don't reach the database again:
+        if is_unknown_story_id(storyGlobalId):
+            raise HTTPException(status_code=404, detail="Not found")
         if settings.SHOW_PUBLISHED_ONLY:
             story = models.Story.filter(
                 storyGlobalId=storyGlobalId,
@@ -97,6 +142,7 @@ async def get_story(
             result = await models.Story_Pydantic.from_queryset(story)
 
             if not result:
+                await remember_unknown_story_ids([storyGlobalId])
                 raise HTTPException(status_code=404, detail="Not found")
 
             # TODO: let access to user with story pass
@@ -127,7 +173,85 @@ async def get_story(
         )
 
 
+@router.get(
+    "/story/batch", response_model=StoryBatchResponse,
+    tags=["stories & series"]
+)
+@read_only
+@single_flight
+async def get_story_batch(
+        ids: List[str] = Query(
+            ..., description="Story Global IDs, up to 100"
+        )
+) -> StoryBatchResponse:
+    """
+    Metadata of many stories in one query, e.g. for a reader's library.
+
+    Every requested id gets a status: "published", "unpublished" or
+    "not_found". Metadata is only included for stories /story would return.
+    """
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > STORY_BATCH_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {STORY_BATCH_LIMIT} ids can be requested"
+        )
+
+    stories = {
+        story_id: StoryBatchItem(status="not_found") for story_id in ids
+        if is_unknown_story_id(story_id)
+    }
+    lookup_ids = [story_id for story_id in ids if story_id not in stories]
+    try:
+        rows = await models.Story.filter(
+            storyGlobalId__in=lookup_ids
+        ).values("storyGlobalId", "title", "description", "author",
+                 "patreonusername", "release_date") if lookup_ids else []
+    except Exception as e:
+        logging.error(f"Story batch error: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error fetching stories"
+        ) from e
+
+    for row in rows:
+        story_id = row.pop("storyGlobalId")
+        release_date = row.pop("release_date")
+        status = "published" \
+            if release_date <= datetime.now(release_date.tzinfo) \
+            else "unpublished"
+        if status == "published" or not settings.SHOW_PUBLISHED_ONLY:
+            stories[story_id] = StoryBatchItem(status=status, **row)
+        else:
+            stories[story_id] = StoryBatchItem(status=status)
+    unknown_ids = [story_id for story_id in lookup_ids
+                   if story_id not in stories]
+    for story_id in unknown_ids:
+        stories[story_id] = StoryBatchItem(status="not_found")
+    try:
+        await remember_unknown_story_ids(unknown_ids)
+    except Exception as e:
+        logging.error(f"Couldn't check submissions of unknown stories: {e}")
+
+    return StoryBatchResponse(
+        cdn=S3_LINK,
+        stories={story_id: stories[story_id] for story_id in ids}
+    )
+
+
+def _server_metadata(tags_data: dict) -> ServerMetadataResponse:
+    theme_data = {"primary": settings.THEME["primary"]}
+    return ServerMetadataResponse(
+        **settings.SERVER_METADATA,
+        theme=MetadataTheme(**theme_data),
+        tags=tags_data,
+        snapshots=snapshot_urls() if settings.CATALOG_SNAPSHOT_ENABLED
+        else None
+    )
+
+
 @router.get("/", response_model=ServerMetadataResponse, tags=["misc"])
+@read_only
+@single_flight
 async def get_server_metadata() -> ServerMetadataResponse:
     """
     Get the server metadata.
@@ -142,16 +266,8 @@ async def get_server_metadata() -> ServerMetadataResponse:
         Exception: If there is an error retrieving the server metadata.
     """
     try:
-        meta = settings.SERVER_METADATA
-
-        theme_data = {"primary": settings.THEME["primary"]}
         tags_data = dict(await models.Tag.all().values_list("idtag", "tag"))
-
-        return ServerMetadataResponse(
-            **meta,
-            theme=MetadataTheme(**theme_data),
-            tags=tags_data
-        )
+        return _server_metadata(tags_data)
     except Exception as e:
         raise e
         logging.error(e)
@@ -162,6 +278,8 @@ async def get_server_metadata() -> ServerMetadataResponse:
     "/series/lookup", response_model=SeriesLookupResponse,
     tags=["stories & series"]
 )
+@read_only
+@single_flight
 async def lookup_series_by_stories(
         story_ids: List[str] = Query(
             None, description="List of storyGlobalId values"
@@ -201,10 +319,72 @@ async def lookup_series_by_stories(
         )
 
 
+def _parse_fields(fields: Optional[str], model) -> Optional[tuple]:
+    """
+    The fields of a sparse fieldset (fields=a,b), None for all fields.
+    """
+    if not fields:
+        return None
+    requested = tuple(dict.fromkeys(
+        field.strip() for field in fields.split(",") if field.strip()
+    ))
+    unknown = [field for field in requested if field not in model.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return requested
+
+
+async def _sparse_stories(stories_query, fields: tuple) -> list[dict]:
+    columns = [field for field in fields if field != "cdn"]
+    stories = await stories_query.values("idstory", *columns)
+    if "cdn" in fields:
+        for story in stories:
+            story["cdn"] = S3_LINK
+    return stories
+
+
+async def _sparse_series(series_query, fields: tuple) -> list[dict]:
+    """
+    Only the requested columns, without prefetching stories and tags. Story
+    counts and tag lists are one grouped query each, when requested.
+    """
+    columns = [field for field in fields
+               if field not in ("idseries", "numStories", "tagList")]
+    series = await series_query.values("idseries", *columns)
+    series_ids = [series_item["idseries"] for series_item in series]
+    if series_ids and "numStories" in fields:
+        story_counts = dict(await models.Story.filter(
+            series_id__in=series_ids, release_date__lte=datetime.now()
+        ).annotate(count=Count("idstory")).group_by(
+            "series_id"
+        ).values_list("series_id", "count"))
+        for series_item in series:
+            series_item["numStories"] = story_counts.get(
+                series_item["idseries"], 0
+            )
+    if series_ids and "tagList" in fields:
+        tags = {}
+        for series_id, tag in await models.SeriesTagsRel.filter(
+                series_id__in=series_ids
+        ).values_list("series_id", "tag__tag"):
+            tags.setdefault(series_id, []).append(tag)
+        for series_item in series:
+            series_item["tagList"] = tags.get(series_item["idseries"], [])
+    if "idseries" not in fields:
+        for series_item in series:
+            del series_item["idseries"]
+    return series
+
+
 @router.get(
-    "/stories", response_model=StoriesResponse,
-    tags=["stories & series"]
+    "/stories",
+    response_model=Union[StoriesResponse, PartialStoriesResponse],
+    response_model_exclude_unset=True, tags=["stories & series"]
 )
+@read_only
+@single_flight
 async def get_stories(
         page: NonNegativeInt = Query(
             1, description="Page number,"
@@ -240,8 +420,14 @@ async def get_stories(
                         "username. Only admin & "
                         "that specific user can use this."
         ),
-) -> StoriesResponse:
+        fields: Optional[str] = Query(
+            None,
+            description="Comma separated story fields to return, e.g. "
+                        "'storyGlobalId,title,release_date'. Default: all"
+        ),
+) -> Union[StoriesResponse, PartialStoriesResponse]:
     per_page = 60
+    story_fields = _parse_fields(fields, StoryBasicModel)
 
     # this if and its else could be just two lines, but for readability:
     if (include_upcoming and include_upcoming != 0):
@@ -260,8 +446,15 @@ async def get_stories(
             # so this has to be either the user himself or the admin.
             enforce_specific_username_or_admin(authorization, username)
 
+    if username or include_upcoming:
+        # users check their own stories right after submitting them:
+        read_from_primary()
+
     # if include_drafts == False, anyone can filter series by creator
-    try:
+    tags_required = tags_required[:3]
+
+    async def fetch_stories() -> Union[StoriesResponse,
+                                       PartialStoriesResponse]:
         skip = (page - 1) * per_page
         limit = per_page
         stories_query = models.Story.all()
@@ -294,7 +487,6 @@ async def get_stories(
                     )
 
         if tags_required:
-            tags_required = tags_required[:3]
             stories_query = stories_query.filter(
                 series__tags_rel__tag__tag__in=tags_required
             )
@@ -309,38 +501,98 @@ async def get_stories(
             raise HTTPException(
                 status_code=400, detail="Invalid sort_by value"
             )
-        stories = await models.Story_Pydantic.from_queryset(
-            stories_query.offset(skip).limit(limit + 1)
-        )
+        stories_query = stories_query.offset(skip).limit(limit + 1)
+        if story_fields is None:
+            stories = [
+                {**story.model_dump(), "cdn": S3_LINK}
+                for story in await models.Story_Pydantic.from_queryset(
+                    stories_query
+                )
+            ]
+            story_model, response_model = StoryBasicModel, StoriesResponse
+        else:
+            stories = await _sparse_stories(stories_query, story_fields)
+            story_model, response_model = StoryPartialModel, \
+                PartialStoriesResponse
 
         if stories:
             next_page = page + 1 if len(stories) == limit + 1 else None
             story_list = [
-                StoryBasicModel(
-                    **story.model_dump(),
-                    cdn=S3_LINK
-                ) for story in stories[:limit]
+                story_model(**story) for story in stories[:limit]
             ]
 
-            return StoriesResponse(
+            return response_model(
                 isFound=True,
                 next=next_page,
                 page=page,
                 stories=story_list
             )
-        raise Exception("No stories found")
-    except Exception as e:
-        logging.error(e)
-        return StoriesResponse(
+        return response_model(
             isFound=False,
             next=None,
             page=page,
             stories=[]
         )
 
+    return await STORIES_FALLBACK.fetch(
+        (page, seriesGlobalId, from_series_of_story, sort_by,
+         tuple(tags_required), include_upcoming, username, story_fields),
+        fetch_stories
+    )
+
+
+@router.get(
+    "/search", response_model=SearchResponse, tags=["stories & series"]
+)
+async def search_catalog(
+        q: str = Query(..., min_length=1, max_length=100,
+                       description="Words or beginnings of words to find in"
+                                   " series names and creators, and in"
+                                   " story titles, descriptions and"
+                                   " authors"),
+        tags_required: List[str] = Query(
+            [], description="Required tag 'names'. These are limited to 3"
+                            " tags."
+        ),
+        limit: int = Query(20, ge=1, le=SEARCH_RESULTS_LIMIT,
+                           description="Maximum series and stories each"),
+) -> SearchResponse:
+    """
+    Search released series and stories. Answered from the worker's
+    in-memory index, see helpers/search_index.py.
+    """
+    try:
+        await search_index.ensure_loaded()
+    except Exception as e:
+        logging.error(f"Error loading search index: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error loading search index"
+        ) from e
+    series, stories = search_index.search(q, tags_required[:3], limit)
+    return SearchResponse(
+        isFound=bool(series or stories),
+        series=[
+            SearchSeriesModel(
+                idseries=row["idseries"], name=row["name"],
+                seriesGlobalId=row["seriesGlobalId"], creator=row["creator"],
+                tagList=row["tagList"]
+            ) for row in series
+        ],
+        stories=[
+            StoryBasicModel(
+                title=row["title"], description=row["description"],
+                author=row["author"],
+                patreonusername=row["patreonusername"],
+                storyGlobalId=row["storyGlobalId"], cdn=S3_LINK,
+                release_date=row["release_date"]
+            ) for row in stories
+        ],
+    )
+
 
 @router.get("/landing", tags=["misc"])
-@atomic()
+@read_only
+@single_flight
 async def get_landing():
     """
     Endpoint to get server metadata along with latest series.
@@ -352,7 +604,7 @@ async def get_landing():
         list with key "series".
     """
     try:
-        meta = settings.SERVER_METADATA
+        meta = dict(settings.SERVER_METADATA)
         meta["theme"] = {
             "primary": settings.THEME["primary"],
         }
@@ -360,6 +612,9 @@ async def get_landing():
         logging.error(e)
         meta = {}
 
+    # The response includes the submissions of the series, which the
+    # catalog mirror doesn't hold:
+    skip_mirror()
     series_query = models.Series.all().order_by("-idseries").limit(10)
     series = await models.SeriesWithRels_Pydantic.from_queryset(series_query)
     if series:
@@ -374,6 +629,8 @@ async def get_landing():
 
 
 @router.get("/tags", response_model=TagsResponse, tags=["tags"])
+@read_only
+@single_flight
 async def get_tags():
     """
     Retrieve all tags with their IDs and names.
@@ -387,9 +644,170 @@ async def get_tags():
         raise HTTPException(status_code=500, detail="Error retrieving tags")
 
 
+@router.get("/bootstrap", response_model=BootstrapResponse, tags=["misc"])
+@read_only
+async def get_bootstrap(
+        if_none_match: Optional[str] = Header(None)
+):
+    """
+    The responses of /, /tags, /landing and /program in one, for app start.
+
+    The response has an ETag over all four parts, requests with a matching
+    If-None-Match get a 304.
+    """
+    cached = _bootstrap_cache.get("bootstrap")
+    if cached is None:
+        try:
+            cached = await build_bootstrap()
+        except Exception as e:
+            logging.error(f"Error building bootstrap: {e}")
+            raise HTTPException(
+                status_code=500, detail="Error building bootstrap"
+            ) from e
+        _bootstrap_cache.set("bootstrap", cached)
+    body, etag = cached
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in if_none_match:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json",
+                    headers=headers)
+
+
+@single_flight
+async def build_bootstrap() -> tuple[bytes, str]:
+    """
+    The bootstrap body and its ETag. Tags are read once for / and /tags.
+    """
+    tags = await models.Tag.all().values_list("idtag", "tag")
+    bootstrap = BootstrapResponse(
+        metadata=_server_metadata(dict(tags)),
+        tags=TagsResponse(tags=[{idtag: tag} for idtag, tag in tags]),
+        landing=await get_landing(),
+        program=await get_current_week_program(),
+    )
+    body = json.dumps(jsonable_encoder(bootstrap)).encode()
+    return body, f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+async def fetch_series_page(
+        page: int, storyGlobalId: Optional[str], sort_by: str,
+        tags_required: List[str], include_drafts: bool,
+        creator: Optional[str], series_fields: Optional[tuple]
+) -> Union[SeriesResponse, PartialSeriesResponse]:
+    """
+    A page of /series, without the authorization checks and the fallback.
+    Called directly by the catalog snapshot (helpers/catalog_snapshot.py).
+    """
+    per_page = 60
+    skip = (page - 1) * per_page
+    limit = per_page
+    series_query = None
+
+    if storyGlobalId:
+        stories = await models.Story.filter(
+            storyGlobalId=storyGlobalId
+        ).limit(1)
+        for story in stories:
+            series_query = models.Series.filter(
+                idseries=story.series_id
+            ).all()
+    else:
+        series_query = models.Series.all()
+
+    if series_fields is None:
+        series_model, response_model = SeriesBasicModel, SeriesResponse
+    else:
+        series_model, response_model = SeriesPartialModel, \
+            PartialSeriesResponse
+
+    if series_query is None:
+        return response_model(
+            isFound=False,
+            offset=0,
+            next=None,
+            page=page,
+            series=[]
+        )
+
+    if creator:
+        series_query = series_query.filter(
+            creator=creator
+        )
+
+    if tags_required:
+        series_query = series_query.filter(
+            tags_rel__tag__tag__in=tags_required
+        )
+
+    if not include_drafts:
+        series_query = series_query.filter(
+            stories__idstory__in=Subquery(
+                models.Story.filter(
+                    release_date__lte=datetime.now()
+                ).values(
+                    "idstory"
+                )
+            )
+        ).distinct()
+
+    # If tortoise orm's Count can introduce "filter" in the future,
+    # this will be used instead:
+    # series_query = series_query.annotate(
+    #     story_count=Count("stories", filter=Q(
+    #     release_date__lte=datetime.now()))
+    # ).filter(story_count__gte=1)
+
+    if sort_by == "new":
+        series_query = series_query.order_by("-idseries")
+    elif sort_by == "name":
+        series_query = series_query.order_by("name")
+    else:
+        raise HTTPException(
+            status_code=400, detail="Invalid sort_by value"
+        )
+
+    series_query = series_query.offset(skip).limit(limit + 1)
+    if series_fields is None:
+        series = [
+            series_item.model_dump() for series_item in
+            await models.SeriesCatalog_Pydantic.from_queryset(
+                series_query
+            )
+        ]
+    else:
+        series = await _sparse_series(series_query, series_fields)
+    if series:
+        next_page = page + 1 if len(series) == limit + 1 else None
+        series_list = [
+            series_model(**series_item)
+            for series_item in series[:limit]
+        ]
+
+        return response_model(
+            isFound=True,
+            offset=skip,
+            next=next_page,
+            page=page,
+            series=series_list
+        )
+
+    return response_model(
+        isFound=False,
+        offset=0,
+        next=None,
+        page=page,
+        series=[]
+    )
+
+
 @router.get(
-    "/series", response_model=SeriesResponse, tags=["stories & series"]
+    "/series",
+    response_model=Union[SeriesResponse, PartialSeriesResponse],
+    response_model_exclude_unset=True, tags=["stories & series"]
 )
+@read_only
+@single_flight
 async def get_series(
         page: NonNegativeInt = Query(
             1, description="Page number,"
@@ -418,8 +836,14 @@ async def get_series(
                         "username. Only admin & "
                         "creator can use this."
         ),
+        fields: Optional[str] = Query(
+            None,
+            description="Comma separated series fields to return, e.g. "
+                        "'seriesGlobalId,name'. numStories and tagList cost "
+                        "an extra query each. Default: all"
+        ),
 ):
-    per_page = 60
+    series_fields = _parse_fields(fields, SeriesBasicModel)
     page = min(page, 20)
     if include_drafts:
         # below check is for readability
@@ -431,92 +855,20 @@ async def get_series(
             # only admins can include_drafts for all records.
             # if admin, pass. if not the admin, raise:
             enforce_specific_username_or_admin(authorization, None)
+        # creators check their drafts right after creating them:
+        read_from_primary()
 
     # if include_drafts == False, anyone can filter series by creator
-
-    try:
-        skip = (page - 1) * per_page
-        limit = per_page
-        series_query = None
-
-        if storyGlobalId:
-            stories = await models.Story.filter(
-                storyGlobalId=storyGlobalId
-            ).limit(1)
-            for story in stories:
-                series_query = models.Series.filter(
-                    idseries=story.series_id
-                ).all()
-        else:
-            series_query = models.Series.all()
-
-        if creator:
-            series_query = series_query.filter(
-                creator=creator
-            )
-
-        if tags_required:
-            tags_required = tags_required[:3]
-            series_query = series_query.filter(
-                tags_rel__tag__tag__in=tags_required
-            )
-
-        if not include_drafts:
-            series_query = series_query.filter(
-                stories__idstory__in=Subquery(
-                    models.Story.filter(
-                        release_date__lte=datetime.now()
-                    ).values(
-                        "idstory"
-                    )
-                )
-            ).distinct()
-
-        # If tortoise orm's Count can introduce "filter" in the future,
-        # this will be used instead:
-        # series_query = series_query.annotate(
-        #     story_count=Count("stories", filter=Q(
-        #     release_date__lte=datetime.now()))
-        # ).filter(story_count__gte=1)
-
-        if sort_by == "new":
-            series_query = series_query.order_by("-idseries")
-        elif sort_by == "name":
-            series_query = series_query.order_by("name")
-        else:
-            raise HTTPException(
-                status_code=400, detail="Invalid sort_by value"
-            )
-
-        series = await models.SeriesWithRels_Pydantic.from_queryset(
-            series_query.offset(skip).limit(limit + 1)
-        )
-        if series:
-            next_page = page + 1 if len(series) == limit + 1 else None
-            series_list = [
-                SeriesBasicModel(**series_item.model_dump())
-                for series_item in series[:limit]
-            ]
-
-            return SeriesResponse(
-                isFound=True,
-                offset=skip,
-                next=next_page,
-                page=page,
-                series=series_list
-            )
-
-        raise Exception("No series found")
-
-    except Exception as e:
-        logging.error(e)
-        return SeriesResponse(
-            isFound=False,
-            offset=0,
-            next=None,
-            page=page,
-            series=[]
+    tags_required = tags_required[:3]
+
+    return await SERIES_FALLBACK.fetch(
+        (page, storyGlobalId, sort_by, tuple(tags_required), include_drafts,
+         creator, series_fields),
+        lambda: fetch_series_page(
+            page, storyGlobalId, sort_by, tags_required, include_drafts,
+            creator, series_fields
         )
+    )
 
 
 @router.post("/series", response_model=SeriesBasicModel)
@@ -543,6 +895,9 @@ async def create_series(series: SeriesIn_Pydantic,
             creator=series.creator,
             episodes=0
         )
+        await record_change(SERIES, CREATED, new_series.idseries,
+                            series_global_id)
+        search_index.add_series(new_series)
 
         new_series_pydantic = await (
             models.SeriesWithRels_Pydantic.from_tortoise_orm(
@@ -596,6 +951,12 @@ async def add_tags_to_series(series_id: int, tags: List[str]):
                 ]
             )
 
+        if tags_to_add or tags_to_delete:
+            await record_change(SERIES_TAGS, UPDATED, series.idseries,
+                                series.seriesGlobalId)
+            search_index.set_series_tags(series.idseries,
+                                         submitted_valid_tag_names)
+
         return SeriesTagsResponse(
             series_id=series_id, tags=list(submitted_valid_tag_names)
         )
@@ -607,7 +968,8 @@ async def add_tags_to_series(series_id: int, tags: List[str]):
 @router.get(
     "/latest", response_model=LatestSeriesResponse, tags=["stories & series"]
 )
-@atomic()
+@read_only
+@single_flight
 async def get_latest_series(
         offset: NonNegativeInt = Query(
             0,
@@ -637,24 +999,25 @@ async def get_latest_series(
 
     """
     offset = min(max(offset, 0), 500)
-    try:
-        for attempt in range(3):  # Try up to 3 times
-            try:
-                if not exclude_tags and not include_tags:
-                    queryset = models.Series.filter(
-                        stories__release_date__lt=datetime.now()
-                    ).order_by("-idseries").distinct().offset(offset).limit(10)
-                else:
-                    if exclude_tags:
-                        if include_tags:
-                            all_tags = list(set(exclude_tags + include_tags))
-
-                            ex_text = ','.join(str(x) for x in exclude_tags)
-                            # in_text = ','.join(str(x) for x in include_tags)
-                            all_text = ','.join(str(x) for x in all_tags)
 
-                            sql = f"""(SELECT series_id FROM ( SELECT 
-                            sr.series_id, SUM(CASE WHEN sr.tag_id IN (
+    async def fetch_latest_series() -> LatestSeriesResponse:
+        if not exclude_tags and not include_tags:
+            queryset = models.Series.filter(
+                stories__release_date__lt=datetime.now()
+            ).order_by("-idseries").distinct().offset(offset).limit(10)
+        else:
+            # The raw SQL below is written for MySQL:
+            skip_mirror()
+            if exclude_tags:
+                if include_tags:
+                    all_tags = list(set(exclude_tags + include_tags))
+
+                    ex_text = ','.join(str(x) for x in exclude_tags)
+                    # in_text = ','.join(str(x) for x in include_tags)
+                    all_text = ','.join(str(x) for x in all_tags)
+
+                    sql = f"""(SELECT series_id FROM ( SELECT 
+                    sr.series_id, SUM(CASE WHEN sr.tag_id IN (
 {ex_text}) THEN 1 ELSE 0 END) AS x_clude, COUNT(*) AS all_count FROM ( 
 SELECT sr.*, ( SELECT MIN(st.idstory) AS stories_aired FROM stories AS st 
 WHERE st.series_id = sr.series_id AND st.release_date < NOW() LIMIT 1) AS 
@@ -662,91 +1025,82 @@ stories_aired FROM series_tags_rel AS sr WHERE sr.tag_id IN ( {all_text} )
 ORDER BY NULL) AS sr WHERE sr.stories_aired IS NOT NULL GROUP BY 
 sr.series_id HAVING x_clude = 0 AND all_count = ( x_clude + 
 {len(include_tags)} ) ORDER BY sr.id DESC LIMIT 10 OFFSET {offset}) AS ss)"""
-                        else:
-                            ex_text = ','.join(str(x) for x in exclude_tags)
-                            sql = f"""(SELECT series_id FROM ( SELECT 
-                            sr.series_id, SUM(CASE WHEN sr.tag_id IN (
+                else:
+                    ex_text = ','.join(str(x) for x in exclude_tags)
+                    sql = f"""(SELECT series_id FROM ( SELECT 
+                    sr.series_id, SUM(CASE WHEN sr.tag_id IN (
 {ex_text}) THEN 1 ELSE 0 END) AS x_clude FROM ( SELECT sr.*, ( SELECT MIN(
 st.idstory) AS stories_aired FROM stories AS st WHERE st.series_id = 
 sr.series_id AND st.release_date < NOW() LIMIT 1) AS stories_aired FROM 
 series_tags_rel AS sr ORDER BY NULL) AS sr WHERE sr.stories_aired IS NOT 
 NULL GROUP BY sr.series_id HAVING x_clude = 0 ORDER BY sr.id DESC LIMIT 10 
 OFFSET {offset}) AS ss)"""
-                    else:
-                        if len(include_tags) == 1:
-                            sql = f"""(SELECT series_id FROM (SELECT 
-                            sr.series_id FROM ( SELECT sr.*, ( SELECT MIN(
-                            st.idstory) AS stories_aired FROM stories AS st 
-                            WHERE st.series_id = sr.series_id AND 
-                            st.release_date < NOW() LIMIT 1) AS 
-                            stories_aired FROM series_tags_rel AS sr WHERE 
-                            sr.tag_id = {include_tags[0]} ORDER BY NULL) AS 
-                            sr WHERE sr.stories_aired IS NOT NULL GROUP BY 
-                            sr.series_id ORDER BY sr.id DESC LIMIT 10 OFFSET 
+            else:
+                if len(include_tags) == 1:
+                    sql = f"""(SELECT series_id FROM (SELECT 
+                    sr.series_id FROM ( SELECT sr.*, ( SELECT MIN(
+                    st.idstory) AS stories_aired FROM stories AS st 
+                    WHERE st.series_id = sr.series_id AND 
+                    st.release_date < NOW() LIMIT 1) AS 
+                    stories_aired FROM series_tags_rel AS sr WHERE 
+                    sr.tag_id = {include_tags[0]} ORDER BY NULL) AS 
+                    sr WHERE sr.stories_aired IS NOT NULL GROUP BY 
+                    sr.series_id ORDER BY sr.id DESC LIMIT 10 OFFSET 
 {offset}) AS ss)"""
-                        else:
-                            in_text = ','.join(str(x) for x in include_tags)
-                            sql = f"""(SELECT series_id FROM ( SELECT 
-                            sr.series_id, COUNT(*) AS total FROM ( SELECT 
-                            sr.*, ( SELECT MIN(st.idstory) AS stories_aired 
-                            FROM stories AS st WHERE st.series_id = 
-                            sr.series_id AND st.release_date < NOW() LIMIT 
-                            1) AS stories_aired FROM series_tags_rel AS sr 
-                            WHERE sr.tag_id IN ({in_text}) ORDER BY NULL) AS 
-                            sr WHERE sr.stories_aired IS NOT NULL GROUP BY 
-                            sr.series_id HAVING total = {len(include_tags)} 
-                            ORDER BY sr.id DESC LIMIT 10 OFFSET {offset}) AS 
-                            ss)"""
-
-                    queryset = models.Series.filter(
-                        idseries__in=RawSQL(sql)
-                    ).order_by(
-                        "-idseries"
-                    ).limit(10)
-
-                series = await models.SeriesWithRels_Pydantic.from_queryset(
-                    queryset
-                )
-
-                if series:
-                    series_list = [
-                        SeriesBasicModel(**series_item.dict())
-                        for series_item in series
-                    ]
+                else:
+                    in_text = ','.join(str(x) for x in include_tags)
+                    sql = f"""(SELECT series_id FROM ( SELECT 
+                    sr.series_id, COUNT(*) AS total FROM ( SELECT 
+                    sr.*, ( SELECT MIN(st.idstory) AS stories_aired 
+                    FROM stories AS st WHERE st.series_id = 
+                    sr.series_id AND st.release_date < NOW() LIMIT 
+                    1) AS stories_aired FROM series_tags_rel AS sr 
+                    WHERE sr.tag_id IN ({in_text}) ORDER BY NULL) AS 
+                    sr WHERE sr.stories_aired IS NOT NULL GROUP BY 
+                    sr.series_id HAVING total = {len(include_tags)} 
+                    ORDER BY sr.id DESC LIMIT 10 OFFSET {offset}) AS 
+                    ss)"""
+
+            queryset = models.Series.filter(
+                idseries__in=RawSQL(sql)
+            ).order_by(
+                "-idseries"
+            ).limit(10)
+
+        series = await models.SeriesCatalog_Pydantic.from_queryset(
+            queryset
+        )
 
-                    return LatestSeriesResponse(
-                        isFound=True,
-                        offset=offset,
-                        series=series_list
-                    )
+        if series:
+            series_list = [
+                SeriesBasicModel(**series_item.dict())
+                for series_item in series
+            ]
 
-                raise Exception("No series found")
+            return LatestSeriesResponse(
+                isFound=True,
+                offset=offset,
+                series=series_list
+            )
 
-            except OperationalError as e:
-                if "Packet sequence number wrong" in str(e) and attempt < 2:
-                    # Log the retry attempt
-                    logging.warning(
-                        f"Retrying query due to sequence number error ("
-                        f"attempt {attempt + 1})"
-                    )
-                    await asyncio.sleep(
-                        0.5 * (attempt + 1)
-                    )  # Exponential backoff
-                    continue
-                raise
-    except Exception as e:
-        logging.error(f"Error in get_latest_series: {str(e)}", exc_info=True)
         return LatestSeriesResponse(
             isFound=False,
             offset=offset,
             series=[]
         )
 
+    return await LATEST_SERIES_FALLBACK.fetch(
+        (offset, tuple(exclude_tags or ()), tuple(include_tags or ())),
+        fetch_latest_series
+    )
+
 
 @router.get(
     "/program", response_model=WeeklyProgramResponse,
     tags=["misc"]
 )
+@read_only
+@single_flight
 async def get_current_week_program() -> WeeklyProgramResponse:
     """
     Get the current weekly program.
@@ -771,13 +1125,76 @@ async def get_current_week_program() -> WeeklyProgramResponse:
     )
 
 
+@router.get(
+    "/program/calendar", response_model=ProgramCalendarResponse,
+    tags=["misc"]
+)
+@read_only
+async def get_program_calendar(
+        start: Optional[date] = Query(
+            None, description="A day of the first week. Default: today"
+        ),
+        weeks: int = Query(1, ge=1, le=PROGRAM_CALENDAR_MAX_WEEKS),
+        tz: str = Query(
+            "UTC", description="IANA time zone of the weeks and release"
+                               " times, e.g. 'Europe/Istanbul'"
+        ),
+) -> ProgramCalendarResponse:
+    """
+    The program of one or more weeks, Monday to Sunday in the given time
+    zone. Served from the in-memory release index, see
+    helpers/release_index.py.
+    """
+    try:
+        tzinfo = pytz.timezone(tz)
+    except pytz.UnknownTimeZoneError:
+        raise HTTPException(status_code=400, detail="Unknown time zone")
+    try:
+        await release_index.ensure_loaded()
+    except Exception as e:
+        logging.error(f"Error loading release index: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error loading program"
+        ) from e
+
+    first_day = start or datetime.now(tzinfo).date()
+    first_day -= timedelta(days=first_day.weekday())
+    now = datetime.now(pytz.utc)
+    program_weeks = []
+    for week in range(weeks):
+        week_start = first_day + timedelta(weeks=week)
+        stories = release_index.between(
+            tzinfo.localize(datetime.combine(week_start, datetime.min.time())),
+            tzinfo.localize(datetime.combine(week_start + timedelta(days=7),
+                                             datetime.min.time()))
+        )
+        program_weeks.append(ProgramWeek(
+            week_start_date=week_start.isoformat(),
+            week_end_date=(week_start + timedelta(days=6)).isoformat(),
+            stories=[
+                WeeklyProgramStory(**{
+                    **story,
+                    "release_date": story["release_date"].astimezone(
+                        tzinfo
+                    ).isoformat(),
+                    # Not linked before the program says it is out:
+                    "storyGlobalId": story["storyGlobalId"]
+                    if story["release_date"] <= now else None,
+                }) for story in stories
+            ]
+        ))
+    return ProgramCalendarResponse(timezone=tzinfo.zone, weeks=program_weeks)
+
+
 async def get_cached_weekly_program():
     try:
         with open(CACHED_WEEKLY_PROGRAM_PATH, "r") as file:
             cached_program = json.load(file)
+        record_cache_lookup("weekly_program", True)
         logging.info("Received weekly program from cache")
         return cached_program
     except FileNotFoundError:
+        record_cache_lookup("weekly_program", False)
         logging.info("Received weekly program without cache")
         return await build_weekly_program()
     except Exception as e:
@@ -785,6 +1202,7 @@ async def get_cached_weekly_program():
         return None
 
 
+@single_flight
 async def build_weekly_program():
     try:
         # Calculate the start and end date of the current week
@@ -850,13 +1268,16 @@ async def build_weekly_program():
 
 
 @router.get("/feed.xml", response_class=FileResponse, tags=["misc"])
+@read_only
 async def get_recent_stories_feed():
     try:
         with open("feed.xml", "r") as file:
             pass
+        record_cache_lookup("rss_feed", True)
         logging.info("Received feed with cache")
         return "feed.xml"
     except FileNotFoundError:
+        record_cache_lookup("rss_feed", False)
         await build_rss_feed()
         logging.info("Received feed without cache")
         return "feed.xml"
@@ -865,6 +1286,55 @@ async def get_recent_stories_feed():
         return None
 
 
+@router.get(
+    "/series/{seriesGlobalId}/feed.xml", tags=["stories & series"]
+)
+@read_only
+async def get_series_feed_xml(
+        seriesGlobalId: str,
+        if_none_match: Optional[str] = Header(None),
+        if_modified_since: Optional[str] = Header(None),
+):
+    """
+    RSS feed of the latest stories of one series. Supports conditional GET
+    with If-None-Match and If-Modified-Since.
+    """
+    try:
+        feed = await get_series_feed(seriesGlobalId)
+    except Exception as e:
+        logging.error(f"Error building series feed: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error building series feed"
+        ) from e
+    if feed is None:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return feed_response(feed, if_none_match, if_modified_since)
+
+
+@router.get("/tags/{tag}/feed.xml", tags=["tags"])
+@read_only
+async def get_tag_feed_xml(
+        tag: str,
+        if_none_match: Optional[str] = Header(None),
+        if_modified_since: Optional[str] = Header(None),
+):
+    """
+    RSS feed of the latest stories of the series with a tag. Supports
+    conditional GET with If-None-Match and If-Modified-Since.
+    """
+    try:
+        feed = await get_tag_feed(tag)
+    except Exception as e:
+        logging.error(f"Error building tag feed: {e}")
+        raise HTTPException(
+            status_code=500, detail="Error building tag feed"
+        ) from e
+    if feed is None:
+        raise HTTPException(status_code=404, detail="Tag not found")
+    return feed_response(feed, if_none_match, if_modified_since)
+
+
+@single_flight
 async def build_rss_feed():
     # Get the 5 most recent published stories
     recent_stories = await models.Story.filter(
@@ -878,7 +1348,6 @@ async def build_rss_feed():
 
     server_name = settings.SERVER_METADATA.get("name", "")
     server_url = settings.SERVER_METADATA.get("url", "")
-    server_slug = settings.SERVER_METADATA.get("slug", "")
     feed = feedgenerator.Rss201rev2Feed(
         title=f"{server_name} Chatfic Server RSS Feed",
         link=f"https://{server_url}/feed",
@@ -887,18 +1356,7 @@ async def build_rss_feed():
 
     # Add each story to the feed
     for story in recent_stories:
-        feed.add_item(
-            title=story.title,
-            link=f"https://chatficlab.com/cfs-{server_slug}/story-"
-                 f"{story.storyGlobalId}",
-            unique_id=f"{story.storyGlobalId}",
-            author_name=story.author,
-            categories=tuple(story.series.tagList()),
-            author_link=f"https://patreon.com/{story.patreonusername}" if
-            story.patreonusername else "https://chatficlab.com",
-            description=story.description,
-            pubdate=story.release_date,
-        )
+        add_story_item(feed, story, tuple(story.series.tagList()))
 
     rss_file_path = "./feed.xml"
     with open(rss_file_path, 'w', encoding='utf-8') as rss_file:
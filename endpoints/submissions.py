@@ -1,17 +1,61 @@
+import asyncio
+import json
+import time
+
 from fastapi import APIRouter, HTTPException, Query, Path, Depends, Header
-from endpoints.response_models import StorySubmissionResponse, SubmissionListResponse, SubmissionToStoryRequest, SubmissionToStoryResponse
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from endpoints.response_models import StorySubmissionResponse, SubmissionListResponse, SubmissionToStoryRequest, SubmissionToStoryResponse, \
+    StorySubmissionSummary, SubmissionSummaryListResponse, SubmissionSeriesSummary, StoryReleaseResponse, \
+    SubmissionStageStats, SubmissionStageStatsResponse
 from database.models import StorySubmission, Story_SubmissionIn_Pydantic, \
-    Story_Submission_Pydantic, SubmissionStatus, Story, Series
+    Story_Submission_Pydantic, SubmissionStatus, Story, Series, SubmissionEvent
 from helpers.auth import validate_and_decode_jwt, \
-    enforce_and_extract_username_or_admin
+    enforce_specific_username_or_admin, get_identity
+from helpers.cache import TTLCache
+from helpers.catalog_changes import record_change, record_story_release, \
+    SERIES, UPDATED
 from helpers.tasks import run_submission_preprocess, run_submission_postprocess
+from helpers.media import is_valid_content_hash
+from helpers.release_index import release_index
+from helpers.search_index import search_index
+from helpers.story_lookup import forget_unknown_story_id
+from helpers.notifications import subscribe, unsubscribe
+from helpers.submission_events import update_submission_status, \
+    record_submission_event, get_submission_logs
 from helpers.utils import create_s3_client
 from settings import S3_BUCKET
 from botocore.exceptions import ClientError
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta
+from tortoise.functions import Avg, Count, Max, Min
 router = APIRouter()
 
+# Statuses after which a submission doesn't change anymore without user action:
+FINAL_SUBMISSION_STATUSES = {
+    SubmissionStatus.NOT_ACCEPTED,
+    SubmissionStatus.VALIDATION_FAILED,
+    SubmissionStatus.REPEATED,
+    SubmissionStatus.USER_UPLOAD_FAILED,
+    SubmissionStatus.POST_PROCESSING_FAILED,
+    SubmissionStatus.PROCESSED,
+}
+STATUS_STREAM_HEARTBEAT_SECONDS = 15
+STATUS_STREAM_MAX_SECONDS = 600
+
+SUBMISSIONS_PER_PAGE = 10
+# Columns needed by list views. No story_text, logs, files_list or
+# upload_links, those can be megabytes per row:
+SUBMISSION_SUMMARY_FIELDS = (
+    "idstorysubmission", "title", "description", "author", "storyGlobalId",
+    "submission_date", "status", "series_id", "series__name",
+    "series__seriesGlobalId", "story_id", "story__storyGlobalId",
+    "story__release_date", "story__exclude_from_rss",
+)
+# Total submission counts of list views,
+# (username, filter_type, status) -> total
+_submission_totals = TTLCache(maxsize=1024, ttl=60, name="submission_totals")
+
 @router.get("/validate")
 async def validate(token: str = Query(...)):
     decoded_payload = validate_and_decode_jwt(token)
@@ -23,8 +67,7 @@ async def validate(token: str = Query(...)):
 @router.post("/story_submissions", response_model=StorySubmissionResponse)
 async def create_story_submission(
         story_submission: Story_SubmissionIn_Pydantic,
-        authorization: Optional[str] = Header(None, convert_underscores=False)):
-    username = enforce_and_extract_username_or_admin(authorization)
+        username: str = Depends(get_identity)):
     try:
         if "storybasic.json" not in [file.get("name","") for file in story_submission.files_list]:
             raise HTTPException(status_code=400,
@@ -33,11 +76,17 @@ async def create_story_submission(
             if 'name' not in file or 'size' not in file:
                 raise HTTPException(status_code=400,
                                     detail="Each file must contain 'name' and 'size' keys.")
+            # optional sha256 of the file, lets us reuse shared media:
+            if 'hash' in file and not is_valid_content_hash(file['hash']):
+                raise HTTPException(status_code=400,
+                                    detail="File 'hash' must be a lowercase hex sha256 digest.")
+            file.pop('sharedKey', None)
 
         # Create a new story submission in the database
         new_submission = await StorySubmission.create(
             username=username,
             **story_submission.dict())
+        _submission_totals.clear()
 
         # Serialize the created submission
         submission_data = await Story_Submission_Pydantic.from_tortoise_orm(
@@ -54,10 +103,131 @@ async def create_story_submission(
         raise HTTPException(status_code=500,
                             detail=f"Error creating story submission: {str(e)}")
 
+def filter_submissions(username: str, filter_type: str, status: Optional[int]):
+    """
+    Returns the submissions query of list views, newest first.
+    Admins see every submission, users only see their own.
+    """
+    if username == "admin":
+        query = StorySubmission.all().order_by("-submission_date")
+    else:
+        query = StorySubmission.filter(username=username).order_by("-submission_date")
+
+    if filter_type == "without_story":
+        query = query.filter(story_id__isnull=True)
+    elif filter_type == "with_story":
+        query = query.filter(story_id__isnull=False)
+
+    if status is not None:
+        query = query.filter(status=status)
+    return query
+
+@router.get("/story_submissions/summary", response_model=SubmissionSummaryListResponse)
+async def list_submission_summaries(
+    page: int = Query(1, description="Page number, starting from 1"),
+    filter_type: str = Query("with_story", description="Filter type: all, with_story, without_story"),
+    status: Optional[int] = Query(None, description="Filter by submission status"),
+    username: str = Depends(get_identity)
+):
+    """
+    Lightweight version of GET /story_submissions for list views.
+
+    The page is fetched with a single query that only selects the listed
+    columns. Story text, logs, files and upload links are left out, use
+    GET /story_submissions/{submission_id} for those.
+
+    total is exact on the last page. On other pages it can be up to a
+    minute old.
+    """
+    try:
+        page = max(page, 1)
+        skip = (page - 1) * SUBMISSIONS_PER_PAGE
+        query = filter_submissions(username, filter_type, status)
+
+        rows = await query.offset(skip).limit(
+            SUBMISSIONS_PER_PAGE + 1
+        ).values(*SUBMISSION_SUMMARY_FIELDS)
+
+        has_next = len(rows) > SUBMISSIONS_PER_PAGE
+        rows = rows[:SUBMISSIONS_PER_PAGE]
+
+        total_key = (username, filter_type, status)
+        if not has_next and (rows or page == 1):
+            total = skip + len(rows)
+            _submission_totals.set(total_key, total)
+        else:
+            total = _submission_totals.get(total_key)
+            if total is None or total < skip + len(rows) + has_next:
+                total = await query.count()
+                _submission_totals.set(total_key, total)
+
+        submissions = [
+            StorySubmissionSummary(
+                idstorysubmission=row["idstorysubmission"],
+                title=row["title"],
+                description=row["description"],
+                author=row["author"],
+                storyGlobalId=row["storyGlobalId"],
+                series=SubmissionSeriesSummary(
+                    idseries=row["series_id"],
+                    name=row["series__name"],
+                    seriesGlobalId=row["series__seriesGlobalId"]
+                ),
+                submission_date=row["submission_date"],
+                status=row["status"],
+                story_id=row["story_id"],
+                story=StoryReleaseResponse(
+                    idstory=row["story_id"],
+                    storyGlobalId=row["story__storyGlobalId"],
+                    release_date=row["story__release_date"],
+                    exclude_from_rss=row["story__exclude_from_rss"]
+                ) if row["story_id"] is not None else None
+            )
+            for row in rows
+        ]
+
+        return SubmissionSummaryListResponse(
+            submissions=submissions,
+            total=total,
+            page=page,
+            next_page=page + 1 if has_next else None
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching submissions: {str(e)}"
+        )
+
+@router.get("/story_submissions/stats/stages", response_model=SubmissionStageStatsResponse)
+async def get_submission_stage_stats(
+    days: int = Query(30, ge=1, le=365, description="Only include events of the last n days"),
+    authorization: Optional[str] = Header(None, convert_underscores=False)
+):
+    """
+    Per-stage latency statistics of submission processing, from the
+    submission events. Admin only.
+    """
+    enforce_specific_username_or_admin(authorization, None)
+    since = datetime.now() - timedelta(days=days)
+    rows = await SubmissionEvent.filter(
+        created_at__gte=since,
+        duration_ms__isnull=False
+    ).annotate(
+        count=Count("id"),
+        avg_ms=Avg("duration_ms"),
+        min_ms=Min("duration_ms"),
+        max_ms=Max("duration_ms"),
+    ).group_by("stage", "status").order_by("stage", "status").values(
+        "stage", "status", "count", "avg_ms", "min_ms", "max_ms"
+    )
+    return SubmissionStageStatsResponse(
+        since=since,
+        stages=[SubmissionStageStats(**row) for row in rows]
+    )
+
 @router.get("/story_submissions/{submission_id}", response_model=StorySubmissionResponse)
 async def get_story_submission(submission_id: int,
-        authorization: Optional[str] = Header(None, convert_underscores=False)):
-    username = enforce_and_extract_username_or_admin(authorization)
+        username: str = Depends(get_identity)):
     try:
 
         # Fetch the story submission from the database
@@ -75,16 +245,87 @@ async def get_story_submission(submission_id: int,
 
         # Serialize the submission data
         submission_data = await Story_Submission_Pydantic.from_tortoise_orm(submission)
+        submission_logs = await get_submission_logs([submission])
 
         # Return the serialized submission data
-        return StorySubmissionResponse(**submission_data.model_dump())
+        return StorySubmissionResponse(**{
+            **submission_data.model_dump(),
+            "logs": submission_logs[submission.idstorysubmission]
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving story submission: {str(e)}")
 
+@router.get("/story_submissions/{submission_id}/events")
+async def stream_story_submission_status(
+        submission_id: int,
+        request: Request,
+        username: str = Depends(get_identity)):
+    """
+    Server-sent events stream of a submission's status, instead of polling
+    GET /story_submissions/{submission_id}.
+
+    Sends an event with the current status first, then one event per status
+    change, as the queue tasks make them. The stream ends when the
+    submission reaches a final status, or after 10 minutes. Clients should
+    reconnect after that, or after registering their upload.
+    """
+    status_query = StorySubmission.filter(idstorysubmission=submission_id)
+    if username != "admin":
+        status_query = status_query.filter(username=username)
+
+    # Subscribe before reading the current status, so no change is missed:
+    queue = subscribe(submission_id)
+    try:
+        status = await status_query.first().values_list("status", flat=True)
+    except Exception:
+        unsubscribe(submission_id, queue)
+        raise
+    if status is None:
+        unsubscribe(submission_id, queue)
+        raise HTTPException(status_code=404, detail="Submission not found.")
+
+    async def event_stream():
+        last_status = None
+        current_status = status
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STATUS_STREAM_MAX_SECONDS
+        try:
+            while True:
+                # Statuses only move forward. Notifications replayed by the
+                # poller can be older than the status read from the
+                # database, those are dropped:
+                if last_status is None or current_status > last_status:
+                    last_status = current_status
+                    yield "event: status\ndata: " + json.dumps(
+                        {"idstorysubmission": submission_id,
+                         "status": int(current_status)}
+                    ) + "\n\n"
+                if last_status in FINAL_SUBMISSION_STATUSES or \
+                        loop.time() > deadline or \
+                        await request.is_disconnected():
+                    return
+                try:
+                    current_status = await asyncio.wait_for(
+                        queue.get(), STATUS_STREAM_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Cheap safety net in case a notification got lost:
+                    current_status = await status_query.first().values_list(
+                        "status", flat=True
+                    ) or last_status
+                    yield ": keep-alive\n\n"
+        finally:
+            unsubscribe(submission_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/story_submissions/{submission_id}/register_upload")
 async def register_upload(submission_id: int,
-        authorization: Optional[str] = Header(None, convert_underscores=False)):
-    username = enforce_and_extract_username_or_admin(authorization)
+        username: str = Depends(get_identity)):
     try:
 
         # Fetch the story submission from the database
@@ -112,32 +353,34 @@ async def register_upload(submission_id: int,
                                 detail="No upload links found for this submission.")
 
         # Verify uploaded files in S3
+        started_at = time.monotonic()
         s3_client = create_s3_client()
         all_files_uploaded = True
-        submission_logs = (str(submission.logs) or "")
         for file in submission.upload_links:
             key = f"story/{submission.storyGlobalId}/{file['name']}"
             try:
                 s3_client.head_object(Bucket=S3_BUCKET, Key=key)
             except (ClientError, s3_client.exceptions.NoSuchKey) as e:
-                submission_logs = submission_logs + f"- File {file['name']} not found in S3.\n"
-                await submission.save()
+                await record_submission_event(
+                    submission.idstorysubmission, "upload",
+                    f"File {file['name']} not found in S3."
+                )
                 all_files_uploaded = False
                 break
 
         # Update submission status based on file upload verification
         if all_files_uploaded:
-            submission.status = SubmissionStatus.WAITING_POST_PROCESSING
-            submission_logs = submission_logs + "- All files uploaded successfully.\n"
-            submission.logs = submission_logs
-            await submission.save()
+            await update_submission_status(
+                submission, SubmissionStatus.WAITING_POST_PROCESSING,
+                "upload", "All files uploaded successfully.", started_at
+            )
             # Trigger the post processing task
             run_submission_postprocess(submission.idstorysubmission)
         else:
-            submission.status = SubmissionStatus.USER_UPLOAD_FAILED
-            submission_logs = submission_logs + "- Some files are missing in S3.\n"
-            submission.logs = submission_logs
-            await submission.save()
+            await update_submission_status(
+                submission, SubmissionStatus.USER_UPLOAD_FAILED,
+                "upload", "Some files are missing in S3.", started_at
+            )
 
         return {"status": submission.status}
     except Exception as e:
@@ -149,28 +392,14 @@ async def list_submissions(
     page: int = Query(1, description="Page number, starting from 1"),
     filter_type: str = Query("with_story", description="Filter type: all, with_story, without_story"),
     status: Optional[int] = Query(None, description="Filter by submission status"),
-    authorization: Optional[str] = Header(None, convert_underscores=False)
+    username: str = Depends(get_identity)
 ):
-    username = enforce_and_extract_username_or_admin(authorization)
     try:
 
-        per_page = 10
+        per_page = SUBMISSIONS_PER_PAGE
         skip = (page - 1) * per_page
 
-        # Base query
-        if username == "admin":
-            query = StorySubmission.all().order_by("-submission_date")
-        else:
-            query = StorySubmission.filter(username=username).order_by("-submission_date")
-
-        # Apply filters
-        if filter_type == "without_story":
-            query = query.filter(story_id__isnull=True)
-        elif filter_type == "with_story":
-            query = query.filter(story_id__isnull=False)
-
-        if status is not None:
-            query = query.filter(status=status)
+        query = filter_submissions(username, filter_type, status)
 
         # Count total items for pagination
         total = await query.count()
@@ -192,9 +421,14 @@ async def list_submissions(
             for submission in submissions
         ]
 
+        submission_logs = await get_submission_logs(submissions)
+
         # Create response objects
         submission_responses = [
-            StorySubmissionResponse(story_id=data.story.idstory if hasattr(data, 'story') and hasattr(data.story, 'idstory') else None, **data.model_dump())
+            StorySubmissionResponse(story_id=data.story.idstory if hasattr(data, 'story') and hasattr(data.story, 'idstory') else None, **{
+                **data.model_dump(),
+                "logs": submission_logs[data.idstorysubmission]
+            })
             for data in submission_data
         ]
 
@@ -214,9 +448,8 @@ async def list_submissions(
 async def convert_submission_to_story(
     submission_id: int = Path(..., description="ID of submission to convert"),
     conversion_data: SubmissionToStoryRequest = None,
-    authorization: Optional[str] = Header(None, convert_underscores=False)
+    username: str = Depends(get_identity)
 ):
-    username = enforce_and_extract_username_or_admin(authorization)
     try:
         # Get the submission
         if username == "admin":
@@ -277,13 +510,23 @@ async def convert_submission_to_story(
         # Update the submission to link to the story
         submission.story = new_story
         await submission.save()
+        forget_unknown_story_id(new_story.storyGlobalId)
+
+        if release_date <= datetime.now(release_date.tzinfo):
+            # Scheduled releases are recorded by record_story_releases.
+            await record_story_release(new_story)
 
         # Update series's episode count:
+        series = None
         if submission.series_id:
             series = await Series.get_or_none(idseries=submission.series_id)
             if series:
                 series.episodes += 1
                 await series.save()
+                await record_change(SERIES, UPDATED, series.idseries,
+                                    series.seriesGlobalId)
+        release_index.upsert(new_story, series)
+        search_index.add_story(new_story)
 
         return SubmissionToStoryResponse(
             success=True,
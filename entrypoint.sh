@@ -8,6 +8,12 @@ python database/migrate.py
 # aerich migrate
 aerich upgrade
 
+# Shared metrics directory of the gunicorn workers and the huey consumer,
+# emptied on every start:
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/chatficdb_metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # Start the Huey worker in the background
 /usr/local/bin/huey_consumer --workers=1 helpers.tasks.huey > /proc/1/fd/1 2>/proc/1/fd/2 &
 
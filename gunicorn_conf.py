@@ -1,4 +1,7 @@
 import logging
+import os
+
+from prometheus_client import multiprocess
 
 bind = "0.0.0.0:8000"
 workers = 2
@@ -11,3 +14,9 @@ max_requests_jitter = 10
 loglevel = "info"  # Set the log level to capture errors and above
 errorlog = "-"  # Log errors to stdout
 accesslog = "-"  # Log access to stdout
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of the exited worker from /metrics:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -5,6 +5,11 @@ Functions:
 - validate_token: Validates the `Authorization` header to ensure the provided
 token is in the correct format
   and matches the expected admin authentication token.
+- validate_and_decode_jwt: Verifies a user JWT. Verified tokens are cached
+  until they expire, so repeated requests with the same token skip the
+  signature verification.
+- get_identity: FastAPI dependency resolving the caller ("admin" or the JWT
+  sub) once per request.
 
 Dependencies:
 - FastAPI: Used for raising HTTP exceptions.
@@ -16,16 +21,29 @@ Usage:
 This module is primarily used to validate API requests that require
 admin-level authentication.
 """
+import hashlib
+import logging
 import time
 from secrets import compare_digest
+from typing import Optional
 
 import jwt
 from cryptography.hazmat.primitives.serialization import load_pem_public_key
 from fastapi import HTTPException, Header
+
+from helpers.cache import TTLCache
 from settings import ADMIN_AUTH_TOKEN, REGISTERED_PUBLIC_KEY_FILE, SERVER_METADATA
 
 _loaded_public_key = None  # module-level cache
 
+# Verified JWT payloads, keyed by the sha256 of the token. Entries expire
+# together with their token. Tokens without an exp claim are re-verified
+# after VERIFIED_JWT_MAX_CACHE_SECONDS.
+VERIFIED_JWT_CACHE_SIZE = 1024
+VERIFIED_JWT_MAX_CACHE_SECONDS = 3600
+_verified_jwt_cache = TTLCache(maxsize=VERIFIED_JWT_CACHE_SIZE,
+                               name="verified_jwt")
+
 def get_bearer_token(authorization: str):
     if not str(authorization).startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid token format")
@@ -52,6 +70,12 @@ def validate_and_decode_jwt_from_bearer(
     return validate_and_decode_jwt(token)
 
 def validate_and_decode_jwt(jwt_token: str):
+    cache_key = hashlib.sha256(str(jwt_token).encode()).digest()
+    decoded = _verified_jwt_cache.get(cache_key)
+    if decoded is not None:
+        # Callers get their own copy of the shared cached payload:
+        return dict(decoded)
+
     loaded_public_key = _load_public_key_once()
 
     try:
@@ -61,13 +85,19 @@ def validate_and_decode_jwt(jwt_token: str):
             algorithms=["EdDSA"],
             audience=SERVER_METADATA.get("slug")
         )
-        print("\n✅ JWT verified! Payload:\n", decoded)
-        return decoded
+        logging.debug("JWT verified for sub: %s", decoded.get("sub"))
     except jwt.exceptions.ExpiredSignatureError as e:
         raise HTTPException(status_code=498, detail="Token has expired.")
     except jwt.exceptions.InvalidTokenError as e:
         raise HTTPException(status_code=401, detail="Invalid token.")
 
+    cache_seconds = VERIFIED_JWT_MAX_CACHE_SECONDS
+    if isinstance(decoded.get("exp"), (int, float)):
+        cache_seconds = min(cache_seconds, decoded["exp"] - time.time())
+    if cache_seconds > 0:
+        _verified_jwt_cache.set(cache_key, dict(decoded), ttl=cache_seconds)
+    return decoded
+
 from fastapi import HTTPException
 
 def enforce_specific_username_or_admin(
@@ -119,3 +149,18 @@ def enforce_and_extract_username_or_admin(authorization: str) -> str:
         )
 
     return sub
+
+
+async def get_identity(
+        authorization: Optional[str] = Header(None, convert_underscores=False)
+) -> str:
+    """
+    FastAPI dependency version of enforce_and_extract_username_or_admin.
+
+    Dependencies are resolved once per request, so handlers (and their other
+    dependencies) can share the caller's identity instead of checking the
+    token again. It is async so it runs on the event loop: a sync dependency
+    would run in the threadpool, and the verified JWT cache is not thread
+    safe.
+    """
+    return enforce_and_extract_username_or_admin(authorization)
@@ -0,0 +1,156 @@
+"""
+In-memory caching helpers.
+
+Every gunicorn worker has its own copy of these caches, so they are only used
+for data that is fine to be slightly stale, or that is invalidated by time.
+
+Classes:
+- TTLCache: Bounded least-recently-used cache with per-entry expiry.
+- SingleFlight: Concurrent identical calls share one computation.
+
+Functions:
+- single_flight: Decorator coalescing concurrent identical calls of an async
+  function (e.g. a handler in endpoints/stories.py).
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Awaitable, Callable, Hashable
+
+from helpers.metrics import record_cache_lookup
+
+
+class TTLCache:
+    """
+    Bounded least-recently-used cache with per-entry expiry.
+
+    Attributes:
+        maxsize (int): Maximum number of entries. Least recently used entries
+            are dropped first when the cache is full.
+        ttl (float | None): Default time to live of an entry in seconds.
+            None means entries only leave the cache when it is full.
+        name (str | None): Name of the cache in the
+            chatficdb_cache_requests_total metric. Lookups of unnamed caches
+            are not counted.
+    """
+    _MISSING = object()
+
+    def __init__(self, maxsize: int, ttl: float | None = None,
+                 name: str | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._entries: OrderedDict[Hashable, tuple[float | None, Any]] = \
+            OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._get(key)
+        if self.name is not None:
+            record_cache_lookup(self.name, value is not self._MISSING)
+        return default if value is self._MISSING else value
+
+    def _get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key, self._MISSING)
+        if entry is self._MISSING:
+            return entry
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return self._MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """
+        Store a value. ttl overrides the cache's default time to live.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.pop(key, self._MISSING)
+        return default if entry is self._MISSING else entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._get(key) is not self._MISSING
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key await one shared computation instead
+    of each running it. Nothing is cached: once the computation is done, the
+    next call with that key runs it again.
+
+    The computation runs in its own task, so a caller that goes away (e.g. a
+    client disconnecting) does not cancel it for the others. It runs in the
+    context of the first caller.
+
+    Attributes:
+        name (str | None): Name in the chatficdb_cache_requests_total metric,
+            a "hit" is a call that joined a running computation.
+    """
+
+    def __init__(self, name: str | None = None):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable,
+                  func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        task = self._calls.get(key)
+        if self.name is not None:
+            record_cache_lookup(self.name, task is not None)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+def _call_key(args: tuple, kwargs: dict) -> Hashable:
+    def freeze(value):
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(item) for item in value)
+        return value
+
+    key = (freeze(args), tuple(sorted(
+        (name, freeze(value)) for name, value in kwargs.items()
+    )))
+    hash(key)
+    return key
+
+
+def single_flight(func):
+    """
+    Coalesce concurrent calls of an async function made with the same
+    arguments. Calls with unhashable arguments run on their own.
+    """
+    flight = SingleFlight(name=f"single_flight:{func.__name__}")
+
+    @wraps(func)
+    async def wrapped(*args, **kwargs):
+        try:
+            key = _call_key(args, kwargs)
+        except TypeError:
+            return await func(*args, **kwargs)
+        return await flight.run(key, func, *args, **kwargs)
+
+    wrapped.flight = flight
+    return wrapped
@@ -0,0 +1,169 @@
+"""
+Catalog change log, for the incremental sync API (/changes).
+
+The write paths record a CatalogChange row for every change of the public
+catalog: create_series, add_tags_to_series and convert_submission_to_story.
+Stories become public when they are released, not when they are created, so
+stories only have "released" changes. Those of scheduled stories are
+recorded by the record_story_releases periodic task, and a dedupe key makes
+sure every release is recorded once.
+
+Series that have no released story yet are drafts, their changes are left
+out of the API. When the first story of a series is released, a "published"
+change of the series is recorded once, before the release, so clients fetch
+the series then, with the name and tags it got while it was a draft.
+
+Functions:
+- record_change: Record one change. Never raises.
+- record_story_release: Record the release of a story once, and the
+  publishing of its series if it is the first.
+- record_due_releases: Record the releases of stories that are due.
+- get_changes: The public changes after a sequence number.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+
+from database.models import CatalogChange, Series, Story
+
+SERIES = "series"
+STORY = "story"
+SERIES_TAGS = "series_tags"
+
+CREATED = "created"
+UPDATED = "updated"
+RELEASED = "released"
+PUBLISHED = "published"
+
+# Releases older than this are not looked for by the periodic task:
+RELEASE_LOOKBACK = timedelta(days=7)
+# A missing seq is a change that is still being inserted, and may commit
+# after higher ones: get_changes stops before it until the change after it
+# is this old. Older gaps are inserts that failed or were rolled back, they
+# use up a seq in MySQL too.
+CHANGES_GAP_SECONDS = 60
+
+
+def _release_key(story_id: int) -> str:
+    return f"release:{story_id}"
+
+
+def _publish_key(series_id: int) -> str:
+    return f"publish:{series_id}"
+
+
+async def record_change(kind: str, op: str, entity_id: int,
+                        global_id: str | None = None,
+                        dedupe_key: str | None = None) -> None:
+    """
+    Record one change of the catalog. Never raises, the change itself is
+    already saved.
+    """
+    try:
+        await CatalogChange.create(
+            kind=kind, op=op, entity_id=entity_id, global_id=global_id,
+            dedupe_key=dedupe_key
+        )
+    except IntegrityError:
+        # Recorded already.
+        pass
+    except Exception as e:
+        logging.error(f"Couldn't record catalog change {kind} {op} "
+                      f"{entity_id}: {e}")
+
+
+async def record_story_release(story: Story) -> None:
+    try:
+        series_global_id = await Series.filter(
+            idseries=story.series_id
+        ).first().values_list("seriesGlobalId", flat=True)
+    except Exception as e:
+        logging.error(f"Couldn't read series {story.series_id}: {e}")
+        series_global_id = None
+    await record_change(SERIES, PUBLISHED, story.series_id, series_global_id,
+                        dedupe_key=_publish_key(story.series_id))
+    await record_change(STORY, RELEASED, story.idstory, story.storyGlobalId,
+                        dedupe_key=_release_key(story.idstory))
+
+
+async def record_due_releases(now: datetime | None = None) -> int:
+    """
+    Record the releases of the stories released in the last
+    RELEASE_LOOKBACK that are not recorded yet.
+
+    Returns:
+        int: Number of releases recorded.
+    """
+    now = now or datetime.now()
+    stories = await Story.filter(
+        release_date__lte=now, release_date__gt=now - RELEASE_LOOKBACK
+    ).order_by("release_date").values_list(
+        "idstory", "storyGlobalId", "series_id", "series__seriesGlobalId"
+    )
+    if not stories:
+        return 0
+    series = dict((series_id, series_global_id)
+                  for _, _, series_id, series_global_id in stories)
+    recorded = set(await CatalogChange.filter(
+        dedupe_key__in=[_release_key(story_id) for story_id, *_ in stories]
+        + [_publish_key(series_id) for series_id in series]
+    ).values_list("dedupe_key", flat=True))
+    releases = [
+        CatalogChange(kind=STORY, op=RELEASED, entity_id=story_id,
+                      global_id=global_id,
+                      dedupe_key=_release_key(story_id))
+        for story_id, global_id, _, _ in stories
+        if _release_key(story_id) not in recorded
+    ]
+    # Publishing before the releases, so it gets the lower seq:
+    changes = [
+        CatalogChange(kind=SERIES, op=PUBLISHED, entity_id=series_id,
+                      global_id=series_global_id,
+                      dedupe_key=_publish_key(series_id))
+        for series_id, series_global_id in series.items()
+        if _publish_key(series_id) not in recorded
+    ] + releases
+    if changes:
+        # Changes recorded by the write path in the meantime are skipped:
+        await CatalogChange.bulk_create(changes, ignore_conflicts=True)
+    return len(releases)
+
+
+async def get_changes(since: int, limit: int) -> tuple[list[CatalogChange],
+                                                       int, bool]:
+    """
+    The public changes with a seq greater than since, in seq order. The
+    changes stop before the first missing seq that can still show up, so
+    the cursor never moves past a change that wasn't returned. Read them
+    from the primary, a replica can show them late.
+
+    Returns:
+        tuple: The changes, the cursor to continue from, and whether more
+            changes are waiting.
+    """
+    changes = await CatalogChange.filter(
+        seq__gt=since
+    ).order_by("seq").limit(limit + 1)
+    gaps_before = timezone.now() - timedelta(seconds=CHANGES_GAP_SECONDS)
+    previous_seq = since
+    for index, change in enumerate(changes):
+        if change.seq != previous_seq + 1 and \
+                change.created_at > gaps_before:
+            changes = changes[:index]
+            break
+        previous_seq = change.seq
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = changes[-1].seq if changes else since
+
+    series_ids = {change.entity_id for change in changes
+                  if change.kind != STORY}
+    if series_ids:
+        published = set(await Story.filter(
+            series_id__in=series_ids, release_date__lte=datetime.now()
+        ).distinct().values_list("series_id", flat=True))
+        changes = [change for change in changes
+                   if change.kind == STORY or change.entity_id in published]
+    return changes, cursor, has_more
@@ -0,0 +1,77 @@
+"""
+Full catalog export as NDJSON.
+
+Every published series is one JSON line with its tags and released stories.
+Series are read in keyset chunks (idseries > last id), with the stories and
+tags of a chunk in one query each, so memory stays flat whatever the size of
+the catalog. Reads go to the read replica when there is one.
+
+Functions:
+- export_catalog: Async generator of the NDJSON lines.
+- gzip_stream: Gzip an async stream of bytes.
+"""
+import json
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator
+
+from tortoise import connections
+
+import settings
+from database.models import Series, SeriesTagsRel, Story
+
+EXPORT_CHUNK_SIZE = 200
+STORY_FIELDS = ("idstory", "series_id", "title", "description", "author",
+                "patreonusername", "storyGlobalId", "release_date")
+
+
+async def export_catalog(chunk_size: int = EXPORT_CHUNK_SIZE
+                         ) -> AsyncIterator[bytes]:
+    db = connections.get(settings.READ_CONNECTION_NAME)
+    # One point in time for the whole export:
+    now = datetime.now()
+    last_id = 0
+    while True:
+        series_chunk = await Series.filter(
+            idseries__gt=last_id
+        ).using_db(db).order_by("idseries").limit(chunk_size).values(
+            "idseries", "name", "seriesGlobalId", "creator", "episodes"
+        )
+        if not series_chunk:
+            return
+        last_id = series_chunk[-1]["idseries"]
+        ids = [series["idseries"] for series in series_chunk]
+
+        stories = defaultdict(list)
+        for story in await Story.filter(
+                series_id__in=ids, release_date__lte=now
+        ).using_db(db).order_by("idstory").values(*STORY_FIELDS):
+            stories[story.pop("series_id")].append(story)
+
+        tags = defaultdict(list)
+        for series_id, tag in await SeriesTagsRel.filter(
+                series_id__in=ids
+        ).using_db(db).values_list("series_id", "tag__tag"):
+            tags[series_id].append(tag)
+
+        lines = []
+        for series in series_chunk:
+            # Drafts are left out:
+            if not stories[series["idseries"]]:
+                continue
+            series["cdn"] = settings.S3_LINK
+            series["tags"] = tags[series["idseries"]]
+            series["stories"] = stories[series["idseries"]]
+            lines.append(json.dumps(series, default=str))
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+
+
+async def gzip_stream(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in stream:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,115 @@
+"""
+Static catalog snapshot on S3.
+
+The responses of /landing, /series (first page), /tags and /program are the
+same for everyone. When CATALOG_SNAPSHOT_ENABLED is on, the huey consumer
+renders them with the API's own handlers and uploads them as JSON objects to
+S3_BUCKET under CATALOG_SNAPSHOT_PREFIX, and "/" advertises their URLs, so
+clients can read them from the CDN instead of the API.
+
+The snapshot is published again by the record_story_releases periodic task
+whenever the catalog change log moved (releases and catalog writes, see
+helpers/catalog_changes.py), and at least every SNAPSHOT_MAX_AGE_SECONDS for
+the weekly program.
+
+Functions:
+- snapshot_urls: Public URLs of the snapshot objects.
+- render_snapshots: The JSON bodies of the snapshot objects.
+- publish_catalog_snapshot: Render and upload the snapshot if it changed.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+import settings
+from database.models import CatalogChange
+from helpers.utils import create_s3_client
+
+SNAPSHOT_FILES = {
+    "landing": "landing.json",
+    "series": "series.json",
+    "tags": "tags.json",
+    "program": "program.json",
+}
+SNAPSHOT_MAX_AGE_SECONDS = 3600
+# Objects may be a minute older than the latest publish on the CDN:
+SNAPSHOT_CACHE_CONTROL = "public, max-age=60"
+
+# Change seq and time of the last publish of this process:
+_published_seq: int | None = None
+_published_at = 0.0
+
+
+def _key(name: str) -> str:
+    return f"{settings.CATALOG_SNAPSHOT_PREFIX}/{SNAPSHOT_FILES[name]}"
+
+
+def snapshot_urls() -> dict[str, str]:
+    return {
+        name: f"{settings.S3_LINK}/{_key(name)}" for name in SNAPSHOT_FILES
+    }
+
+
+async def render_snapshots() -> dict[str, bytes]:
+    # Imported here, endpoints.stories is not needed by the other huey tasks:
+    from endpoints import stories
+
+    await stories.build_weekly_program()
+    responses = {
+        "landing": await stories.get_landing(),
+        "series": await stories.fetch_series_page(
+            page=1, storyGlobalId=None, sort_by="new", tags_required=[],
+            include_drafts=False, creator=None, series_fields=None
+        ),
+        "tags": await stories.get_tags(),
+        "program": await stories.get_current_week_program(),
+    }
+    return {
+        name: json.dumps(jsonable_encoder(response)).encode()
+        for name, response in responses.items()
+    }
+
+
+def _upload(snapshots: dict[str, bytes]) -> None:
+    s3_client = create_s3_client()
+    for name, body in snapshots.items():
+        s3_client.put_object(
+            Bucket=settings.S3_BUCKET,
+            Key=_key(name),
+            Body=body,
+            ContentType="application/json",
+            CacheControl=SNAPSHOT_CACHE_CONTROL,
+        )
+
+
+async def publish_catalog_snapshot(force: bool = False) -> bool:
+    """
+    Render and upload the snapshot, unless nothing changed since the last
+    publish.
+
+    Returns:
+        bool: True if the snapshot was published.
+    """
+    global _published_seq, _published_at
+    if not settings.CATALOG_SNAPSHOT_ENABLED:
+        return False
+    seqs = await CatalogChange.all().order_by("-seq").limit(1).values_list(
+        "seq", flat=True
+    )
+    seq = seqs[0] if seqs else 0
+    if not force and seq == _published_seq \
+            and time.monotonic() - _published_at < SNAPSHOT_MAX_AGE_SECONDS:
+        return False
+
+    try:
+        snapshots = await render_snapshots()
+        await asyncio.to_thread(_upload, snapshots)
+    except Exception as e:
+        logging.error(f"Couldn't publish catalog snapshot: {e}")
+        return False
+    _published_seq = seq
+    _published_at = time.monotonic()
+    return True
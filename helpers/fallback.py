@@ -0,0 +1,178 @@
+"""
+Serving the catalog while MySQL is slow or down.
+
+Catalog handlers fetch their response through LastKnownGood.fetch:
+- Each fetch gets CATALOG_QUERY_BUDGET_SECONDS. A fetch that is slower
+  counts as a failure. It keeps running in the background and refreshes the
+  stored response when it finishes, while the request is answered from the
+  last good response. Requests for the same response join the running fetch
+  instead of starting another query.
+- A failed or slow fetch is answered with the last good response of the
+  same request, marked with stale=True. Without one, the request fails with
+  503 instead of an empty list, so clients don't cache "no stories".
+- A CircuitBreaker shared by the catalog opens after
+  CIRCUIT_BREAKER_FAILURES consecutive failures. While it is open, requests
+  are answered from the last good responses without touching the pool.
+  After CIRCUIT_BREAKER_RESET_SECONDS one request is let through to probe the
+  database.
+
+Last good responses are kept per worker, in memory.
+
+Classes:
+- CircuitBreaker
+- LastKnownGood
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge
+
+from helpers.cache import SingleFlight, TTLCache
+
+T = TypeVar("T")
+
+STALE_RESPONSES = Counter(
+    "chatficdb_stale_responses_total",
+    "Responses served from the last known good copy.",
+    ["endpoint", "reason"],
+)
+CIRCUIT_OPEN = Gauge(
+    "chatficdb_circuit_breaker_open",
+    "1 while the circuit breaker is open.",
+    ["name"],
+    multiprocess_mode="livemax",
+)
+
+
+class CircuitBreaker:
+    """
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_seconds (float): How long the circuit stays open before one
+            call is let through to probe.
+    """
+
+    def __init__(self, name: str, failure_threshold: int,
+                 reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go to the database now.
+        """
+        if self._opened_at is None:
+            return True
+        if self._probing \
+                or time.monotonic() < self._opened_at + self.reset_seconds:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probing = False
+        if self._opened_at is not None:
+            logging.warning(f"Circuit breaker {self.name} closed")
+            self._opened_at = None
+            CIRCUIT_OPEN.labels(self.name).set(0)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or (self._opened_at is None
+                             and self._failures >= self.failure_threshold):
+            if self._opened_at is None:
+                logging.error(
+                    f"Circuit breaker {self.name} opened after "
+                    f"{self._failures} failures"
+                )
+            self._opened_at = time.monotonic()
+            CIRCUIT_OPEN.labels(self.name).set(1)
+        self._probing = False
+
+
+class LastKnownGood:
+    """
+    Last good responses of one endpoint.
+
+    Responses must be pydantic models with a `stale` field.
+    """
+
+    def __init__(self, endpoint: str, breaker: CircuitBreaker,
+                 budget_seconds: float, maxsize: int = 1024,
+                 max_age_seconds: float = 86400):
+        self.endpoint = endpoint
+        self.breaker = breaker
+        self.budget_seconds = budget_seconds
+        self._responses = TTLCache(maxsize=maxsize, ttl=max_age_seconds)
+        # At most one fetch per key runs at a time, including fetches that
+        # outlived their request:
+        self._fetches = SingleFlight()
+
+    async def fetch(self, key: Hashable,
+                    fetch: Callable[[], Awaitable[T]]) -> T:
+        if not self.breaker.allow():
+            return self._stale(key, "circuit_open", None)
+
+        try:
+            return await asyncio.wait_for(
+                self._fetches.run(key, self._revalidate, key, fetch),
+                self.budget_seconds
+            )
+        except HTTPException:
+            # Errors of the request itself, e.g. 400.
+            raise
+        except asyncio.TimeoutError as e:
+            # The slow fetch keeps running and keeps its response for the
+            # next requests, which wait for it instead of starting another.
+            self.breaker.record_failure()
+            return self._stale(key, "timeout", e)
+        except Exception as e:
+            return self._stale(key, "error", e)
+
+    async def _revalidate(self, key: Hashable,
+                          fetch: Callable[[], Awaitable[T]]) -> T:
+        started_at = time.monotonic()
+        try:
+            response = await fetch()
+        except HTTPException:
+            self.breaker.record_success()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            if time.monotonic() - started_at > self.budget_seconds:
+                logging.error(f"{self.endpoint} failed after timeout: {e}")
+            raise
+        self._responses.set(key, response)
+        # A response slower than the budget was already counted as a
+        # failure, it doesn't close the circuit:
+        if time.monotonic() - started_at <= self.budget_seconds:
+            self.breaker.record_success()
+        return response
+
+    def _stale(self, key: Hashable, reason: str,
+               error: Exception | None) -> T:
+        if error is not None:
+            logging.error(f"{self.endpoint} failed ({reason}): {error!r}")
+        response = self._responses.get(key)
+        if response is None:
+            raise HTTPException(
+                status_code=503,
+                detail="The catalog is temporarily unavailable.",
+                headers={"Retry-After": str(
+                    int(self.breaker.reset_seconds)
+                )}
+            )
+        STALE_RESPONSES.labels(self.endpoint, reason).inc()
+        return response.model_copy(update={"stale": True})
@@ -0,0 +1,256 @@
+"""
+Per-series and per-tag RSS feeds.
+
+Feeds are built on request and kept per worker in a bounded cache. A cached
+feed stays valid until a story of its scope is released: at most every
+FEED_REFRESH_SECONDS, the catalog change log (helpers/catalog_changes.py) is
+read from the last seen seq, and the feeds of the series that had a release
+or a tag change are dropped, along with the feeds of their current tags and
+the tag feeds that list their stories (a removed tag's feed must not keep
+them).
+
+Classes:
+- ScopedFeed: A rendered feed with its validators.
+
+Functions:
+- add_story_item: Add a story to a feed, shared with the global /feed.xml.
+- get_series_feed: The feed of a series.
+- get_tag_feed: The feed of a tag.
+- feed_response: The response to a conditional GET of a feed.
+"""
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+import feedgenerator
+from starlette.responses import Response
+
+import settings
+from database.models import CatalogChange, Series, SeriesTagsRel, Story, Tag
+from helpers.cache import single_flight, TTLCache
+from helpers.catalog_changes import SERIES_TAGS, STORY
+
+FEED_REFRESH_SECONDS = 10
+# More changes than this since the last check drop every feed instead:
+MAX_CHANGES_PER_REFRESH = 1000
+
+_feeds = TTLCache(maxsize=settings.FEED_CACHE_SIZE, name="scoped_feeds")
+# Tags of the cached tag feeds that list stories of a series, by idseries:
+_tag_feeds_of_series: dict[int, set[str]] = {}
+_seen_seq: int | None = None
+_checked_at = 0.0
+
+
+@dataclass(frozen=True)
+class ScopedFeed:
+    body: bytes
+    etag: str
+    last_modified: datetime
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def add_story_item(feed: feedgenerator.Rss201rev2Feed, story: Story,
+                   categories: tuple) -> None:
+    server_slug = settings.SERVER_METADATA.get("slug", "")
+    feed.add_item(
+        title=story.title,
+        link=f"https://chatficlab.com/cfs-{server_slug}/story-"
+             f"{story.storyGlobalId}",
+        unique_id=f"{story.storyGlobalId}",
+        author_name=story.author,
+        categories=categories,
+        author_link=f"https://patreon.com/{story.patreonusername}" if
+        story.patreonusername else "https://chatficlab.com",
+        description=story.description,
+        pubdate=story.release_date,
+    )
+
+
+def _render(feed: feedgenerator.Rss201rev2Feed) -> ScopedFeed:
+    body = feed.writeString("utf-8").encode("utf-8")
+    # Without items the feed was last modified when it was built:
+    last_modified = _as_utc(feed.latest_post_date()).replace(microsecond=0)
+    return ScopedFeed(
+        body=body,
+        etag=f'"{hashlib.sha1(body).hexdigest()}"',
+        last_modified=last_modified,
+    )
+
+
+async def _released_stories(**filters) -> list[Story]:
+    return await Story.filter(
+        release_date__lte=datetime.now(), exclude_from_rss=False, **filters
+    ).order_by("-release_date").limit(settings.FEED_ITEMS)
+
+
+async def _drop_changed_feeds() -> None:
+    global _checked_at
+    if time.monotonic() - _checked_at < FEED_REFRESH_SECONDS:
+        return
+    _checked_at = time.monotonic()
+    await _read_changes()
+
+
+@single_flight
+async def _read_changes() -> None:
+    global _seen_seq
+    if _seen_seq is None:
+        # Nothing is cached before the first check:
+        _seen_seq = await CatalogChange.all().order_by("-seq").first(
+        ).values_list("seq", flat=True) or 0
+        return
+
+    changes = await CatalogChange.filter(
+        seq__gt=_seen_seq, kind__in=(STORY, SERIES_TAGS)
+    ).order_by("seq").limit(MAX_CHANGES_PER_REFRESH + 1).values_list(
+        "seq", "kind", "entity_id"
+    )
+    if not changes:
+        return
+    if len(changes) > MAX_CHANGES_PER_REFRESH:
+        _feeds.clear()
+        _tag_feeds_of_series.clear()
+        _seen_seq = await CatalogChange.all().order_by("-seq").first(
+        ).values_list("seq", flat=True)
+        return
+
+    series_ids = {entity_id for _, kind, entity_id in changes
+                  if kind == SERIES_TAGS}
+    story_ids = [entity_id for _, kind, entity_id in changes
+                 if kind == STORY]
+    if story_ids:
+        series_ids.update(await Story.filter(
+            idstory__in=story_ids
+        ).values_list("series_id", flat=True))
+    for global_id in await Series.filter(
+            idseries__in=series_ids
+    ).values_list("seriesGlobalId", flat=True):
+        _feeds.pop(("series", global_id))
+    for tag in await SeriesTagsRel.filter(
+            series_id__in=series_ids
+    ).values_list("tag__tag", flat=True):
+        _feeds.pop(("tag", tag))
+    for series_id in series_ids:
+        for tag in _tag_feeds_of_series.pop(series_id, ()):
+            _feeds.pop(("tag", tag))
+    _seen_seq = changes[-1][0]
+
+
+async def get_series_feed(series_global_id: str) -> Optional[ScopedFeed]:
+    """
+    The feed of the latest released stories of a series. None if the series
+    does not exist or has no released story yet.
+    """
+    await _drop_changed_feeds()
+    key = ("series", series_global_id)
+    feed = _feeds.get(key)
+    if feed is None:
+        feed = await _build_series_feed(series_global_id)
+        if feed is not None:
+            _feeds.set(key, feed)
+    return feed
+
+
+@single_flight
+async def _build_series_feed(series_global_id: str) -> Optional[ScopedFeed]:
+    series = await Series.get_or_none(seriesGlobalId=series_global_id)
+    if series is None:
+        return None
+    stories = await _released_stories(series_id=series.idseries)
+    if not stories and not await Story.filter(
+            series_id=series.idseries, release_date__lte=datetime.now()
+    ).exists():
+        return None
+    tags = tuple(await SeriesTagsRel.filter(
+        series_id=series.idseries
+    ).values_list("tag__tag", flat=True))
+
+    server_url = settings.SERVER_METADATA.get("url", "")
+    feed = feedgenerator.Rss201rev2Feed(
+        title=series.name,
+        link=f"https://{server_url}/series/{series_global_id}/feed.xml",
+        description=f"Latest stories of {series.name} by {series.creator}.",
+    )
+    for story in stories:
+        add_story_item(feed, story, tags)
+    return _render(feed)
+
+
+async def get_tag_feed(tag: str) -> Optional[ScopedFeed]:
+    """
+    The feed of the latest released stories of the series with a tag. None
+    if the tag does not exist.
+    """
+    await _drop_changed_feeds()
+    key = ("tag", tag)
+    feed = _feeds.get(key)
+    if feed is None:
+        feed = await _build_tag_feed(tag)
+        if feed is not None:
+            _feeds.set(key, feed)
+    return feed
+
+
+@single_flight
+async def _build_tag_feed(tag_name: str) -> Optional[ScopedFeed]:
+    tag = await Tag.get_or_none(tag=tag_name)
+    if tag is None:
+        return None
+    series_ids = await SeriesTagsRel.filter(
+        tag_id=tag.idtag
+    ).values_list("series_id", flat=True)
+    stories = await _released_stories(series_id__in=series_ids) \
+        if series_ids else []
+
+    categories = {}
+    for series_id, name in await SeriesTagsRel.filter(
+            series_id__in={story.series_id for story in stories}
+    ).values_list("series_id", "tag__tag"):
+        categories.setdefault(series_id, []).append(name)
+
+    server_name = settings.SERVER_METADATA.get("name", "")
+    server_url = settings.SERVER_METADATA.get("url", "")
+    feed = feedgenerator.Rss201rev2Feed(
+        title=f"{server_name} Chatfic Server: {tag_name}",
+        link=f"https://{server_url}/tags/{tag_name}/feed.xml",
+        description=f"Latest {tag_name} stories from our chatfic server.",
+    )
+    for story in stories:
+        add_story_item(feed, story, tuple(categories.get(story.series_id, ())))
+        _tag_feeds_of_series.setdefault(story.series_id, set()).add(tag_name)
+    return _render(feed)
+
+
+def feed_response(feed: ScopedFeed, if_none_match: Optional[str],
+                  if_modified_since: Optional[str]) -> Response:
+    """
+    The feed, or a 304 if the request's If-None-Match (or, without it,
+    If-Modified-Since) still matches.
+    """
+    headers = {
+        "ETag": feed.etag,
+        "Last-Modified": format_datetime(feed.last_modified, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if if_none_match is not None:
+        not_modified = feed.etag in if_none_match or if_none_match == "*"
+    else:
+        try:
+            not_modified = if_modified_since is not None and \
+                feed.last_modified <= _as_utc(
+                    parsedate_to_datetime(if_modified_since)
+                )
+        except (TypeError, ValueError):
+            not_modified = False
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return Response(content=feed.body, media_type="application/rss+xml",
+                    headers=headers)
@@ -0,0 +1,142 @@
+"""
+Event loop lag monitor.
+
+A blocking call in an `async def` handler (boto3, file I/O, CPU heavy work)
+stalls every request of the worker. Two pieces catch them:
+- A sampler task sleeps for a short interval on the loop and records how
+  late it wakes up in chatficdb_event_loop_lag_seconds.
+- A watchdog thread checks that the sampler keeps beating. When it misses
+  its beat by more than LOOP_LAG_THRESHOLD_MS, the loop is blocked right
+  now, so the watchdog captures the stack of the loop's thread, which shows
+  the blocking call itself. The stall is logged with that stack and counted
+  in chatficdb_event_loop_stalls_total, labelled with the innermost frame of
+  our own code.
+
+Functions:
+- start_loop_monitor / stop_loop_monitor: Run the monitor on the current
+  event loop.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from prometheus_client import Counter, Histogram
+
+LOOP_LAG = Histogram(
+    "chatficdb_event_loop_lag_seconds",
+    "How late the event loop lag sampler woke up.",
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+LOOP_STALLS = Counter(
+    "chatficdb_event_loop_stalls_total",
+    "Event loop stalls longer than the threshold.",
+    ["location"],
+)
+
+SAMPLE_INTERVAL_SECONDS = 0.05
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _blocking_location(frame) -> str:
+    """
+    The innermost frame of the project's own code (not of a library) in the
+    stack, as "endpoints/stories.py:build_rss_feed".
+    """
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(PROJECT_ROOT + os.sep) \
+                and "site-packages" not in filename \
+                and filename != os.path.abspath(__file__):
+            relative = os.path.relpath(filename, PROJECT_ROOT)
+            return f"{relative}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class LoopMonitor:
+    """
+    Attributes:
+        threshold (float): Stalls longer than this, in seconds, are reported.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold: float):
+        self.loop = loop
+        self.threshold = threshold
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped = threading.Event()
+        self._sampler: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._last_beat = time.monotonic()
+        self._sampler = self.loop.create_task(self._sample())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-monitor", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.cancel()
+
+    async def _sample(self) -> None:
+        while True:
+            expected = time.monotonic() + SAMPLE_INTERVAL_SECONDS
+            await asyncio.sleep(SAMPLE_INTERVAL_SECONDS)
+            now = time.monotonic()
+            LOOP_LAG.observe(max(0.0, now - expected))
+            self._last_beat = now
+
+    def _watch(self) -> None:
+        reported_beat = None
+        check_every = min(self.threshold / 2, SAMPLE_INTERVAL_SECONDS)
+        while not self._stopped.wait(check_every):
+            last_beat = self._last_beat
+            late_by = time.monotonic() - last_beat - SAMPLE_INTERVAL_SECONDS
+            if late_by < self.threshold or reported_beat == last_beat:
+                continue
+            # Report every stall once, while it is still happening:
+            reported_beat = last_beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._report(frame, late_by)
+
+    def _report(self, frame, late_by: float) -> None:
+        location = _blocking_location(frame)
+        LOOP_STALLS.labels(location).inc()
+        task = asyncio.current_task(self.loop)
+        task_name = task.get_name() if task is not None else "-"
+        logging.warning(
+            "Event loop blocked for over %dms in %s (task %s):\n%s",
+            late_by * 1000, location, task_name,
+            "".join(traceback.format_stack(frame))
+        )
+
+
+_monitor: LoopMonitor | None = None
+
+
+def start_loop_monitor(threshold_ms: int) -> None:
+    """
+    Monitor the running event loop. Call it from inside the loop (e.g. at
+    startup).
+    """
+    global _monitor
+    if _monitor is not None:
+        return
+    _monitor = LoopMonitor(asyncio.get_running_loop(), threshold_ms / 1000)
+    _monitor.start()
+
+
+def stop_loop_monitor() -> None:
+    global _monitor
+    if _monitor is not None:
+        _monitor.stop()
+        _monitor = None
@@ -0,0 +1,280 @@
+"""
+Media optimization for story submissions.
+
+Uploaded images are served to readers as-is, which makes bandwidth and image
+decoding the biggest reader-side cost. During post-processing every image of
+a submission is downloaded from S3, resized into WebP variants and uploaded
+next to the original. The result is a media manifest with the dimensions and
+byte sizes of the original and all of its variants, which is embedded into
+story.json so clients can pick the smallest file that fits their screen.
+
+Image work is CPU bound, so it runs in a process pool. This module is imported
+by the pool's worker processes, so it should stay free of heavy imports
+(spacy, tortoise etc.).
+
+Media sent with a sha256 content hash is also stored once under a shared,
+content-addressed prefix (MEDIA_CAS_PREFIX). Later submissions that reuse the
+same file (avatars, backgrounds...) skip the upload entirely. The shared copy
+is then copied server-side to the story's own media/ folder, where readers
+build media URLs from, and story.json's mediaRefs also points to it.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from botocore.exceptions import ClientError
+from PIL import Image
+
+from helpers.utils import create_s3_client
+
+from settings import S3_BUCKET, MEDIA_VARIANT_WIDTHS, MEDIA_WEBP_QUALITY, \
+    MEDIA_OPTIMIZATION_WORKERS, MEDIA_CAS_PREFIX
+
+# Animated formats like gif are left alone, resizing would drop the frames.
+OPTIMIZABLE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+# Variants are never modified once uploaded, their keys change with their
+# source instead.
+VARIANT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+CONTENT_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_valid_content_hash(content_hash) -> bool:
+    return isinstance(content_hash, str) and \
+        CONTENT_HASH_PATTERN.match(content_hash) is not None
+
+
+def content_key(content_hash: str, name: str) -> str:
+    """
+    Returns the shared S3 key of a media file, e.g.
+    9f86d0...0a08, 7.JPG -> media-cas/9f/9f86d0...0a08.jpg
+    """
+    extension = os.path.splitext(name)[1].lower()
+    return f"{MEDIA_CAS_PREFIX}/{content_hash[:2]}/{content_hash}{extension}"
+
+
+def object_exists(s3_client, key: str) -> bool:
+    try:
+        s3_client.head_object(Bucket=S3_BUCKET, Key=key)
+        return True
+    except ClientError:
+        return False
+
+
+def find_shared_media(s3_client, files: list) -> dict[str, str]:
+    """
+    Look up hashed media files in the shared prefix.
+
+    Returns:
+        dict[str, str]: file name (e.g. "media/7.jpg") -> shared S3 key, for
+            the files that are already stored there.
+    """
+    shared = {}
+    for file in files:
+        if not file["name"].startswith("media/") or \
+                not is_valid_content_hash(file.get("hash")):
+            continue
+        key = content_key(file["hash"], file["name"])
+        if object_exists(s3_client, key):
+            shared[file["name"]] = key
+    return shared
+
+
+def promote_to_shared_media(s3_client, source_key: str, content_hash: str,
+                            name: str):
+    """
+    Copy a freshly uploaded file to the shared prefix, after making sure its
+    content really matches the hash sent by the client.
+
+    Returns:
+        str | None: The shared S3 key, or None if the hash doesn't match.
+    """
+    key = content_key(content_hash, name)
+    if object_exists(s3_client, key):
+        return key
+    body = s3_client.get_object(Bucket=S3_BUCKET, Key=source_key)["Body"].read()
+    if hashlib.sha256(body).hexdigest() != content_hash:
+        logging.warning(f"Content hash mismatch for {source_key}")
+        return None
+    s3_client.copy_object(
+        Bucket=S3_BUCKET,
+        Key=key,
+        CopySource={"Bucket": S3_BUCKET, "Key": source_key},
+    )
+    return key
+
+
+def copy_shared_media(s3_client, shared_key: str, story_key: str) -> None:
+    """
+    Copy a shared media file to a story's folder. The copy happens inside
+    S3, nothing is downloaded.
+    """
+    s3_client.copy_object(
+        Bucket=S3_BUCKET,
+        Key=story_key,
+        CopySource={"Bucket": S3_BUCKET, "Key": shared_key},
+    )
+
+
+def is_optimizable(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in OPTIMIZABLE_EXTENSIONS
+
+
+def variant_key(source_key: str, width: int) -> str:
+    """
+    Returns the S3 key of a WebP variant, e.g.
+    story/abc/media/7.jpg -> story/abc/media/7.w480.webp
+    """
+    base, _ = os.path.splitext(source_key)
+    return f"{base}.w{width}.webp"
+
+
+def build_variants(body: bytes, widths: list[int], quality: int):
+    """
+    Resize an image into WebP variants.
+
+    Parameters:
+        body (bytes): The original image file.
+        widths (list[int]): Target widths. Widths that are not smaller than
+            the original are replaced with a single full-size variant.
+        quality (int): WebP quality, 0-100.
+
+    Returns:
+        tuple: (width, height, variants) of the original image, where
+            variants is a list of (width, height, webp_bytes) tuples.
+            Variants that are not smaller than the original are dropped.
+    """
+    with Image.open(io.BytesIO(body)) as image:
+        image.load()
+        width, height = image.size
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or \
+                "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        target_widths = sorted({w for w in widths if 0 < w < width} | {width})
+        variants = []
+        for target_width in target_widths:
+            target_height = max(1, round(height * target_width / width))
+            if target_width == width:
+                resized = image
+            else:
+                resized = image.resize(
+                    (target_width, target_height), Image.LANCZOS
+                )
+            output = io.BytesIO()
+            resized.save(output, format="WEBP", quality=quality, method=4)
+            encoded = output.getvalue()
+            if len(encoded) >= len(body):
+                continue
+            variants.append((target_width, target_height, encoded))
+    return width, height, variants
+
+
+def optimize_media_file(source_key: str) -> dict:
+    """
+    Download one image, upload its variants and return its manifest entry.
+    Runs inside a worker process of the media pool.
+
+    Shared media is optimized once, its manifest entry is stored next to it
+    and reused by every story that references it.
+    """
+    s3_client = create_s3_client()
+    is_shared = source_key.startswith(f"{MEDIA_CAS_PREFIX}/")
+    manifest_key = f"{os.path.splitext(source_key)[0]}.manifest.json"
+    if is_shared:
+        try:
+            return json.loads(s3_client.get_object(
+                Bucket=S3_BUCKET, Key=manifest_key
+            )["Body"].read())
+        except ClientError:
+            pass
+
+    body = s3_client.get_object(Bucket=S3_BUCKET, Key=source_key)["Body"].read()
+    width, height, variants = build_variants(
+        body, MEDIA_VARIANT_WIDTHS, MEDIA_WEBP_QUALITY
+    )
+
+    entry = {
+        "path": source_key,
+        "width": width,
+        "height": height,
+        "bytes": len(body),
+        "variants": [],
+    }
+    for variant_width, variant_height, encoded in variants:
+        key = variant_key(source_key, variant_width)
+        s3_client.put_object(
+            Bucket=S3_BUCKET,
+            Key=key,
+            Body=encoded,
+            ContentType="image/webp",
+            CacheControl=VARIANT_CACHE_CONTROL,
+        )
+        entry["variants"].append({
+            "path": key,
+            "format": "webp",
+            "width": variant_width,
+            "height": variant_height,
+            "bytes": len(encoded),
+        })
+    if is_shared:
+        s3_client.put_object(
+            Bucket=S3_BUCKET,
+            Key=manifest_key,
+            Body=json.dumps(entry),
+            ContentType="application/json",
+        )
+    return entry
+
+
+async def optimize_story_media(media_keys: dict[str, str]) -> dict:
+    """
+    Optimize all images of a story in a process pool.
+
+    Parameters:
+        media_keys (dict[str, str]): Media name (as used in the story's
+            bubbles, e.g. "7.jpg") -> S3 key of the original, either in the
+            story's folder or in the shared prefix.
+
+    Returns:
+        dict: The media manifest, media name -> manifest entry. Files that
+            can't be optimized are left out, clients fall back to the
+            original for them.
+    """
+    media_keys = {
+        name: key for name, key in media_keys.items() if is_optimizable(name)
+    }
+    if not media_keys:
+        return {}
+
+    loop = asyncio.get_running_loop()
+    # The huey consumer is multithreaded, forking it is not safe.
+    with ProcessPoolExecutor(
+            max_workers=max(1, min(MEDIA_OPTIMIZATION_WORKERS, len(media_keys))),
+            mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        names = list(media_keys)
+        results = await asyncio.gather(
+            *[
+                loop.run_in_executor(pool, optimize_media_file, media_keys[name])
+                for name in names
+            ],
+            return_exceptions=True
+        )
+
+    manifest = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logging.warning(f"Couldn't optimize media {name}: {result}")
+            continue
+        manifest[name] = result
+    return manifest
@@ -0,0 +1,283 @@
+"""
+Prometheus metrics.
+
+gunicorn runs several workers and the huey consumer is another process, so
+when PROMETHEUS_MULTIPROC_DIR is set (entrypoint.sh does it) every process
+writes its samples to that directory and /metrics merges them with
+prometheus_client's MultiProcessCollector. Without it (local runs, tests)
+the metrics of the current process are served.
+
+Metrics:
+- chatficdb_request_duration_seconds: Request latency per route template.
+- chatficdb_request_db_queries / chatficdb_request_db_seconds: Number of
+  database queries and time spent in them, per request.
+- chatficdb_db_query_duration_seconds: Latency of single queries.
+- chatficdb_db_query_retries_total: Reads retried after a transient error.
+- chatficdb_db_pool_*: Connection pool wait time and utilization.
+- chatficdb_cache_requests_total: Cache lookups by result, for hit ratios.
+- chatficdb_task_duration_seconds: Duration of huey tasks.
+- chatficdb_huey_pending_tasks: Huey queue depth, read at scrape time.
+
+Classes:
+- MetricsMiddleware: ASGI middleware timing requests.
+- RequestDbStats: Database queries of the current request.
+
+Functions:
+- record_query: Record one database query (used by
+  database/instrumentation.py).
+- record_cache_lookup: Record a cache hit or miss.
+- render_metrics: Render all metrics in the Prometheus text format.
+"""
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, \
+    CollectorRegistry, Counter, Gauge, Histogram, generate_latest, \
+    multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    "chatficdb_request_duration_seconds",
+    "HTTP request latency.",
+    ["method", "route", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "chatficdb_request_db_queries",
+    "Number of database queries run by one HTTP request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "chatficdb_request_db_seconds",
+    "Time one HTTP request spent waiting for database queries.",
+    ["route"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "chatficdb_db_query_duration_seconds",
+    "Database query latency.",
+    ["operation"],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5),
+)
+DB_QUERY_RETRIES = Counter(
+    "chatficdb_db_query_retries_total",
+    "Read queries retried after a transient connection error.",
+    ["error"],
+)
+DB_POOL_ACQUIRE = Histogram(
+    "chatficdb_db_pool_acquire_seconds",
+    "Time spent waiting for a connection from the pool.",
+    ["connection"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 5),
+)
+# Gauges are summed over the live workers:
+DB_POOL_CONNECTIONS = Gauge(
+    "chatficdb_db_pool_connections",
+    "Open connections in the pool.",
+    ["connection"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CONNECTIONS_IN_USE = Gauge(
+    "chatficdb_db_pool_connections_in_use",
+    "Pool connections currently in use.",
+    ["connection"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_MAX_CONNECTIONS = Gauge(
+    "chatficdb_db_pool_max_connections",
+    "Maximum size of the pool.",
+    ["connection"],
+    multiprocess_mode="livesum",
+)
+CACHE_REQUESTS = Counter(
+    "chatficdb_cache_requests_total",
+    "Cache lookups.",
+    ["cache", "result"],
+)
+TASK_DURATION = Histogram(
+    "chatficdb_task_duration_seconds",
+    "Huey task duration.",
+    ["task", "outcome"],
+    buckets=(.1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+# Requests without a matching route are grouped, so scanners probing random
+# paths do not create a new label value per path.
+UNMATCHED_ROUTE = "unmatched"
+
+
+@dataclass
+class RequestDbStats:
+    """
+    Database queries of the current request.
+    """
+    scope: dict | None = None
+    queries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def endpoint(self) -> str:
+        """
+        "GET /story_submissions/{submission_id}"
+        """
+        if self.scope is None:
+            return UNMATCHED_ROUTE
+        return f"{self.scope['method']} {_route_template(self.scope)}"
+
+
+_request_db_stats: ContextVar[RequestDbStats | None] = ContextVar(
+    "request_db_stats", default=None
+)
+
+
+def current_request_stats() -> RequestDbStats | None:
+    return _request_db_stats.get()
+
+
+def _operation(query: str) -> str:
+    keyword = query.lstrip(" (\n").split(None, 1)
+    if not keyword:
+        return "other"
+    keyword = keyword[0].upper()
+    if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        return keyword.lower()
+    return "other"
+
+
+def record_query(query: str, seconds: float) -> None:
+    """
+    Record one database query, for the current request if there is one.
+    """
+    DB_QUERY_LATENCY.labels(_operation(query)).observe(seconds)
+    stats = _request_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += seconds
+
+
+def record_pool_usage(connection: str, pool,
+                      acquire_seconds: float | None = None) -> None:
+    """
+    Record the utilization of a connection pool, and the time it took to
+    get a connection from it.
+    """
+    if acquire_seconds is not None:
+        DB_POOL_ACQUIRE.labels(connection).observe(acquire_seconds)
+    DB_POOL_CONNECTIONS.labels(connection).set(pool.size)
+    DB_POOL_CONNECTIONS_IN_USE.labels(connection).set(
+        pool.size - pool.freesize
+    )
+    DB_POOL_MAX_CONNECTIONS.labels(connection).set(pool.maxsize)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+class HueyQueueCollector:
+    """
+    Reports the number of pending huey tasks when metrics are scraped.
+
+    The queue lives in a SQLite file shared by all processes, so the value is
+    read once per scrape instead of being tracked by every process.
+    """
+
+    def collect(self):
+        from helpers.tasks import huey
+        pending = GaugeMetricFamily(
+            "chatficdb_huey_pending_tasks",
+            "Tasks waiting in the huey queue."
+        )
+        pending.add_metric([], huey.pending_count())
+        yield pending
+
+
+def _build_registry() -> CollectorRegistry:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    registry.register(HueyQueueCollector())
+    return registry
+
+
+_registry: CollectorRegistry | None = None
+# render_metrics runs in threads, the registry must be built once:
+_registry_lock = threading.Lock()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Returns:
+        tuple[bytes, str]: Body and content type of the metrics response.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = _build_registry()
+    return generate_latest(_registry), CONTENT_TYPE_LATEST
+
+
+_route_templates: dict[int, str] = {}
+
+
+def _route_template(scope) -> str:
+    """
+    The path template ("/story_submissions/{submission_id}") of the route
+    that handled the request.
+    """
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return UNMATCHED_ROUTE
+    template = _route_templates.get(id(endpoint))
+    if template is None:
+        template = UNMATCHED_ROUTE
+        for route in app.router.routes:
+            if getattr(route, "endpoint", None) is endpoint \
+                    or getattr(route, "app", None) is endpoint:
+                template = route.path
+                break
+        _route_templates[id(endpoint)] = template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request latency and the database queries
+    of each request. Streaming responses are timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestDbStats(scope=scope)
+        token = _request_db_stats.set(stats)
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            _request_db_stats.reset(token)
+            route = _route_template(scope)
+            REQUEST_LATENCY.labels(
+                scope["method"], route, str(status_code)
+            ).observe(elapsed)
+            REQUEST_DB_QUERIES.labels(route).observe(stats.queries)
+            REQUEST_DB_SECONDS.labels(route).observe(stats.seconds)
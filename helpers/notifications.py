@@ -0,0 +1,143 @@
+"""
+Submission status notifications, from the huey consumer to the web workers.
+
+The consumer and the gunicorn workers are separate processes on the same
+machine, so status changes are appended to a small SQLite file next to the
+huey queue instead of going through a broker. Each web worker tails that file
+with a single primary key range query, only while it has open event streams,
+and fans the new rows out to the streams waiting for them.
+
+Functions:
+- publish_status: Record a status change. Safe to call from any process.
+- subscribe / unsubscribe: Receive the status changes of one submission in
+  the current web worker, through an asyncio.Queue.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import defaultdict
+
+NOTIFICATIONS_DB_PATH = os.getenv(
+    "NOTIFICATIONS_DB_PATH", "queue_db/notifications.db"
+)
+POLL_INTERVAL_SECONDS = 0.5
+# Rows are only needed until every open stream has seen them:
+RETENTION_SECONDS = 3600
+
+_subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+_poll_task: asyncio.Task | None = None
+
+
+def _connect() -> sqlite3.Connection:
+    connection = sqlite3.connect(
+        NOTIFICATIONS_DB_PATH, timeout=5, isolation_level=None
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS status_events ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "submission_id INTEGER NOT NULL, "
+        "status INTEGER NOT NULL, "
+        "created_at REAL NOT NULL)"
+    )
+    return connection
+
+
+def publish_status(submission_id: int, status: int) -> None:
+    """
+    Record a submission status change. Never raises, a lost notification
+    only means the stream falls back to its next heartbeat check.
+    """
+    try:
+        connection = _connect()
+        try:
+            now = time.time()
+            cursor = connection.execute(
+                "INSERT INTO status_events (submission_id, status, created_at)"
+                " VALUES (?, ?, ?)",
+                (submission_id, int(status), now)
+            )
+            if cursor.lastrowid % 100 == 0:
+                connection.execute(
+                    "DELETE FROM status_events WHERE created_at < ?",
+                    (now - RETENTION_SECONDS,)
+                )
+        finally:
+            connection.close()
+    except Exception as e:
+        logging.error(f"Couldn't publish status of submission {submission_id}: {e}")
+
+
+def _fetch_since(last_id: int) -> list[tuple[int, int, int]]:
+    connection = _connect()
+    try:
+        return connection.execute(
+            "SELECT id, submission_id, status FROM status_events"
+            " WHERE id > ? ORDER BY id",
+            (last_id,)
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+def _last_id_before(timestamp: float) -> int:
+    connection = _connect()
+    try:
+        return connection.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM status_events"
+            " WHERE created_at < ?",
+            (timestamp,)
+        ).fetchone()[0]
+    finally:
+        connection.close()
+
+
+async def _poll_loop(started_at: float) -> None:
+    global _poll_task
+    try:
+        # Start slightly in the past, so changes that happened while the
+        # first subscriber was reading the current status aren't missed.
+        # Subscribers get these older statuses again and have to skip the
+        # ones that are not newer than what they have already seen.
+        last_id = await asyncio.to_thread(_last_id_before, started_at - 2)
+        while _subscribers:
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+            try:
+                rows = await asyncio.to_thread(_fetch_since, last_id)
+            except Exception as e:
+                logging.error(f"Couldn't read submission status events: {e}")
+                continue
+            for event_id, submission_id, status in rows:
+                last_id = event_id
+                for queue in _subscribers.get(submission_id, ()):
+                    queue.put_nowait(status)
+    except Exception as e:
+        logging.error(f"Submission status event polling stopped: {e}")
+    finally:
+        _poll_task = None
+
+
+def subscribe(submission_id: int) -> asyncio.Queue:
+    """
+    Start receiving status changes of a submission. Status codes are put on
+    the returned queue, including some from just before subscribing, so
+    they can be older than the submission's current status. Call
+    unsubscribe with the same queue when done.
+    """
+    global _poll_task
+    queue = asyncio.Queue()
+    _subscribers[submission_id].add(queue)
+    if _poll_task is None:
+        _poll_task = asyncio.create_task(_poll_loop(time.time()))
+    return queue
+
+
+def unsubscribe(submission_id: int, queue: asyncio.Queue) -> None:
+    queues = _subscribers.get(submission_id)
+    if queues is None:
+        return
+    queues.discard(queue)
+    if not queues:
+        del _subscribers[submission_id]
@@ -0,0 +1,150 @@
+"""
+Opt-in request profiling with pyinstrument.
+
+A request is profiled when it carries the admin bearer token and asks for a
+profile, with the `profile` query parameter or the `X-Profile` header:
+- profile=html: Respond with pyinstrument's HTML report instead of the
+  handler's response.
+- profile=speedscope: Respond with a speedscope JSON profile
+  (https://www.speedscope.app) instead of the handler's response.
+- profile=store: Respond normally, and store the HTML report under
+  PROFILES_DIR. The file name is sent in the X-Profile-Id header, and the
+  report can be downloaded from GET /profiles/{profile_id}.
+
+Any other request passes through untouched, so normal traffic pays nothing
+but a header lookup.
+
+Classes:
+- ProfilingMiddleware: ASGI middleware profiling the requests that ask for
+  it.
+"""
+import logging
+import os
+import re
+import time
+from urllib.parse import parse_qs
+
+from pyinstrument import Profiler
+from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+from starlette.responses import JSONResponse, Response
+
+from helpers.auth import validate_admin_token
+from settings import PROFILES_DIR
+
+PROFILE_MODES = ("html", "speedscope", "store")
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]+-[a-z0-9_-]+\.html$")
+
+
+def _requested_mode(scope) -> str | None:
+    headers = dict(scope["headers"])
+    mode = headers.get(b"x-profile", b"").decode("latin-1")
+    if not mode:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        mode = query.get("profile", [""])[0]
+    if mode not in PROFILE_MODES:
+        return None
+
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    try:
+        if not validate_admin_token(authorization):
+            return None
+    except Exception:
+        # Invalid token format, or no admin token configured.
+        return None
+    return mode
+
+
+def _profile_id(scope) -> str:
+    path = re.sub(r"[^a-z0-9]+", "_", scope["path"].lower()).strip("_")
+    return f"{time.time_ns()}-{path or 'root'}.html"
+
+
+def store_profile(profile_id: str, html: str) -> None:
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    with open(os.path.join(PROFILES_DIR, profile_id), "w",
+              encoding="utf-8") as file:
+        file.write(html)
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware profiling the requests that ask for it.
+
+    One request is profiled at a time per worker. A profile requested while
+    another one is running is refused with 409.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = False
+
+    async def __call__(self, scope, receive, send):
+        mode = None
+        if scope["type"] == "http":
+            mode = _requested_mode(scope)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        if self._busy:
+            response = JSONResponse(
+                {"detail": "Another request is being profiled."},
+                status_code=409
+            )
+            await response(scope, receive, send)
+            return
+
+        self._busy = True
+        profiler = Profiler(async_mode="enabled")
+        try:
+            if mode == "store":
+                await self._profile_and_store(profiler, scope, receive, send)
+            else:
+                await self._profile_and_respond(
+                    profiler, mode, scope, receive, send
+                )
+        finally:
+            self._busy = False
+
+    async def _profile_and_store(self, profiler, scope, receive, send):
+        profile_id = _profile_id(scope)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile_id.encode()),
+                ]
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            try:
+                store_profile(profile_id, profiler.output(HTMLRenderer()))
+            except OSError as e:
+                logging.error(f"Could not store profile {profile_id}: {e}")
+
+    async def _profile_and_respond(self, profiler, mode, scope, receive,
+                                   send):
+        async def discard(message):
+            pass
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+
+        if mode == "speedscope":
+            response = Response(
+                profiler.output(SpeedscopeRenderer()),
+                media_type="application/json"
+            )
+        else:
+            response = Response(
+                profiler.output(HTMLRenderer()), media_type="text/html"
+            )
+        await response(scope, receive, send)
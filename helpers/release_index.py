@@ -0,0 +1,161 @@
+"""
+In-memory index of story releases, for the program calendar.
+
+Every worker keeps all stories sorted by release date, so the stories of any
+range of weeks are found with two binary searches instead of a query. The
+display time (rounded up to the next half hour, like /program) is computed
+once, when a story enters the index.
+
+The index is loaded on first use and kept up to date three ways:
+- convert_submission_to_story adds the stories it creates right away,
+- every REFRESH_SECONDS, stories created by other workers are read by id,
+- every FULL_RELOAD_SECONDS the index is reloaded, which picks up stories
+  that were rescheduled or deleted in the database.
+
+Classes:
+- ReleaseIndex
+
+Attributes:
+- release_index: The worker's index.
+"""
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from database.models import Series, Story
+from helpers.cache import SingleFlight
+
+REFRESH_SECONDS = 30
+FULL_RELOAD_SECONDS = 3600
+
+_STORY_FIELDS = ("idstory", "title", "description", "storyGlobalId",
+                 "release_date", "series__name", "series__seriesGlobalId")
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _rounded(release_date: datetime) -> datetime:
+    """
+    The release time shown in the program: rounded up to :00 or :30.
+    """
+    release_date = release_date.replace(second=0, microsecond=0)
+    return release_date + timedelta(minutes=(30 - release_date.minute % 30)
+                                    % 30)
+
+
+class ReleaseIndex:
+    """
+    Stories sorted by (release date, idstory), with the program entry of
+    each story in a parallel list.
+    """
+
+    def __init__(self):
+        self._keys: list[tuple[datetime, int]] = []
+        self._entries: list[dict] = []
+        self._release_dates: dict[int, datetime] = {}
+        # Highest idstory read from the database:
+        self._max_id = 0
+        self._loaded_at: Optional[float] = None
+        self._refreshed_at = 0.0
+        self._sync = SingleFlight()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    async def ensure_loaded(self) -> None:
+        """
+        Load or refresh the index if it is due.
+        """
+        now = time.monotonic()
+        if self._loaded_at is None \
+                or now - self._loaded_at >= FULL_RELOAD_SECONDS:
+            await self._sync.run("load", self.load)
+        elif now - self._refreshed_at >= REFRESH_SECONDS:
+            await self._sync.run("refresh", self.refresh)
+
+    async def load(self) -> None:
+        rows = await Story.all().values(*_STORY_FIELDS)
+        entries = sorted(
+            (self._entry(**row) for row in rows), key=lambda e: e["_key"]
+        )
+        self._keys = [entry.pop("_key") for entry in entries]
+        self._entries = entries
+        self._release_dates = {idstory: release_date
+                               for release_date, idstory in self._keys}
+        self._max_id = max(self._release_dates, default=0)
+        self._loaded_at = self._refreshed_at = time.monotonic()
+
+    async def refresh(self) -> None:
+        """
+        Add the stories created since the last load or refresh.
+        """
+        rows = await Story.filter(idstory__gt=self._max_id).values(
+            *_STORY_FIELDS
+        )
+        for row in rows:
+            self._insert(self._entry(**row))
+            self._max_id = max(self._max_id, row["idstory"])
+        self._refreshed_at = time.monotonic()
+
+    def upsert(self, story: Story, series: Optional[Series]) -> None:
+        """
+        Add a story, or move it to its new release date. Does nothing before
+        the index is loaded, the load will read the story.
+        """
+        if self._loaded_at is None:
+            return
+        self._insert(self._entry(
+            idstory=story.idstory, title=story.title,
+            description=story.description,
+            storyGlobalId=story.storyGlobalId,
+            release_date=story.release_date,
+            series__name=series.name if series else None,
+            series__seriesGlobalId=series.seriesGlobalId if series else None,
+        ))
+
+    def between(self, start: datetime, end: datetime) -> list[dict]:
+        """
+        Program entries of the stories released in [start, end), in release
+        order. Entries are shared, callers must not modify them.
+        """
+        low = bisect_left(self._keys, (_as_utc(start), 0))
+        high = bisect_left(self._keys, (_as_utc(end), 0), lo=low)
+        return self._entries[low:high]
+
+    @staticmethod
+    def _entry(idstory: int, title: Optional[str],
+               description: Optional[str], storyGlobalId: Optional[str],
+               release_date: datetime, series__name: Optional[str],
+               series__seriesGlobalId: Optional[str]) -> dict:
+        release_date = _as_utc(release_date)
+        return {
+            "_key": (release_date, idstory),
+            "idstory": idstory,
+            "title": title,
+            "description": description,
+            "release_date": _rounded(release_date),
+            "storyGlobalId": storyGlobalId,
+            "series_name": series__name,
+            "seriesGlobalId": series__seriesGlobalId,
+        }
+
+    def _insert(self, entry: dict) -> None:
+        key = entry.pop("_key")
+        release_date, idstory = key
+        previous = self._release_dates.get(idstory)
+        if previous is not None:
+            position = bisect_left(self._keys, (previous, idstory))
+            del self._keys[position]
+            del self._entries[position]
+        position = bisect_left(self._keys, key)
+        self._keys.insert(position, key)
+        self._entries.insert(position, entry)
+        self._release_dates[idstory] = release_date
+
+
+release_index = ReleaseIndex()
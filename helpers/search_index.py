@@ -0,0 +1,353 @@
+"""
+In-memory full-text index of the catalog, for /search.
+
+Every worker keeps an inverted index of Series.name and creator, and of
+Story.title, description and author. Text is case-folded and stripped of
+accents before it is split into words. The vocabulary is kept sorted, so a
+query word matches every indexed word it is a prefix of with two binary
+searches ("detec" finds "detective"). All query words have to match.
+
+Hits are ranked by the field they matched in (names and titles first), with
+a bonus for whole words, then newest first. Drafts (series without a
+released story) and scheduled stories are indexed but only returned once
+they are released.
+
+The index is loaded by a background task started with the app, which then
+refreshes it every SEARCH_INDEX_REFRESH_SECONDS:
+- series and stories created since the last refresh are read by id,
+- series whose tags changed are read from the catalog change log,
+- everything is reloaded every FULL_RELOAD_SECONDS, for renames and
+  deletions.
+The write paths of this worker (create_series, add_tags_to_series and
+convert_submission_to_story) update the index right away. Queries never
+touch the database once the index is loaded.
+
+Classes:
+- SearchIndex
+
+Functions:
+- start_search_index: Start loading and refreshing the worker's index.
+- stop_search_index: Stop refreshing it.
+
+Attributes:
+- search_index: The worker's index.
+"""
+import asyncio
+import logging
+import re
+import time
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Hashable, Iterable, Optional
+
+from database.models import CatalogChange, Series, SeriesTagsRel, Story
+from database.routing import read_only
+from helpers.cache import SingleFlight
+from helpers.catalog_changes import SERIES_TAGS
+
+FULL_RELOAD_SECONDS = 3600
+
+SERIES_FIELDS = {"name": 3, "creator": 2}
+STORY_FIELDS = {"title": 3, "author": 2, "description": 1}
+# Added to the weight when a query word matches a whole word:
+WHOLE_WORD_BONUS = 1
+
+_WORD = re.compile(r"\w+")
+
+
+def words(text: Optional[str]) -> list[str]:
+    """
+    The indexed form of a text: case-folded words without accents.
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return _WORD.findall(
+        "".join(char for char in text if not unicodedata.combining(char))
+    )
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class _Documents:
+    """
+    The indexed series and stories. Documents are keyed by ("series",
+    idseries) or ("story", idstory).
+    """
+
+    def __init__(self):
+        self.postings: dict[str, dict[Hashable, int]] = {}
+        # Sorted keys of postings, for prefix matching. None while loading,
+        # it is sorted once at the end instead of kept sorted:
+        self.vocabulary: Optional[list[str]] = None
+        self.document_words: dict[Hashable, dict[str, int]] = {}
+        self.series: dict[int, dict] = {}
+        self.stories: dict[int, dict] = {}
+        self.series_tags: dict[int, frozenset[str]] = {}
+        self.first_release: dict[int, datetime] = {}
+
+    def add_series(self, row: dict) -> None:
+        self.series[row["idseries"]] = row
+        self._index(("series", row["idseries"]), row, SERIES_FIELDS)
+
+    def add_story(self, row: dict) -> None:
+        row = {**row, "release_date": _as_utc(row["release_date"])}
+        self.stories[row["idstory"]] = row
+        self._index(("story", row["idstory"]), row, STORY_FIELDS)
+        first = self.first_release.get(row["series_id"])
+        if first is None or row["release_date"] < first:
+            self.first_release[row["series_id"]] = row["release_date"]
+
+    def set_tags(self, series_id: int, tags: Iterable[str]) -> None:
+        self.series_tags[series_id] = frozenset(tags)
+
+    def loaded(self) -> None:
+        self.vocabulary = sorted(self.postings)
+
+    def _index(self, key: Hashable, row: dict, fields: dict) -> None:
+        weights = {}
+        for field, weight in fields.items():
+            for word in words(row.get(field)):
+                weights[word] = max(weights.get(word, 0), weight)
+
+        for word in self.document_words.pop(key, {}):
+            documents = self.postings[word]
+            del documents[key]
+            if not documents:
+                del self.postings[word]
+                if self.vocabulary is not None:
+                    del self.vocabulary[bisect_left(self.vocabulary, word)]
+        for word, weight in weights.items():
+            if word not in self.postings:
+                self.postings[word] = {}
+                if self.vocabulary is not None:
+                    self.vocabulary.insert(
+                        bisect_left(self.vocabulary, word), word
+                    )
+            self.postings[word][key] = weight
+        self.document_words[key] = weights
+
+    def _matches(self, prefix: str) -> Iterable[str]:
+        position = bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) \
+                and self.vocabulary[position].startswith(prefix):
+            yield self.vocabulary[position]
+            position += 1
+
+    def search(self, query: str) -> dict[Hashable, int]:
+        """
+        Scores of the documents matching every word of the query.
+        """
+        scores = None
+        # Longest words first, they usually match the fewest documents:
+        for prefix in sorted(set(words(query)), key=len, reverse=True):
+            matches = {}
+            for word in self._matches(prefix):
+                bonus = WHOLE_WORD_BONUS if word == prefix else 0
+                for key, weight in self.postings[word].items():
+                    if scores is not None and key not in scores:
+                        continue
+                    matches[key] = max(matches.get(key, 0), weight + bonus)
+            scores = matches if scores is None else {
+                key: scores[key] + score for key, score in matches.items()
+            }
+            if not scores:
+                break
+        return scores or {}
+
+
+class SearchIndex:
+
+    def __init__(self):
+        self._documents = _Documents()
+        self._documents.loaded()
+        self._max_series_id = 0
+        self._max_story_id = 0
+        self._seen_seq = 0
+        self._loaded_at: Optional[float] = None
+        self._sync = SingleFlight()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded_at is not None
+
+    @read_only
+    async def load(self) -> None:
+        """
+        Build a new index from the database and swap it in.
+        """
+        seen_seq = await CatalogChange.all().order_by("-seq").first(
+        ).values_list("seq", flat=True) or 0
+        documents = _Documents()
+        for row in await Series.all().values(
+                "idseries", "name", "seriesGlobalId", "creator"
+        ):
+            documents.add_series(row)
+        for row in await Story.all().values(
+                "idstory", "title", "description", "author",
+                "patreonusername", "storyGlobalId", "release_date",
+                "series_id"
+        ):
+            documents.add_story(row)
+        tags = {}
+        for series_id, tag in await SeriesTagsRel.all().values_list(
+                "series_id", "tag__tag"
+        ):
+            tags.setdefault(series_id, []).append(tag)
+        for series_id, series_tags in tags.items():
+            documents.set_tags(series_id, series_tags)
+        documents.loaded()
+
+        self._documents = documents
+        self._max_series_id = max(documents.series, default=0)
+        self._max_story_id = max(documents.stories, default=0)
+        self._seen_seq = seen_seq
+        self._loaded_at = time.monotonic()
+
+    @read_only
+    async def refresh(self) -> None:
+        """
+        Add the series and stories created since the last refresh, and read
+        the tags of series whose tags changed.
+        """
+        if not self.ready \
+                or time.monotonic() - self._loaded_at >= FULL_RELOAD_SECONDS:
+            await self._sync.run("load", self.load)
+            return
+
+        for row in await Series.filter(
+                idseries__gt=self._max_series_id
+        ).values("idseries", "name", "seriesGlobalId", "creator"):
+            self._documents.add_series(row)
+            self._max_series_id = max(self._max_series_id, row["idseries"])
+        for row in await Story.filter(
+                idstory__gt=self._max_story_id
+        ).values("idstory", "title", "description", "author",
+                 "patreonusername", "storyGlobalId", "release_date",
+                 "series_id"):
+            self._documents.add_story(row)
+            self._max_story_id = max(self._max_story_id, row["idstory"])
+
+        changes = await CatalogChange.filter(
+            seq__gt=self._seen_seq, kind=SERIES_TAGS
+        ).values_list("seq", "entity_id")
+        series_ids = {series_id for _, series_id in changes}
+        if series_ids:
+            tags = {series_id: [] for series_id in series_ids}
+            for series_id, tag in await SeriesTagsRel.filter(
+                    series_id__in=series_ids
+            ).values_list("series_id", "tag__tag"):
+                tags[series_id].append(tag)
+            for series_id, series_tags in tags.items():
+                self._documents.set_tags(series_id, series_tags)
+        if changes:
+            self._seen_seq = max(seq for seq, _ in changes)
+
+    async def ensure_loaded(self) -> None:
+        """
+        Load the index if the background task hasn't yet.
+        """
+        if not self.ready:
+            await self._sync.run("load", self.load)
+
+    def add_series(self, series: Series) -> None:
+        if self.ready:
+            self._documents.add_series({
+                "idseries": series.idseries, "name": series.name,
+                "seriesGlobalId": series.seriesGlobalId,
+                "creator": series.creator,
+            })
+
+    def add_story(self, story: Story) -> None:
+        if self.ready:
+            self._documents.add_story({
+                "idstory": story.idstory, "title": story.title,
+                "description": story.description, "author": story.author,
+                "patreonusername": story.patreonusername,
+                "storyGlobalId": story.storyGlobalId,
+                "release_date": story.release_date,
+                "series_id": story.series_id,
+            })
+
+    def set_series_tags(self, series_id: int, tags: Iterable[str]) -> None:
+        if self.ready:
+            self._documents.set_tags(series_id, tags)
+
+    def search(self, query: str, tags_required: Iterable[str] = (),
+               limit: int = 20) -> tuple[list[dict], list[dict]]:
+        """
+        The released series and stories matching the query, best first.
+
+        Returns:
+            tuple: Rows of the matching series (with their tagList) and of
+                the matching stories, up to limit of each.
+        """
+        documents = self._documents
+        tags_required = frozenset(tags_required)
+        now = datetime.now(timezone.utc)
+
+        def visible(series_id: int) -> bool:
+            first_release = documents.first_release.get(series_id)
+            return first_release is not None and first_release <= now \
+                and tags_required <= documents.series_tags.get(
+                    series_id, frozenset()
+                )
+
+        series, stories = [], []
+        for (kind, key), score in documents.search(query).items():
+            if kind == "series":
+                if visible(key):
+                    series.append((score, key, documents.series[key]))
+            else:
+                story = documents.stories[key]
+                if story["release_date"] <= now \
+                        and visible(story["series_id"]):
+                    stories.append((score, story["release_date"], story))
+        series.sort(key=lambda hit: (hit[0], hit[1]), reverse=True)
+        stories.sort(key=lambda hit: (hit[0], hit[1]), reverse=True)
+        return (
+            [{**row, "tagList": sorted(documents.series_tags.get(
+                row["idseries"], ()))} for _, _, row in series[:limit]],
+            [row for _, _, row in stories[:limit]],
+        )
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Searches use the last index until the next refresh.
+                logging.error(f"Couldn't refresh the search index: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+search_index = SearchIndex()
+
+
+def start_search_index(interval: float) -> None:
+    search_index.start(interval)
+
+
+async def stop_search_index() -> None:
+    await search_index.stop()
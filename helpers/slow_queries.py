@@ -0,0 +1,190 @@
+"""
+Slow query log.
+
+Queries slower than SLOW_QUERY_THRESHOLD_MS are logged and aggregated by
+their normalized shape (literals and placeholders replaced by "?", IN lists
+collapsed), so the same ORM query with different ids is one entry. The
+aggregates are kept in a small SQLite file next to the huey queue, shared
+by the gunicorn workers and the huey consumer, like the submission status
+notifications.
+
+Functions:
+- normalize_query: The shape of a query.
+- record_slow_query: Log and aggregate one slow query. Never raises.
+- store_explain: Save the EXPLAIN output of a query shape.
+- get_slow_queries / clear_slow_queries: Read and reset the aggregates.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+
+SLOW_QUERIES_DB_PATH = os.getenv(
+    "SLOW_QUERIES_DB_PATH", "queue_db/slow_queries.db"
+)
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"(?<![\w`])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    shape = _STRING_LITERAL.sub("?", query)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _VALUE_LIST.sub("(?+)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def shape_id(shape: str) -> str:
+    return hashlib.sha1(shape.encode()).hexdigest()[:16]
+
+
+def _connect() -> sqlite3.Connection:
+    connection = sqlite3.connect(
+        SLOW_QUERIES_DB_PATH, timeout=5, isolation_level=None
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS slow_queries ("
+        "shape_id TEXT PRIMARY KEY, "
+        "shape TEXT NOT NULL, "
+        "example TEXT NOT NULL, "
+        "count INTEGER NOT NULL, "
+        "total_ms REAL NOT NULL, "
+        "max_ms REAL NOT NULL, "
+        "last_seen REAL NOT NULL, "
+        "explain TEXT)"
+    )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS slow_query_endpoints ("
+        "shape_id TEXT NOT NULL, "
+        "endpoint TEXT NOT NULL, "
+        "count INTEGER NOT NULL, "
+        "PRIMARY KEY (shape_id, endpoint))"
+    )
+    return connection
+
+
+def record_slow_query(query: str, elapsed_ms: float, endpoint: str) -> bool:
+    """
+    Log a slow query and add it to the aggregate of its shape. Never raises,
+    this runs on the query path.
+
+    Returns:
+        bool: True if the shape has no EXPLAIN output yet.
+    """
+    logging.warning(
+        "Slow query (%dms) from %s: %s", elapsed_ms, endpoint, query
+    )
+    shape = normalize_query(query)
+    key = shape_id(shape)
+    try:
+        connection = _connect()
+        try:
+            connection.execute(
+                "INSERT INTO slow_queries (shape_id, shape, example, count,"
+                " total_ms, max_ms, last_seen) VALUES (?, ?, ?, 1, ?, ?, ?)"
+                " ON CONFLICT (shape_id) DO UPDATE SET"
+                " example = excluded.example,"
+                " count = count + 1,"
+                " total_ms = total_ms + excluded.total_ms,"
+                " max_ms = MAX(max_ms, excluded.max_ms),"
+                " last_seen = excluded.last_seen",
+                (key, shape, query, elapsed_ms, elapsed_ms, time.time())
+            )
+            connection.execute(
+                "INSERT INTO slow_query_endpoints (shape_id, endpoint, count)"
+                " VALUES (?, ?, 1) ON CONFLICT (shape_id, endpoint)"
+                " DO UPDATE SET count = count + 1",
+                (key, endpoint)
+            )
+            return connection.execute(
+                "SELECT explain IS NULL FROM slow_queries WHERE shape_id = ?",
+                (key,)
+            ).fetchone()[0] == 1
+        finally:
+            connection.close()
+    except Exception as e:
+        logging.error(f"Couldn't record slow query: {e}")
+        return False
+
+
+def store_explain(query: str, plan: list[dict]) -> None:
+    try:
+        connection = _connect()
+        try:
+            connection.execute(
+                "UPDATE slow_queries SET explain = ? WHERE shape_id = ?",
+                (json.dumps(plan, default=str),
+                 shape_id(normalize_query(query)))
+            )
+        finally:
+            connection.close()
+    except Exception as e:
+        logging.error(f"Couldn't store query plan: {e}")
+
+
+SLOW_QUERY_ORDERS = {
+    "total": "total_ms DESC",
+    "max": "max_ms DESC",
+    "count": "count DESC",
+    "recent": "last_seen DESC",
+}
+
+
+def get_slow_queries(order_by: str = "total", limit: int = 50) -> list[dict]:
+    """
+    Aggregated slow query shapes, with the endpoints that ran them.
+    """
+    connection = _connect()
+    connection.row_factory = sqlite3.Row
+    try:
+        rows = connection.execute(
+            "SELECT * FROM slow_queries"
+            f" ORDER BY {SLOW_QUERY_ORDERS[order_by]} LIMIT ?",
+            (limit,)
+        ).fetchall()
+        endpoints = {}
+        if rows:
+            keys = [row["shape_id"] for row in rows]
+            for row in connection.execute(
+                "SELECT shape_id, endpoint, count FROM slow_query_endpoints"
+                f" WHERE shape_id IN ({','.join('?' * len(keys))})"
+                " ORDER BY count DESC",
+                keys
+            ):
+                endpoints.setdefault(row["shape_id"], {})[row["endpoint"]] = \
+                    row["count"]
+    finally:
+        connection.close()
+
+    return [
+        {
+            "shape_id": row["shape_id"],
+            "shape": row["shape"],
+            "example": row["example"],
+            "count": row["count"],
+            "avg_ms": row["total_ms"] / row["count"],
+            "max_ms": row["max_ms"],
+            "total_ms": row["total_ms"],
+            "last_seen": row["last_seen"],
+            "endpoints": endpoints.get(row["shape_id"], {}),
+            "explain": json.loads(row["explain"]) if row["explain"] else None,
+        }
+        for row in rows
+    ]
+
+
+def clear_slow_queries() -> None:
+    connection = _connect()
+    try:
+        connection.execute("DELETE FROM slow_queries")
+        connection.execute("DELETE FROM slow_query_endpoints")
+    finally:
+        connection.close()
@@ -0,0 +1,48 @@
+"""
+Negative cache of story lookups.
+
+/story and /story_batch remember the storyGlobalIds that matched no story, so
+ids probed by scrapers don't reach the database again for a while.
+
+The cache is per worker, and forget_unknown_story_id only clears the entry of
+the worker that converted a submission. What keeps the other workers correct
+is that ids of submissions are never cached: a converted story always had a
+submission with its storyGlobalId, so no worker can have cached it.
+
+Functions:
+- is_unknown_story_id: Whether an id matched no story recently.
+- remember_unknown_story_ids: Cache ids that matched no story.
+- forget_unknown_story_id: Drop an id from this worker's cache.
+"""
+from typing import Iterable
+
+from database.models import StorySubmission
+from helpers.cache import TTLCache
+
+_unknown_story_ids = TTLCache(maxsize=10000, ttl=300, name="unknown_stories")
+
+
+def is_unknown_story_id(story_id: str) -> bool:
+    return bool(_unknown_story_ids.get(story_id))
+
+
+async def remember_unknown_story_ids(story_ids: Iterable[str]) -> None:
+    """
+    Cache ids that matched no story, unless a submission has them.
+    """
+    story_ids = list(story_ids)
+    if not story_ids:
+        return
+    submitted = set(await StorySubmission.filter(
+        storyGlobalId__in=story_ids
+    ).values_list("storyGlobalId", flat=True))
+    for story_id in story_ids:
+        if story_id not in submitted:
+            _unknown_story_ids.set(story_id, True)
+
+
+def forget_unknown_story_id(story_id: str) -> None:
+    """
+    Drop an id from this worker's cache, once it is a story.
+    """
+    _unknown_story_ids.pop(story_id)
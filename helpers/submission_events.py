@@ -0,0 +1,95 @@
+"""
+Submission processing events.
+
+Every processing step of a story submission is recorded as a row in the
+append-only submission_events table, instead of being appended to the
+submission's logs column. Status changes only write the status column of the
+submission (plus the columns the step actually changed), never story_text or
+logs.
+
+Functions:
+- update_submission_status: Save a new status, record it and notify open
+  status streams.
+- record_submission_event: Record an informational event.
+- get_submission_logs: Render the logs of submissions from their events.
+"""
+import time
+from collections import defaultdict
+
+from database.models import SubmissionEvent, SubmissionStatus
+from helpers.notifications import publish_status
+
+
+def _elapsed_ms(started_at: float | None) -> int | None:
+    if started_at is None:
+        return None
+    return int((time.monotonic() - started_at) * 1000)
+
+
+async def record_submission_event(submission_id: int, stage: str,
+                                  message: str | None = None,
+                                  status: SubmissionStatus | None = None,
+                                  started_at: float | None = None) -> None:
+    """
+    Insert one event for a submission.
+
+    Parameters:
+        started_at (float | None): time.monotonic() at the start of the step,
+            used to store the step's duration.
+    """
+    await SubmissionEvent.create(
+        submission_id=submission_id,
+        stage=stage,
+        status=status,
+        message=message,
+        duration_ms=_elapsed_ms(started_at),
+    )
+
+
+async def update_submission_status(submission, status: SubmissionStatus,
+                                   stage: str, message: str | None = None,
+                                   started_at: float | None = None,
+                                   update_fields: tuple = ()) -> None:
+    """
+    Save the new status of a submission, record it as an event and notify
+    the open status streams.
+
+    Parameters:
+        update_fields (tuple): Other columns changed by this step that should
+            be saved together with the status.
+    """
+    submission.status = status
+    await submission.save(update_fields=["status", *update_fields])
+    await record_submission_event(
+        submission.idstorysubmission, stage, message, status, started_at
+    )
+    publish_status(submission.idstorysubmission, status)
+
+
+async def get_submission_logs(submissions) -> dict[int, str]:
+    """
+    Render the logs of many submissions with a single query.
+
+    Logs written before events existed are kept at the top.
+
+    Returns:
+        dict[int, str]: idstorysubmission -> logs.
+    """
+    logs = {
+        submission.idstorysubmission: submission.logs or ""
+        for submission in submissions
+    }
+    if not logs:
+        return logs
+
+    events = await SubmissionEvent.filter(
+        submission_id__in=list(logs),
+        message__isnull=False
+    ).order_by("id").values_list("submission_id", "message")
+
+    messages = defaultdict(list)
+    for submission_id, message in events:
+        messages[submission_id].append(f"- {message}\n")
+    for submission_id, lines in messages.items():
+        logs[submission_id] += "".join(lines)
+    return logs
@@ -1,14 +1,22 @@
 import asyncio
 import json
+import time
 
-from huey import SqliteHuey
+from huey import SqliteHuey, crontab
+from huey.signals import SIGNAL_COMPLETE, SIGNAL_ERROR, SIGNAL_EXECUTING
 
 from database.models import StorySubmission, SubmissionStatus
 import helpers.chatfic_tools as chatfic_tools
+import helpers.media as media
+from helpers.catalog_changes import record_due_releases
+from helpers.catalog_snapshot import publish_catalog_snapshot
+from helpers.metrics import TASK_DURATION
+from helpers.submission_events import update_submission_status, \
+    record_submission_event
 from helpers.utils import getUniqueRandomStoryKey, \
     create_s3_client
 
-from settings import S3_BUCKET, TORTOISE_CONFIG
+from settings import S3_BUCKET, TORTOISE_CONFIG, MEDIA_OPTIMIZATION_ENABLED
 
 huey = SqliteHuey(filename="queue_db/huey_tasks.db")
 from tortoise import Tortoise
@@ -21,6 +29,23 @@ async def _run_db_task_wrapper(task, *args, **kwargs):
     finally:
         await Tortoise.close_connections()
 
+# Task start times for chatficdb_task_duration_seconds, by huey task id:
+_task_started_at: dict[str, float] = {}
+
+@huey.signal(SIGNAL_EXECUTING)
+def _task_executing(signal, task):
+    _task_started_at[task.id] = time.monotonic()
+
+@huey.signal(SIGNAL_COMPLETE, SIGNAL_ERROR)
+def _task_finished(signal, task, exc=None):
+    started_at = _task_started_at.pop(task.id, None)
+    if started_at is None:
+        return
+    outcome = "error" if signal == SIGNAL_ERROR else "complete"
+    TASK_DURATION.labels(task.name, outcome).observe(
+        time.monotonic() - started_at
+    )
+
 @huey.task()
 def run_submission_preprocess(submission_id: int):
     """
@@ -38,14 +63,27 @@ def run_submission_postprocess(submission_id: int):
     # _run_submission_postprocess_async(submission_id)
     asyncio.run(_run_db_task_wrapper(_run_submission_postprocess_async, submission_id))
 
+@huey.periodic_task(crontab(minute="*"))
+def record_story_releases():
+    """
+    Records the releases of scheduled stories in the catalog change log, and
+    publishes the catalog snapshot if the catalog changed.
+    """
+    asyncio.run(_run_db_task_wrapper(_record_story_releases_async))
+
+async def _record_story_releases_async():
+    await record_due_releases()
+    await publish_catalog_snapshot()
+
 async def _run_submission_preprocess_async(submission_id: int):
+    started_at = time.monotonic()
     submission = await get_submission_or_raise(submission_id)
 
     multimedia_list = extract_multimedia_list(submission.files_list)
     validation_result = chatfic_tools.validate_storybasic_json(submission.story_text, multimedia_list)
 
     if not validation_result.is_valid:
-        await mark_validation_failed(submission, validation_result)
+        await mark_validation_failed(submission, validation_result, started_at)
         return
 
     story_global_id = getUniqueRandomStoryKey()
@@ -55,43 +93,77 @@ async def _run_submission_preprocess_async(submission_id: int):
     valid_files = filter_valid_files(submission.files_list, used_multimedia)
 
     if not valid_files:
-        await mark_no_valid_files(submission)
+        await mark_no_valid_files(submission, started_at)
         return
 
     s3_client = create_s3_client()
-    presigned_urls = generate_presigned_urls(s3_client, story_global_id, valid_files)
+    # Files already stored in shared media don't need to be uploaded again:
+    shared_media = media.find_shared_media(s3_client, valid_files)
+    for file in submission.files_list:
+        if file["name"] in shared_media:
+            file["sharedKey"] = shared_media[file["name"]]
+    files_to_upload = [
+        file for file in valid_files if file["name"] not in shared_media
+    ]
+    presigned_urls = generate_presigned_urls(s3_client, story_global_id, files_to_upload)
 
     upload_storybasic_json(s3_client, story_global_id, submission.story_text)
 
-    await update_submission_with_upload_links(submission, presigned_urls)
+    if shared_media:
+        await record_submission_event(
+            submission.idstorysubmission, "preprocess",
+            f"{len(shared_media)} media files found in shared media."
+        )
+
+    if not presigned_urls:
+        await mark_waiting_post_processing(submission, started_at)
+        run_submission_postprocess(submission.idstorysubmission)
+        return
+
+    await update_submission_with_upload_links(submission, presigned_urls, started_at)
 
 async def _run_submission_postprocess_async(submission_id: int):
+    started_at = time.monotonic()
     submission = await get_submission_or_raise(submission_id)
 
     if submission.status != SubmissionStatus.WAITING_POST_PROCESSING:
         raise ValueError("Submission is not in WAITING_POST_PROCESSING status.")
 
-    # 1/3: CREATE STORY.JSON CONTENT:
+    # 1/4: CREATE STORY.JSON CONTENT:
     compiled_story = chatfic_tools.create_chatfic(
         submission.story_text,
         submission.storyGlobalId
     )
-    # 2/3: RUN SENTIMENT ANALYSIS:
+    # 2/4: RUN SENTIMENT ANALYSIS:
     compiled_story = chatfic_tools.analyze_sentiment(compiled_story)
 
-    # 3/3: UPLOAD STORY.JSON:
+    # 3/4: RESOLVE SHARED MEDIA & CREATE RESIZED/WEBP MEDIA VARIANTS:
     s3_client = create_s3_client()
+    media_refs = resolve_shared_media(s3_client, submission)
+    compiled_story["mediaRefs"] = media_refs
+    if MEDIA_OPTIMIZATION_ENABLED:
+        media_keys = get_uploaded_media_keys(submission)
+        media_keys.update(media_refs)
+        compiled_story["media"] = await media.optimize_story_media(media_keys)
+
+    # 4/4: UPLOAD STORY.JSON:
+    story_json = json.dumps(compiled_story, indent=4, ensure_ascii=False)
     if s3_client.put_object(
         Bucket=S3_BUCKET,
         Key=f"story/{submission.storyGlobalId}/story.json",
-        Body=json.dumps(compiled_story, indent=4, ensure_ascii=False),
+        Body=story_json,
         ContentType='application/json',
     ):
-        submission.status = SubmissionStatus.PROCESSED
+        await update_submission_status(
+            submission, SubmissionStatus.PROCESSED, "postprocess",
+            "Story.json uploaded.", started_at
+        )
     else:
-        submission.status = SubmissionStatus.POST_PROCESSING_FAILED
-        submission.logs = (str(submission.logs) or "") + "- Story.json couldn't upload:\n" + json.dumps(compiled_story, indent=4, ensure_ascii=False) + "\n"
-    await submission.save()
+        await update_submission_status(
+            submission, SubmissionStatus.POST_PROCESSING_FAILED, "postprocess",
+            f"Story.json ({len(story_json)} characters) couldn't upload.",
+            started_at
+        )
 
 
 async def get_submission_or_raise(submission_id: int):
@@ -105,10 +177,53 @@ def extract_multimedia_list(files_list):
     return [file["name"][6:] for file in files_list if file["name"].startswith("media/")]
 
 
-async def mark_validation_failed(submission, validation_result):
-    submission.logs = (str(submission.logs) or "") + "- Validation failed with errors:\n" + "\n - -".join([e.message for e in validation_result.errors]) + "\n"
-    submission.status = SubmissionStatus.VALIDATION_FAILED
-    await submission.save()
+def get_uploaded_media_keys(submission):
+    """
+    Returns media name -> S3 key for the media files uploaded by the user.
+    """
+    return {
+        file["name"][6:]: f"story/{submission.storyGlobalId}/{file['name']}"
+        for file in submission.upload_links or []
+        if file["name"].startswith("media/")
+    }
+
+
+def resolve_shared_media(s3_client, submission):
+    """
+    Returns media name -> shared S3 key for every media file of the
+    submission that lives in shared media. Uploaded files with a content hash
+    are copied to shared media here, so the next stories can reuse them.
+    Files that were not uploaded because they were already shared are copied
+    to the story's media/ folder, where readers expect every media file.
+    """
+    uploaded = {file["name"] for file in submission.upload_links or []}
+    media_refs = {}
+    for file in submission.files_list or []:
+        if file.get("sharedKey"):
+            media.copy_shared_media(
+                s3_client, file["sharedKey"],
+                f"story/{submission.storyGlobalId}/{file['name']}"
+            )
+            media_refs[file["name"][6:]] = file["sharedKey"]
+        elif file["name"] in uploaded and file["name"].startswith("media/") \
+                and media.is_valid_content_hash(file.get("hash")):
+            shared_key = media.promote_to_shared_media(
+                s3_client,
+                f"story/{submission.storyGlobalId}/{file['name']}",
+                file["hash"],
+                file["name"]
+            )
+            if shared_key:
+                media_refs[file["name"][6:]] = shared_key
+    return media_refs
+
+
+async def mark_validation_failed(submission, validation_result, started_at=None):
+    await update_submission_status(
+        submission, SubmissionStatus.VALIDATION_FAILED, "preprocess",
+        "Validation failed with errors:\n" + "\n - -".join([e.message for e in validation_result.errors]),
+        started_at
+    )
 
 
 def filter_used_multimedia(multimedia_list, warnings):
@@ -127,10 +242,12 @@ def filter_valid_files(files_list, multimedia_list):
            file["name"] == "storybasic.md"
     ]
 
-async def mark_no_valid_files(submission):
-    submission.logs = (str(submission.logs) or "") + "- No valid files found for upload.\n"
-    submission.status = SubmissionStatus.VALIDATION_FAILED
-    await submission.save()
+async def mark_no_valid_files(submission, started_at=None):
+    await update_submission_status(
+        submission, SubmissionStatus.VALIDATION_FAILED, "preprocess",
+        "No valid files found for upload.", started_at,
+        update_fields=("storyGlobalId",)
+    )
 
 def generate_presigned_urls(s3_client, story_id, files):
     urls = []
@@ -155,7 +272,19 @@ def upload_storybasic_json(s3_client, story_id, story_text):
     )
 
 
-async def update_submission_with_upload_links(submission, urls):
+async def mark_waiting_post_processing(submission, started_at=None):
+    submission.upload_links = []
+    await update_submission_status(
+        submission, SubmissionStatus.WAITING_POST_PROCESSING, "preprocess",
+        "All files found in shared media, no upload needed.", started_at,
+        update_fields=("storyGlobalId", "files_list", "upload_links")
+    )
+
+
+async def update_submission_with_upload_links(submission, urls, started_at=None):
     submission.upload_links = urls
-    submission.status = SubmissionStatus.WAITING_USER_UPLOAD
-    await submission.save()
+    await update_submission_status(
+        submission, SubmissionStatus.WAITING_USER_UPLOAD, "preprocess",
+        "Validated, waiting for user upload.", started_at,
+        update_fields=("storyGlobalId", "files_list", "upload_links")
+    )
@@ -15,7 +15,15 @@ from tortoise.contrib.fastapi import register_tortoise
 
 from helpers.design import templates
 
-from endpoints import stories, giveaways, submissions, server_setup
+from database.database import prewarm_connection_pools
+from database.instrumentation import instrument_mysql_client
+from database.mirror import start_catalog_mirror, stop_catalog_mirror
+from endpoints import stories, giveaways, submissions, server_setup, \
+    monitoring, catalog
+from helpers.loop_monitor import start_loop_monitor, stop_loop_monitor
+from helpers.metrics import MetricsMiddleware
+from helpers.profiling import ProfilingMiddleware
+from helpers.search_index import start_search_index, stop_search_index
 
 import settings
 import aiohttp
@@ -44,6 +52,10 @@ app = FastAPI(
         "name": "stories & series",
         "description": "Operations for stories and series.",
     },
+    {
+        "name": "catalog",
+        "description": "Following the catalog from aggregators.",
+    },
     {
         "name": "html",
         "description": "Pages with html response."
@@ -59,6 +71,8 @@ app.include_router(stories.router)
 app.include_router(submissions.router)
 app.include_router(giveaways.router)
 app.include_router(server_setup.router)
+app.include_router(monitoring.router)
+app.include_router(catalog.router)
 
 server_url = settings.SERVER_METADATA["url"]
 if server_url.endswith("/"):
@@ -75,6 +89,9 @@ app.add_middleware(
     allow_methods=["GET", "HEAD", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=["*"],
 )
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 S3_LINK = settings.S3_LINK
@@ -101,6 +118,7 @@ async def show_submissions_page(request: Request):
 
 
 
+instrument_mysql_client()
 register_tortoise(
     app,
     config=settings.TORTOISE_CONFIG,
@@ -110,6 +128,46 @@ register_tortoise(
 )
 
 
+@app.on_event("startup")
+async def startup_prewarm_database():
+    # Registered after register_tortoise, so it runs once tortoise is ready.
+    await prewarm_connection_pools()
+
+
+@app.on_event("startup")
+async def startup_catalog_mirror():
+    if settings.CATALOG_MIRROR_ENABLED:
+        # Loaded in the background, reads use MySQL until it is ready.
+        start_catalog_mirror(settings.CATALOG_MIRROR_REFRESH_SECONDS)
+
+
+@app.on_event("shutdown")
+async def shutdown_catalog_mirror():
+    await stop_catalog_mirror()
+
+
+@app.on_event("startup")
+async def startup_search_index():
+    # Loaded in the background, /search loads it itself if it comes first.
+    start_search_index(settings.SEARCH_INDEX_REFRESH_SECONDS)
+
+
+@app.on_event("shutdown")
+async def shutdown_search_index():
+    await stop_search_index()
+
+
+@app.on_event("startup")
+async def startup_loop_monitor():
+    if settings.LOOP_MONITOR_ENABLED:
+        start_loop_monitor(settings.LOOP_LAG_THRESHOLD_MS)
+
+
+@app.on_event("shutdown")
+async def shutdown_loop_monitor():
+    stop_loop_monitor()
+
+
 @app.on_event("startup")
 async def startup_register_chatficdb():
 
@@ -0,0 +1,22 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `submission_events` (
+    `id` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `stage` VARCHAR(32) NOT NULL,
+    `status` SMALLINT   COMMENT 'NOT_ACCEPTED: 15\nWAITING_VALIDATION: 20\nVALIDATION_FAILED: 25\nREPEATED: 26\nWAITING_USER_UPLOAD: 30\nUSER_UPLOAD_FAILED: 35\nWAITING_POST_PROCESSING: 40\nPOST_PROCESSING_FAILED: 45\nPROCESSED: 60',
+    `message` LONGTEXT,
+    `duration_ms` INT,
+    `created_at` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6),
+    `submission_id` INT NOT NULL,
+    CONSTRAINT `fk_submissi_story_su_d9e2f41c` FOREIGN KEY (`submission_id`) REFERENCES `story_submissions` (`idstorysubmission`) ON DELETE CASCADE,
+    KEY `idx_submission__submiss_b1d5e6` (`submission_id`, `created_at`),
+    KEY `idx_submission__stage_d1fa14` (`stage`, `created_at`)
+) CHARACTER SET utf8mb4 COMMENT='Represents one step in the processing of a story submission.';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `submission_events`;"""
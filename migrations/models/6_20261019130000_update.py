@@ -0,0 +1,27 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `series` ADD INDEX `idx_series_seriesG_ae7024` (`seriesGlobalId`);
+        ALTER TABLE `stories` ADD INDEX `idx_stories_storyGl_ee641d` (`storyGlobalId`, `release_date`);
+        ALTER TABLE `stories` ADD INDEX `idx_stories_release_631ca1` (`release_date`);
+        ALTER TABLE `stories` ADD INDEX `idx_stories_series__c82454` (`series_id`, `release_date`);
+        ALTER TABLE `series_tags_rel` ADD INDEX `idx_series_tags_tag_id_2f10f8` (`tag_id`, `series_id`);
+        ALTER TABLE `story_submissions` ADD INDEX `idx_story_submi_usernam_105a41` (`username`, `submission_date`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    # MySQL silently drops the index it created for a foreign key once
+    # another index can enforce the key, e.g. a composite index starting with
+    # the same column, and refuses to drop that index afterwards (error 1553,
+    # see "FOREIGN KEY Constraints" in the MySQL reference manual). The
+    # foreign keys of stories.series_id and series_tags_rel.tag_id get a plain
+    # index back before the composite ones are dropped.
+    return """
+        ALTER TABLE `series` DROP INDEX `idx_series_seriesG_ae7024`;
+        ALTER TABLE `stories` DROP INDEX `idx_stories_storyGl_ee641d`;
+        ALTER TABLE `stories` DROP INDEX `idx_stories_release_631ca1`;
+        ALTER TABLE `stories` ADD INDEX `idx_stories_series_id` (`series_id`), DROP INDEX `idx_stories_series__c82454`;
+        ALTER TABLE `series_tags_rel` ADD INDEX `idx_series_tags_rel_tag_id` (`tag_id`), DROP INDEX `idx_series_tags_tag_id_2f10f8`;
+        ALTER TABLE `story_submissions` DROP INDEX `idx_story_submi_usernam_105a41`;"""
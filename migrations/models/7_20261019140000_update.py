@@ -0,0 +1,19 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `catalog_changes` (
+    `seq` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `kind` VARCHAR(16) NOT NULL,
+    `op` VARCHAR(16) NOT NULL,
+    `entity_id` INT NOT NULL,
+    `global_id` VARCHAR(45),
+    `created_at` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6),
+    `dedupe_key` VARCHAR(64)  UNIQUE
+) CHARACTER SET utf8mb4 COMMENT='One change of the public catalog, for the incremental sync API.';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `catalog_changes`;"""
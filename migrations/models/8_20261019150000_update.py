@@ -0,0 +1,11 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `story_submissions` ADD INDEX `idx_story_submi_storyGl_ace795` (`storyGlobalId`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `story_submissions` DROP INDEX `idx_story_submi_storyGl_ace795`;"""
@@ -49,6 +49,29 @@ DATABASE_SETTINGS = {
     "port": int(os.getenv("DATABASE_PORT")),
 }
 
+# CONNECTION POOL SETTINGS:
+# minsize connections are opened at startup. Connections are recycled after
+# pool_recycle seconds (1 hour by default).
+DATABASE_POOL_SETTINGS = {
+    "minsize": int(os.getenv("DATABASE_POOL_MINSIZE", "1")),
+    "maxsize": int(os.getenv("DATABASE_POOL_MAXSIZE", "10")),
+    "pool_recycle": int(os.getenv("DATABASE_POOL_RECYCLE", "3600")),
+}
+# Reads failing with a transient connection error are retried this many
+# times (see database/instrumentation.py):
+DATABASE_READ_RETRIES = int(os.getenv("DATABASE_READ_RETRIES", "2"))
+# Catalog listings slower than this are answered with their last good
+# response, and after CIRCUIT_BREAKER_FAILURES consecutive failures the
+# database is left alone for CIRCUIT_BREAKER_RESET_SECONDS (see
+# helpers/fallback.py):
+CATALOG_QUERY_BUDGET_SECONDS = float(
+    os.getenv("CATALOG_QUERY_BUDGET_SECONDS", "5")
+)
+CIRCUIT_BREAKER_FAILURES = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5"))
+CIRCUIT_BREAKER_RESET_SECONDS = float(
+    os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30")
+)
+
 TORTOISE_CONFIG = {
     'connections': {
         # Dict format for connection
@@ -61,9 +84,10 @@ TORTOISE_CONFIG = {
                 'password': DATABASE_SETTINGS.get('password'),
                 'database': DATABASE_SETTINGS.get('database'),
                 'connect_timeout': 60,
-                'minsize': 1,
-                'maxsize': 10,
-                'pool_recycle': 3600,  # Recycle connections after 1 hour
+                # Every gunicorn worker has its own pool of this size:
+                'minsize': DATABASE_POOL_SETTINGS['minsize'],
+                'maxsize': DATABASE_POOL_SETTINGS['maxsize'],
+                'pool_recycle': DATABASE_POOL_SETTINGS['pool_recycle'],
             }
         },
     },
@@ -75,6 +99,52 @@ TORTOISE_CONFIG = {
     }
 }
 
+# READ REPLICA SETTINGS:
+# When DATABASE_READ_HOST is set, the read-only catalog endpoints query this
+# connection instead of the primary (see database/routing.py). Unset
+# credentials default to the primary's.
+READ_DATABASE_SETTINGS = {
+    "host": os.getenv("DATABASE_READ_HOST"),
+    "port": int(os.getenv("DATABASE_READ_PORT", DATABASE_SETTINGS["port"])),
+    "user": os.getenv("DATABASE_READ_USER", DATABASE_SETTINGS["user"]),
+    "password": os.getenv("DATABASE_READ_PASSWORD",
+                          DATABASE_SETTINGS["password"]),
+    "database": os.getenv("DATABASE_READ_NAME",
+                          DATABASE_SETTINGS["database"]),
+}
+READ_CONNECTION_NAME = 'default'
+if READ_DATABASE_SETTINGS["host"]:
+    READ_CONNECTION_NAME = 'read'
+    TORTOISE_CONFIG['connections']['read'] = {
+        'engine': 'tortoise.backends.mysql',
+        'credentials': {
+            **TORTOISE_CONFIG['connections']['default']['credentials'],
+            **READ_DATABASE_SETTINGS,
+        }
+    }
+    TORTOISE_CONFIG['routers'] = ["database.routing.ReadReplicaRouter"]
+
+# CATALOG MIRROR SETTINGS:
+# With CATALOG_MIRROR_ENABLED, every worker keeps an in-memory SQLite copy of
+# the catalog tables (series, stories, tags and their relations), refreshed
+# every CATALOG_MIRROR_REFRESH_SECONDS, and the read-only catalog endpoints
+# query it instead of MySQL (see database/mirror.py).
+CATALOG_MIRROR_ENABLED = str_to_bool(
+    os.getenv('CATALOG_MIRROR_ENABLED', 'False'))
+CATALOG_MIRROR_REFRESH_SECONDS = float(
+    os.getenv('CATALOG_MIRROR_REFRESH_SECONDS', '5'))
+MIRROR_CONNECTION_NAME = 'mirror'
+if CATALOG_MIRROR_ENABLED:
+    TORTOISE_CONFIG['connections'][MIRROR_CONNECTION_NAME] = {
+        'engine': 'tortoise.backends.sqlite',
+        'credentials': {
+            'file_path': ':memory:',
+            # Rows are copied table by table, in any order:
+            'foreign_keys': 'OFF',
+        }
+    }
+    TORTOISE_CONFIG['routers'] = ["database.routing.ReadReplicaRouter"]
+
 DEBUG = str_to_bool(os.getenv('DEBUG', 'False'))
 
 THEME = {
@@ -86,3 +156,67 @@ THEME = {
 # Defines behaviour for single story endpoint.
 # Defines "default" behaviour for stories endpoint.
 SHOW_PUBLISHED_ONLY = str_to_bool(os.getenv('SHOW_PUBLISHED_ONLY', 'True'))
+
+# MEDIA OPTIMIZATION SETTINGS:
+# Uploaded images are resized into WebP variants during post-processing.
+# Widths larger than the original image are skipped, images are never
+# upscaled.
+MEDIA_OPTIMIZATION_ENABLED = str_to_bool(
+    os.getenv('MEDIA_OPTIMIZATION_ENABLED', 'True'))
+MEDIA_VARIANT_WIDTHS = [
+    int(width) for width in
+    os.getenv('MEDIA_VARIANT_WIDTHS', '480,1080').split(',') if width.strip()
+]
+MEDIA_WEBP_QUALITY = int(os.getenv('MEDIA_WEBP_QUALITY', '80'))
+MEDIA_OPTIMIZATION_WORKERS = int(os.getenv('MEDIA_OPTIMIZATION_WORKERS', '2'))
+
+# Media files sent with a content hash are stored once under this prefix and
+# shared between stories.
+MEDIA_CAS_PREFIX = os.getenv('MEDIA_CAS_PREFIX', 'media-cas')
+
+# PROFILING SETTINGS:
+# Requests with the admin token can ask for a pyinstrument profile, see
+# helpers/profiling.py.
+PROFILING_ENABLED = str_to_bool(os.getenv('PROFILING_ENABLED', 'True'))
+PROFILES_DIR = os.getenv('PROFILES_DIR', "/app/data/profiles")
+
+# EVENT LOOP MONITOR SETTINGS:
+# Event loop stalls longer than LOOP_LAG_THRESHOLD_MS are logged with the
+# stack of the blocking call, see helpers/loop_monitor.py.
+LOOP_MONITOR_ENABLED = str_to_bool(os.getenv('LOOP_MONITOR_ENABLED', 'True'))
+LOOP_LAG_THRESHOLD_MS = int(os.getenv('LOOP_LAG_THRESHOLD_MS', '100'))
+
+# METRICS SETTINGS:
+# GET /metrics needs "Authorization: Bearer <METRICS_AUTH_TOKEN>" (the
+# bearer token of the Prometheus scrape config) or the admin token.
+METRICS_AUTH_TOKEN = os.getenv('METRICS_AUTH_TOKEN')
+
+# SLOW QUERY LOG SETTINGS:
+# Queries slower than SLOW_QUERY_THRESHOLD_MS are logged and aggregated by
+# shape for admins (GET /slow_queries). With SLOW_QUERY_EXPLAIN, the EXPLAIN
+# output of slow SELECTs is captured once per shape.
+SLOW_QUERY_THRESHOLD_MS = int(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200'))
+SLOW_QUERY_EXPLAIN = str_to_bool(os.getenv('SLOW_QUERY_EXPLAIN', 'False'))
+
+# CATALOG SNAPSHOT SETTINGS:
+# The responses of /landing, /series (first page), /tags and /program are
+# published as static JSON to S3_BUCKET under CATALOG_SNAPSHOT_PREFIX, and
+# advertised in "/" so clients can read them from the CDN, see
+# helpers/catalog_snapshot.py.
+CATALOG_SNAPSHOT_ENABLED = str_to_bool(
+    os.getenv('CATALOG_SNAPSHOT_ENABLED', 'False'))
+CATALOG_SNAPSHOT_PREFIX = os.getenv('CATALOG_SNAPSHOT_PREFIX', 'catalog')
+
+# RSS FEED SETTINGS:
+# Feeds of single series and tags (/series/{seriesGlobalId}/feed.xml and
+# /tags/{tag}/feed.xml) list the latest FEED_ITEMS stories. Up to
+# FEED_CACHE_SIZE of them are kept per worker, see helpers/feeds.py.
+FEED_ITEMS = int(os.getenv('FEED_ITEMS', '20'))
+FEED_CACHE_SIZE = int(os.getenv('FEED_CACHE_SIZE', '1000'))
+
+# SEARCH SETTINGS:
+# /search is answered from an in-memory index of the catalog in every
+# worker, refreshed every SEARCH_INDEX_REFRESH_SECONDS, see
+# helpers/search_index.py.
+SEARCH_INDEX_REFRESH_SECONDS = float(
+    os.getenv('SEARCH_INDEX_REFRESH_SECONDS', '10'))
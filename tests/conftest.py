@@ -0,0 +1,24 @@
+import pytest
+import pytest_asyncio
+from tortoise import Tortoise
+
+
+@pytest.fixture
+def tortoise_config():
+    """
+    In-memory SQLite for the models. Override it in a test module to add
+    connections or routers.
+    """
+    return {
+        "connections": {"default": "sqlite://:memory:"},
+        "apps": {"models": {"models": ["database.models"],
+                            "default_connection": "default"}},
+    }
+
+
+@pytest_asyncio.fixture
+async def database(tortoise_config):
+    await Tortoise.init(config=tortoise_config)
+    await Tortoise.generate_schemas()
+    yield
+    await Tortoise.close_connections()
@@ -0,0 +1,65 @@
+import time
+from unittest.mock import patch
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric.ed25519 import \
+    Ed25519PrivateKey
+from fastapi import HTTPException
+
+from helpers import auth
+from settings import SERVER_METADATA
+
+
+class TestVerifiedJwtCache:
+
+    @pytest.fixture(autouse=True)
+    def signing_key(self, monkeypatch):
+        private_key = Ed25519PrivateKey.generate()
+        monkeypatch.setattr(auth, "_loaded_public_key",
+                            private_key.public_key())
+        auth._verified_jwt_cache.clear()
+        yield private_key
+        auth._verified_jwt_cache.clear()
+
+    def _token(self, private_key, exp):
+        return jwt.encode(
+            {"sub": "someone", "aud": SERVER_METADATA.get("slug"), "exp": exp},
+            private_key,
+            algorithm="EdDSA"
+        )
+
+    def test_repeated_token_is_verified_once(self, signing_key):
+        token = self._token(signing_key, int(time.time()) + 60)
+
+        with patch("helpers.auth.jwt.decode", wraps=jwt.decode) as decode:
+            first = auth.validate_and_decode_jwt(token)
+            second = auth.validate_and_decode_jwt(token)
+
+        assert first["sub"] == second["sub"] == "someone"
+        assert decode.call_count == 1
+
+    def test_expired_token_is_not_cached(self, signing_key):
+        token = self._token(signing_key, int(time.time()) - 60)
+
+        with pytest.raises(HTTPException) as error:
+            auth.validate_and_decode_jwt(token)
+
+        assert error.value.status_code == 498
+        assert len(auth._verified_jwt_cache) == 0
+
+    def test_cached_payload_is_not_shared(self, signing_key):
+        token = self._token(signing_key, int(time.time()) + 60)
+
+        auth.validate_and_decode_jwt(token)["sub"] = "someone else"
+        cached = auth.validate_and_decode_jwt(token)
+        cached["sub"] = "someone else"
+        assert auth.validate_and_decode_jwt(token)["sub"] == "someone"
+
+    @pytest.mark.asyncio
+    async def test_identity_dependency_runs_on_the_event_loop(
+            self, signing_key, monkeypatch):
+        monkeypatch.setattr(auth, "ADMIN_AUTH_TOKEN", "admin-token")
+        token = self._token(signing_key, int(time.time()) + 60)
+
+        assert await auth.get_identity(f"Bearer {token}") == "someone"
@@ -0,0 +1,31 @@
+import json
+
+import pytest
+import pytest_asyncio
+
+from database import models
+from endpoints import stories
+
+
+class TestBootstrap:
+
+    @pytest_asyncio.fixture
+    async def database(self, database, monkeypatch, tmp_path):
+        monkeypatch.setattr(stories, "CACHED_WEEKLY_PROGRAM_PATH",
+                            str(tmp_path / "program.json"))
+        stories._bootstrap_cache.clear()
+
+    @pytest.mark.asyncio
+    async def test_combined_response_and_etag(self, database):
+        await models.Tag.create(tag="drama")
+
+        response = await stories.get_bootstrap(if_none_match=None)
+        body = json.loads(response.body)
+        assert set(body) == {"metadata", "tags", "landing", "program"}
+        assert body["tags"] == {"tags": [{"1": "drama"}]}
+        assert body["metadata"]["tags"] == {"1": "drama"}
+
+        etag = response.headers["ETag"]
+        response = await stories.get_bootstrap(if_none_match=etag)
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from helpers.cache import single_flight
+
+
+class TestSingleFlight:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_calls_share_one_computation(self):
+        calls = []
+
+        @single_flight
+        async def get_stories(page, tags_required):
+            calls.append(page)
+            await asyncio.sleep(0.05)
+            return {"page": page}
+
+        results = await asyncio.gather(
+            *(get_stories(1, tags_required=["a"]) for _ in range(10)),
+            get_stories(2, tags_required=["a"]),
+        )
+
+        assert calls == [1, 2]
+        assert results[0] is results[9]
+        assert results[10] == {"page": 2}
+        assert len(get_stories.flight) == 0
+
+        await get_stories(1, tags_required=["a"])
+        assert calls == [1, 2, 1]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_the_others(self):
+        @single_flight
+        async def build_weekly_program():
+            await asyncio.sleep(0.05)
+            return "program"
+
+        first = asyncio.create_task(build_weekly_program())
+        second = asyncio.create_task(build_weekly_program())
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert await second == "program"
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import models
+from helpers.catalog_changes import record_change, record_due_releases, \
+    record_story_release, get_changes, SERIES, SERIES_TAGS, STORY, CREATED, \
+    UPDATED, RELEASED
+
+
+class TestCatalogChanges:
+
+    @pytest.mark.asyncio
+    async def test_releases_are_recorded_once(self, database):
+        now = datetime.now()
+        series = await models.Series.create(name="S", seriesGlobalId="s1",
+                                            creator="user")
+        released = await models.Story.create(
+            series=series, storyGlobalId="a", release_date=now
+        )
+        await models.Story.create(series=series, storyGlobalId="b",
+                                  release_date=now + timedelta(days=1))
+
+        assert await record_due_releases(now + timedelta(seconds=1)) == 1
+        assert await record_due_releases(now + timedelta(seconds=1)) == 0
+
+        changes, cursor, has_more = await get_changes(0, 10)
+        assert [(change.kind, change.op, change.entity_id)
+                for change in changes] == [
+            ("series", "published", series.idseries),
+            ("story", "released", released.idstory),
+        ]
+        assert cursor == changes[-1].seq and not has_more
+
+    @pytest.mark.asyncio
+    async def test_draft_changes_are_delivered_when_published(self,
+                                                              database):
+        draft = await models.Series.create(name="D", seriesGlobalId="d1",
+                                           creator="user")
+        await record_change(SERIES, CREATED, draft.idseries)
+        await record_change(SERIES_TAGS, UPDATED, draft.idseries)
+
+        changes, cursor, has_more = await get_changes(0, 10)
+        assert changes == [] and not has_more
+
+        story = await models.Story.create(series=draft, storyGlobalId="a",
+                                          release_date=datetime.now())
+        await record_story_release(story)
+        await record_story_release(story)
+        changes, cursor, has_more = await get_changes(cursor, 10)
+        assert [(change.kind, change.op, change.global_id)
+                for change in changes] == [
+            ("series", "published", "d1"),
+            ("story", "released", "a"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_cursor_stops_before_a_missing_seq(self, database):
+        for seq in (1, 3):
+            await models.CatalogChange.create(seq=seq, kind=STORY,
+                                              op=RELEASED, entity_id=seq)
+
+        changes, cursor, has_more = await get_changes(0, 10)
+        assert [change.seq for change in changes] == [1]
+        assert cursor == 1 and not has_more
+
+        # Seq 2 commits after 3:
+        await models.CatalogChange.create(seq=2, kind=STORY, op=RELEASED,
+                                          entity_id=2)
+        changes, cursor, has_more = await get_changes(cursor, 10)
+        assert [change.seq for change in changes] == [2, 3]
+        assert cursor == 3
+
+    @pytest.mark.asyncio
+    async def test_old_gaps_are_skipped(self, database):
+        await models.CatalogChange.create(seq=2, kind=STORY, op=RELEASED,
+                                          entity_id=2)
+        await models.CatalogChange.filter(seq=2).update(
+            created_at=datetime.now() - timedelta(minutes=5)
+        )
+
+        changes, cursor, has_more = await get_changes(0, 10)
+        assert [change.seq for change in changes] == [2] and cursor == 2
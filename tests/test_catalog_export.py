@@ -0,0 +1,36 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import models
+from helpers.catalog_export import export_catalog, gzip_stream
+
+
+class TestCatalogExport:
+
+    @pytest.mark.asyncio
+    async def test_exports_published_series_in_chunks(self, database):
+        now = datetime.now()
+        tag = await models.Tag.create(tag="drama")
+        for number in range(3):
+            series = await models.Series.create(
+                name=f"S{number}", seriesGlobalId=f"s{number}", creator="user"
+            )
+            await models.SeriesTagsRel.create(series=series, tag=tag)
+            # The second series is a draft:
+            release_date = now + timedelta(days=1) if number == 1 else now
+            await models.Story.create(series=series, storyGlobalId=f"a{number}",
+                                      release_date=release_date)
+
+        body = b"".join([
+            chunk async for chunk in gzip_stream(export_catalog(chunk_size=1))
+        ])
+        lines = [json.loads(line)
+                 for line in gzip.decompress(body).decode().splitlines()]
+
+        assert [line["seriesGlobalId"] for line in lines] == ["s0", "s2"]
+        assert lines[0]["tags"] == ["drama"]
+        assert [story["storyGlobalId"] for story in lines[1]["stories"]] == \
+            ["a2"]
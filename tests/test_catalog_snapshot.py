@@ -0,0 +1,50 @@
+import json
+
+import pytest
+import pytest_asyncio
+
+import settings
+from helpers import catalog_snapshot
+from helpers.catalog_changes import record_change, SERIES, CREATED
+
+
+class TestCatalogSnapshot:
+
+    @pytest_asyncio.fixture
+    async def database(self, database, monkeypatch):
+        monkeypatch.setattr(settings, "CATALOG_SNAPSHOT_ENABLED", True)
+        monkeypatch.setattr(catalog_snapshot, "_published_seq", None)
+
+    @pytest.mark.asyncio
+    async def test_publishes_only_when_the_catalog_changed(self, database,
+                                                           monkeypatch):
+        uploads = []
+
+        async def render_snapshots():
+            return {"tags": b"{}"}
+
+        monkeypatch.setattr(catalog_snapshot, "render_snapshots",
+                            render_snapshots)
+        monkeypatch.setattr(catalog_snapshot, "_upload", uploads.append)
+
+        assert await catalog_snapshot.publish_catalog_snapshot()
+        assert not await catalog_snapshot.publish_catalog_snapshot()
+        await record_change(SERIES, CREATED, 1)
+        assert await catalog_snapshot.publish_catalog_snapshot()
+        assert len(uploads) == 2
+
+    @pytest.mark.asyncio
+    async def test_renders_every_snapshot(self, database, monkeypatch,
+                                          tmp_path):
+        from endpoints import stories
+        monkeypatch.setattr(stories, "CACHED_WEEKLY_PROGRAM_PATH",
+                            str(tmp_path / "program.json"))
+
+        snapshots = await catalog_snapshot.render_snapshots()
+        assert set(snapshots) == set(catalog_snapshot.SNAPSHOT_FILES)
+        assert json.loads(snapshots["series"])["isFound"] is False
+
+    def test_urls_are_under_the_catalog_prefix(self, monkeypatch):
+        monkeypatch.setattr(settings, "S3_LINK", "https://cdn.example.com")
+        assert catalog_snapshot.snapshot_urls()["landing"] == \
+            "https://cdn.example.com/catalog/landing.json"
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from helpers.fallback import CircuitBreaker, LastKnownGood
+
+
+class Listing(BaseModel):
+    items: list
+    stale: bool = False
+
+
+def failing(calls):
+    async def fetch():
+        calls.append(1)
+        raise ConnectionError("MySQL is down")
+    return fetch
+
+
+class TestLastKnownGood:
+
+    @pytest.mark.asyncio
+    async def test_serves_last_good_response_marked_stale(self):
+        fallback = LastKnownGood("/stories", CircuitBreaker("test", 5, 30),
+                                 budget_seconds=1)
+
+        async def fetch():
+            return Listing(items=[1, 2])
+
+        assert not (await fallback.fetch("page1", fetch)).stale
+        response = await fallback.fetch("page1", failing([]))
+        assert response.stale and response.items == [1, 2]
+
+        with pytest.raises(HTTPException) as error:
+            await fallback.fetch("page2", failing([]))
+        assert error.value.status_code == 503
+
+    @pytest.mark.asyncio
+    async def test_slow_fetch_refreshes_in_background(self):
+        fallback = LastKnownGood("/latest", CircuitBreaker("test", 5, 30),
+                                 budget_seconds=0.05)
+
+        async def fetch(items):
+            return Listing(items=items)
+
+        await fallback.fetch("latest", lambda: fetch([1]))
+
+        async def slow_fetch():
+            await asyncio.sleep(0.1)
+            return Listing(items=[2])
+
+        response = await fallback.fetch("latest", slow_fetch)
+        assert response.stale and response.items == [1]
+        await asyncio.sleep(0.1)
+        assert fallback._responses.get("latest").items == [2]
+
+    @pytest.mark.asyncio
+    async def test_timeouts_open_the_circuit_without_piling_up(self):
+        breaker = CircuitBreaker("test", failure_threshold=3,
+                                 reset_seconds=30)
+        fallback = LastKnownGood("/series", breaker, budget_seconds=0.01)
+        calls = []
+
+        async def slow_fetch():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return Listing(items=[1])
+
+        for _ in range(4):
+            with pytest.raises(HTTPException):
+                await fallback.fetch("page1", slow_fetch)
+        assert breaker.is_open
+        assert len(calls) == 1
+
+        await asyncio.sleep(0.15)
+        # The late response is kept, but doesn't close the circuit:
+        assert fallback._responses.get("page1").items == [1]
+        assert breaker.is_open
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_the_database(self):
+        breaker = CircuitBreaker("test", failure_threshold=2,
+                                 reset_seconds=30)
+        fallback = LastKnownGood("/series", breaker, budget_seconds=1)
+        calls = []
+        for _ in range(4):
+            with pytest.raises(HTTPException):
+                await fallback.fetch("page1", failing(calls))
+        assert breaker.is_open
+        assert len(calls) == 2
+
+        breaker.reset_seconds = 0
+        with pytest.raises(HTTPException):
+            await fallback.fetch("page1", failing(calls))
+        # The probe failed, the circuit opens again:
+        assert len(calls) == 3 and breaker.is_open
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+
+from database import models
+from helpers import feeds
+from helpers.catalog_changes import record_change, record_story_release, \
+    SERIES_TAGS, UPDATED
+
+
+class TestScopedFeeds:
+
+    @pytest_asyncio.fixture
+    async def database(self, database, monkeypatch):
+        feeds._feeds.clear()
+        feeds._tag_feeds_of_series.clear()
+        monkeypatch.setattr(feeds, "_seen_seq", None)
+        monkeypatch.setattr(feeds, "_checked_at", 0.0)
+        monkeypatch.setattr(feeds, "FEED_REFRESH_SECONDS", 0)
+
+    @pytest.mark.asyncio
+    async def test_feeds_are_rebuilt_on_release_only(self, database):
+        series = await models.Series.create(name="S", seriesGlobalId="s1",
+                                            creator="user")
+        other = await models.Series.create(name="T", seriesGlobalId="t1",
+                                           creator="user")
+        tag = await models.Tag.create(tag="drama")
+        await models.SeriesTagsRel.create(series=series, tag=tag)
+        await models.Story.create(series=series, storyGlobalId="a",
+                                  title="First",
+                                  release_date=datetime.now()
+                                  - timedelta(days=1))
+        await models.Story.create(series=other, storyGlobalId="b",
+                                  title="Elsewhere",
+                                  release_date=datetime.now())
+
+        series_feed = await feeds.get_series_feed("s1")
+        tag_feed = await feeds.get_tag_feed("drama")
+        assert b"First" in series_feed.body
+        assert b"Elsewhere" not in tag_feed.body
+        assert await feeds.get_series_feed("missing") is None
+        assert await feeds.get_tag_feed("missing") is None
+
+        story = await models.Story.create(series=series,
+                                          storyGlobalId="c", title="Second",
+                                          release_date=datetime.now())
+        # Cached until the release is recorded:
+        assert await feeds.get_series_feed("s1") is series_feed
+        await record_story_release(story)
+        assert b"Second" in (await feeds.get_series_feed("s1")).body
+        assert b"Second" in (await feeds.get_tag_feed("drama")).body
+
+        await record_story_release(await models.Story.get(storyGlobalId="b"))
+        assert await feeds.get_series_feed("t1") is not None
+        assert feeds._feeds.get(("series", "s1")) is not None
+
+    @pytest.mark.asyncio
+    async def test_removed_tag_drops_the_series_from_its_feed(self,
+                                                              database):
+        series = await models.Series.create(name="S", seriesGlobalId="s1",
+                                            creator="user")
+        tag = await models.Tag.create(tag="drama")
+        await models.SeriesTagsRel.create(series=series, tag=tag)
+        await models.Story.create(series=series, storyGlobalId="a",
+                                  title="First", release_date=datetime.now())
+        assert b"First" in (await feeds.get_tag_feed("drama")).body
+
+        await models.SeriesTagsRel.filter(series=series).delete()
+        await record_change(SERIES_TAGS, UPDATED, series.idseries)
+        assert b"First" not in (await feeds.get_tag_feed("drama")).body
+
+    def test_conditional_get(self):
+        feed = feeds.ScopedFeed(
+            body=b"<rss/>", etag='"abc"',
+            last_modified=datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+        )
+        assert feeds.feed_response(feed, '"abc"', None).status_code == 304
+        assert feeds.feed_response(feed, '"old"', None).status_code == 200
+        response = feeds.feed_response(
+            feed, None, "Mon, 19 Oct 2026 12:00:00 GMT"
+        )
+        assert response.status_code == 304
+        response = feeds.feed_response(
+            feed, None, "Mon, 19 Oct 2026 11:59:59 GMT"
+        )
+        assert response.status_code == 200
+        assert response.headers["Last-Modified"] == \
+            "Mon, 19 Oct 2026 12:00:00 GMT"
+        assert feeds.feed_response(feed, None, "garbage").status_code == 200
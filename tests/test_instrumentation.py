@@ -0,0 +1,49 @@
+import pytest
+from tortoise.exceptions import OperationalError
+
+from database import instrumentation
+
+
+class FlakyClient:
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    async def execute_query(self, query, values=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise self.error
+        return 1, [{"1": 1}]
+
+
+class TestTransientErrorRetry:
+
+    @pytest.fixture(autouse=True)
+    def no_backoff(self, monkeypatch):
+        monkeypatch.setattr(instrumentation, "RETRY_BACKOFF_SECONDS", 0)
+
+    @pytest.mark.asyncio
+    async def test_read_is_retried_after_transient_error(self):
+        client = FlakyClient(OperationalError(
+            Exception("Packet sequence number wrong - got 2 expected 1")
+        ))
+        execute_query = instrumentation._retried(FlakyClient.execute_query)
+
+        assert await execute_query(client, "SELECT 1") == (1, [{"1": 1}])
+        assert client.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_writes_and_query_errors_are_not_retried(self):
+        execute_query = instrumentation._retried(FlakyClient.execute_query)
+
+        client = FlakyClient(ConnectionResetError())
+        with pytest.raises(ConnectionResetError):
+            await execute_query(client, "UPDATE `series` SET `episodes`=1")
+
+        client = FlakyClient(OperationalError(
+            Exception(1054, "Unknown column 'x' in 'field list'")
+        ))
+        with pytest.raises(OperationalError):
+            await execute_query(client, "SELECT x FROM `series`")
+        assert client.calls == 1
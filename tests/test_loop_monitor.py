@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from helpers import loop_monitor
+
+
+def _stalls(location):
+    return REGISTRY.get_sample_value(
+        "chatficdb_event_loop_stalls_total", {"location": location}
+    ) or 0
+
+
+class TestLoopMonitor:
+
+    @pytest.mark.asyncio
+    async def test_blocking_call_is_reported_with_its_location(self, caplog):
+        location = "tests/test_loop_monitor.py:blocking_handler"
+
+        def blocking_handler():
+            time.sleep(0.3)
+
+        before = _stalls(location)
+        monitor = loop_monitor.LoopMonitor(asyncio.get_running_loop(), 0.1)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.1)
+            blocking_handler()
+            await asyncio.sleep(0.1)
+        finally:
+            monitor.stop()
+
+        assert _stalls(location) == before + 1
+        assert "time.sleep(0.3)" in caplog.text
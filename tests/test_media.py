@@ -0,0 +1,47 @@
+import io
+from unittest.mock import MagicMock
+
+from PIL import Image
+
+from helpers.media import build_variants, variant_key, is_optimizable, \
+    copy_shared_media
+
+
+class TestMedia:
+
+    def test_variant_key(self):
+        assert variant_key("story/abc/media/7.jpg", 480) == \
+            "story/abc/media/7.w480.webp"
+
+    def test_shared_media_is_copied_to_the_story_folder(self):
+        s3_client = MagicMock()
+        copy_shared_media(s3_client, "media-cas/9f/9f86.jpg",
+                          "story/abc/media/7.jpg")
+
+        copy = s3_client.copy_object.call_args.kwargs
+        assert copy["Key"] == "story/abc/media/7.jpg"
+        assert copy["CopySource"]["Key"] == "media-cas/9f/9f86.jpg"
+        s3_client.get_object.assert_not_called()
+
+    def test_is_optimizable(self):
+        assert is_optimizable("7.JPG")
+        assert not is_optimizable("dance.gif")
+
+    def test_build_variants(self):
+        """
+        - Variants are never upscaled.
+        - Variants keep the aspect ratio of the original.
+        """
+        image = Image.effect_noise((1200, 800), 64).convert("RGB")
+        output = io.BytesIO()
+        image.save(output, format="PNG")
+
+        width, height, variants = build_variants(
+            output.getvalue(), [480, 1080, 2000], 80
+        )
+
+        assert (width, height) == (1200, 800)
+        assert [(w, h) for w, h, _ in variants] == \
+            [(480, 320), (1080, 720), (1200, 800)]
+        for _, _, encoded in variants:
+            assert encoded[8:12] == b"WEBP"
@@ -0,0 +1,79 @@
+from cryptography.hazmat.primitives.asymmetric.ed25519 import \
+    Ed25519PrivateKey
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import settings
+from endpoints import monitoring
+from helpers import auth, metrics
+from helpers.cache import TTLCache
+
+
+def _sample(name, labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetricsMiddleware:
+
+    def test_request_is_recorded_under_route_template(self):
+        app = FastAPI()
+        app.add_middleware(metrics.MetricsMiddleware)
+
+        @app.get("/things/{thing_id}")
+        async def get_thing(thing_id: int):
+            metrics.record_query("SELECT 1", 0.01)
+            metrics.record_query("SELECT 2", 0.02)
+            return {"id": thing_id}
+
+        labels = {"route": "/things/{thing_id}"}
+        before = _sample("chatficdb_request_db_queries_sum", labels)
+
+        client = TestClient(app)
+        assert client.get("/things/1").status_code == 200
+        assert client.get("/things/2").status_code == 200
+        assert client.get("/nothing-here").status_code == 404
+
+        assert _sample("chatficdb_request_duration_seconds_count",
+                       {**labels, "method": "GET", "status": "200"}) >= 2
+        assert _sample("chatficdb_request_db_queries_sum",
+                       labels) - before == 4
+        assert _sample("chatficdb_request_duration_seconds_count",
+                       {"route": metrics.UNMATCHED_ROUTE, "method": "GET",
+                        "status": "404"}) >= 1
+
+    def test_named_cache_counts_hits_and_misses(self):
+        cache = TTLCache(maxsize=2, name="test_cache")
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        assert "a" in cache
+
+        assert _sample("chatficdb_cache_requests_total",
+                       {"cache": "test_cache", "result": "hit"}) == 1
+        assert _sample("chatficdb_cache_requests_total",
+                       {"cache": "test_cache", "result": "miss"}) == 1
+
+
+class TestMetricsEndpoint:
+
+    def test_needs_the_metrics_token(self, monkeypatch):
+        monkeypatch.setattr(settings, "METRICS_AUTH_TOKEN", "scrape-token")
+        monkeypatch.setattr(auth, "ADMIN_AUTH_TOKEN", "admin-token")
+        # Without the huey queue collector:
+        monkeypatch.setattr(metrics, "_registry", metrics.REGISTRY)
+        monkeypatch.setattr(auth, "_loaded_public_key",
+                            Ed25519PrivateKey.generate().public_key())
+        app = FastAPI()
+        app.include_router(monitoring.router)
+        client = TestClient(app)
+
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={
+            "Authorization": "Bearer wrong"
+        }).status_code != 200
+        for token in ("scrape-token", "admin-token"):
+            response = client.get("/metrics", headers={
+                "Authorization": f"Bearer {token}"
+            })
+            assert response.status_code == 200
+            assert b"chatficdb_" in response.content
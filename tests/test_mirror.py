@@ -0,0 +1,99 @@
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+
+from database import models
+from database.mirror import CatalogMirror
+from database.routing import read_only
+from endpoints import stories
+from helpers.catalog_changes import record_change, SERIES_TAGS, UPDATED
+
+
+class TestCatalogMirror:
+
+    @pytest.fixture
+    def tortoise_config(self, tortoise_config):
+        tortoise_config["connections"]["mirror"] = {
+            "engine": "tortoise.backends.sqlite",
+            "credentials": {"file_path": ":memory:", "foreign_keys": "OFF"},
+        }
+        tortoise_config["routers"] = ["database.routing.ReadReplicaRouter"]
+        return tortoise_config
+
+    @pytest_asyncio.fixture
+    async def mirror(self, database, monkeypatch):
+        mirror = CatalogMirror()
+        monkeypatch.setattr("database.routing.catalog_mirror", mirror)
+        await mirror.create_schema()
+        return mirror
+
+    @staticmethod
+    @read_only
+    async def catalog_handler():
+        series = await models.SeriesCatalog_Pydantic.from_queryset(
+            models.Series.all().order_by("idseries")
+        )
+        return [(item.name, item.numStories, item.tagList)
+                for item in series]
+
+    @pytest.mark.asyncio
+    async def test_reads_follow_the_mirror(self, mirror):
+        series = await models.Series.create(name="S", seriesGlobalId="s1",
+                                            creator="user")
+        await models.Story.create(series=series, storyGlobalId="a",
+                                  release_date=datetime.now())
+        # MySQL until the mirror is loaded:
+        assert await self.catalog_handler() == [("S", 1, [])]
+        await mirror.full_sync()
+
+        other = await models.Series.create(name="T", seriesGlobalId="t1",
+                                           creator="user")
+        tag = await models.Tag.create(tag="drama")
+        await models.SeriesTagsRel.create(series=series, tag=tag)
+        await record_change(SERIES_TAGS, UPDATED, series.idseries)
+        assert await self.catalog_handler() == [("S", 1, [])]
+
+        await mirror.refresh()
+        assert await self.catalog_handler() == [("S", 1, ["drama"]),
+                                                ("T", 0, [])]
+        # Writes and other reads stay on MySQL:
+        await other.delete()
+        assert await models.Series.all().count() == 1
+        assert len(await self.catalog_handler()) == 2
+
+        await mirror.full_sync()
+        assert len(await self.catalog_handler()) == 1
+
+    @pytest.mark.asyncio
+    async def test_text_filters_ignore_case_like_mysql(self, mirror):
+        series = await models.Series.create(name="b", seriesGlobalId="s1",
+                                            creator="user")
+        await models.Series.create(name="A", seriesGlobalId="t1",
+                                   creator="other")
+        await models.Story.create(series=series, storyGlobalId="Abc",
+                                  release_date=datetime.now())
+        await mirror.full_sync()
+
+        @read_only
+        async def handler():
+            return (
+                await models.Series.filter(creator="USER").count(),
+                await models.Story.filter(storyGlobalId__in=["abc"]).count(),
+                await models.Series.all().order_by("name").values_list(
+                    "name", flat=True
+                ),
+            )
+
+        assert await handler() == (1, 1, ["A", "b"])
+
+    @pytest.mark.asyncio
+    async def test_landing_keeps_the_submissions(self, mirror):
+        series = await models.Series.create(name="S", seriesGlobalId="s1",
+                                            creator="user")
+        await models.StorySubmission.create(series=series, title="Draft")
+        await mirror.full_sync()
+
+        landing = await stories.get_landing()
+        assert [submission["title"] for submission in
+                landing["series"][0]["submissions"]] == ["Draft"]
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+from helpers import notifications
+
+
+class TestNotifications:
+
+    @pytest.mark.asyncio
+    async def test_subscriber_receives_published_status(self, tmp_path,
+                                                        monkeypatch):
+        """
+        - Only the subscribers of the changed submission receive the status.
+        - Polling stops once the last subscriber leaves.
+        """
+        monkeypatch.setattr(notifications, "NOTIFICATIONS_DB_PATH",
+                            str(tmp_path / "notifications.db"))
+        monkeypatch.setattr(notifications, "POLL_INTERVAL_SECONDS", 0.01)
+
+        queue = notifications.subscribe(1)
+        other_queue = notifications.subscribe(2)
+        notifications.publish_status(1, 30)
+
+        assert await asyncio.wait_for(queue.get(), 2) == 30
+        assert other_queue.empty()
+
+        notifications.unsubscribe(1, queue)
+        notifications.unsubscribe(2, other_queue)
+        await asyncio.sleep(0.05)
+        assert notifications._poll_task is None
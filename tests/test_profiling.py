@@ -0,0 +1,46 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from helpers import auth, profiling
+
+
+class TestProfilingMiddleware:
+
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(auth, "ADMIN_AUTH_TOKEN", "admin-token")
+        monkeypatch.setattr(profiling, "PROFILES_DIR", str(tmp_path))
+        app = FastAPI()
+        app.add_middleware(profiling.ProfilingMiddleware)
+
+        @app.get("/latest")
+        async def latest():
+            return {"series": []}
+
+        return TestClient(app)
+
+    def test_profile_requires_admin_token(self, client):
+        response = client.get(
+            "/latest?profile=html",
+            headers={"Authorization": "Bearer someone-else"}
+        )
+        assert response.json() == {"series": []}
+
+    def test_admin_receives_profile(self, client):
+        response = client.get(
+            "/latest", headers={"Authorization": "Bearer admin-token",
+                                "X-Profile": "speedscope"}
+        )
+        assert response.headers["content-type"] == "application/json"
+        assert "speedscope" in response.json()["$schema"]
+
+    def test_stored_profile(self, client, tmp_path):
+        response = client.get(
+            "/latest?profile=store",
+            headers={"Authorization": "Bearer admin-token"}
+        )
+        assert response.json() == {"series": []}
+        profile_id = response.headers["x-profile-id"]
+        assert profiling.PROFILE_ID_PATTERN.match(profile_id)
+        assert (tmp_path / profile_id).exists()
@@ -0,0 +1,72 @@
+from datetime import date, datetime, timezone
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+
+from database import models
+from endpoints import stories
+from helpers.release_index import ReleaseIndex
+
+
+class TestProgramCalendar:
+
+    @pytest_asyncio.fixture
+    async def index(self, database, monkeypatch):
+        index = ReleaseIndex()
+        monkeypatch.setattr(stories, "release_index", index)
+        return index
+
+    @staticmethod
+    def calendar(weeks=1, tz="UTC"):
+        return stories.get_program_calendar(start=date(2026, 10, 21),
+                                            weeks=weeks, tz=tz)
+
+    @pytest.mark.asyncio
+    async def test_weeks_in_time_zone(self, index):
+        series = await models.Series.create(name="S", seriesGlobalId="s1",
+                                            creator="user")
+        # Sunday 22:10 UTC is already Monday in Istanbul (UTC+3):
+        await models.Story.create(
+            series=series, storyGlobalId="a", title="A",
+            release_date=datetime(2026, 10, 25, 22, 10, tzinfo=timezone.utc)
+        )
+        await models.Story.create(
+            series=series, storyGlobalId="b", title="B",
+            release_date=datetime(2026, 10, 19, 9, 0, tzinfo=timezone.utc)
+        )
+
+        response = await self.calendar(weeks=2)
+        assert response.weeks[0].week_start_date == "2026-10-19"
+        assert [s.title for s in response.weeks[0].stories] == ["B", "A"]
+        assert response.weeks[0].stories[1].release_date == \
+            "2026-10-25T22:30:00+00:00"
+        assert response.weeks[1].stories == []
+
+        response = await self.calendar(weeks=2, tz="Europe/Istanbul")
+        assert [s.title for s in response.weeks[0].stories] == ["B"]
+        story = response.weeks[1].stories[0]
+        assert story.release_date == "2026-10-26T01:30:00+03:00"
+        assert story.series_name == "S"
+
+        with pytest.raises(HTTPException) as error:
+            await self.calendar(tz="Mars/Olympus")
+        assert error.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_upsert_moves_a_story(self, index):
+        series = await models.Series.create(name="S", seriesGlobalId="s1",
+                                            creator="user")
+        await index.ensure_loaded()
+        story = await models.Story.create(
+            series=series, storyGlobalId="a", title="A",
+            release_date=datetime(2026, 10, 20, 12, tzinfo=timezone.utc)
+        )
+        index.upsert(story, series)
+        story.release_date = datetime(2026, 10, 28, 12, tzinfo=timezone.utc)
+        index.upsert(story, series)
+
+        assert len(index) == 1
+        response = await self.calendar(weeks=2)
+        assert response.weeks[0].stories == []
+        assert response.weeks[1].stories[0].storyGlobalId is None
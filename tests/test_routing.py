@@ -0,0 +1,41 @@
+import pytest
+import pytest_asyncio
+from tortoise import Tortoise
+
+import settings
+from database import models
+from database.routing import read_only, read_from_primary
+
+
+class TestReadReplicaRouting:
+
+    @pytest.fixture
+    def tortoise_config(self, tortoise_config):
+        tortoise_config["connections"]["read"] = "sqlite://:memory:"
+        tortoise_config["routers"] = ["database.routing.ReadReplicaRouter"]
+        return tortoise_config
+
+    @pytest_asyncio.fixture
+    async def databases(self, database, monkeypatch):
+        monkeypatch.setattr(settings, "READ_CONNECTION_NAME", "read")
+        await Tortoise.get_connection("read").execute_script(
+            "CREATE TABLE IF NOT EXISTS tags ("
+            "idtag INTEGER PRIMARY KEY, tag VARCHAR(45) NOT NULL)"
+        )
+
+    @pytest.mark.asyncio
+    async def test_only_read_only_handlers_read_from_replica(self, databases):
+        await models.Tag.create(tag="written-to-primary")
+
+        @read_only
+        async def catalog_handler():
+            return await models.Tag.all().count()
+
+        @read_only
+        async def own_drafts_handler():
+            read_from_primary()
+            return await models.Tag.all().count()
+
+        assert await catalog_handler() == 0
+        assert await own_drafts_handler() == 1
+        assert await models.Tag.all().count() == 1
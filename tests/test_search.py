@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+
+from database import models
+from endpoints import stories
+from helpers.search_index import SearchIndex
+
+
+class TestSearch:
+
+    @pytest_asyncio.fixture
+    async def index(self, database, monkeypatch):
+        index = SearchIndex()
+        monkeypatch.setattr(stories, "search_index", index)
+        return index
+
+    @staticmethod
+    def search(q, tags_required=()):
+        return stories.search_catalog(q=q, tags_required=list(tags_required),
+                                      limit=20)
+
+    @pytest.mark.asyncio
+    async def test_prefix_and_tag_search(self, index):
+        series = await models.Series.create(name="Café Detectives",
+                                            seriesGlobalId="s1",
+                                            creator="writer")
+        draft = await models.Series.create(name="Detective Draft",
+                                           seriesGlobalId="s2",
+                                           creator="writer")
+        tag = await models.Tag.create(tag="mystery")
+        await models.SeriesTagsRel.create(series=series, tag=tag)
+        await models.Story.create(series=series, storyGlobalId="a",
+                                  title="The Missing Cup", author="Ann",
+                                  description="A detective story",
+                                  release_date=datetime.now()
+                                  - timedelta(days=1))
+        await models.Story.create(series=draft, storyGlobalId="b",
+                                  title="Detective soon",
+                                  release_date=datetime.now()
+                                  + timedelta(days=1))
+
+        response = await self.search("cafe DETEC")
+        assert [s.seriesGlobalId for s in response.series] == ["s1"]
+        assert response.series[0].tagList == ["mystery"]
+        assert response.stories == []
+
+        response = await self.search("detective")
+        assert [s.storyGlobalId for s in response.stories] == ["a"]
+        assert len(response.series) == 1
+
+        assert (await self.search("cup", ["mystery"])).isFound
+        assert not (await self.search("cup", ["romance"])).isFound
+        assert not (await self.search("cupcake")).isFound
+
+    @pytest.mark.asyncio
+    async def test_updates_without_reload(self, index):
+        await index.ensure_loaded()
+        series = await models.Series.create(name="Night Shift",
+                                            seriesGlobalId="s1",
+                                            creator="writer")
+        index.add_series(series)
+        story = await models.Story.create(series=series, storyGlobalId="a",
+                                          title="Pilot",
+                                          release_date=datetime.now())
+        assert not (await self.search("night")).isFound
+        index.add_story(story)
+        assert (await self.search("night")).series[0].name == "Night Shift"
+
+        series.name = "Day Shift"
+        index.add_series(series)
+        assert not (await self.search("night")).isFound
+        index.set_series_tags(series.idseries, ["drama"])
+        assert (await self.search("day", ["drama"])).isFound
+
+        # Rows written by other workers come with the next refresh:
+        other = await models.Series.create(name="Nightfall",
+                                           seriesGlobalId="s2",
+                                           creator="writer")
+        await models.Story.create(series=other, storyGlobalId="b",
+                                  release_date=datetime.now())
+        await index.refresh()
+        assert (await self.search("nightf")).isFound
@@ -0,0 +1,46 @@
+import pytest
+
+from helpers import slow_queries
+
+
+class TestSlowQueries:
+
+    @pytest.fixture(autouse=True)
+    def database(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(slow_queries, "SLOW_QUERIES_DB_PATH",
+                            str(tmp_path / "slow_queries.db"))
+
+    def test_literals_and_in_lists_share_a_shape(self):
+        first = slow_queries.normalize_query(
+            "SELECT `idstory` FROM `stories` WHERE `storyGlobalId`='abc'"
+            " AND `series_id` IN (1,2,3) LIMIT 10"
+        )
+        second = slow_queries.normalize_query(
+            "SELECT `idstory` FROM `stories`\n WHERE `storyGlobalId`='xyz'"
+            " AND `series_id` IN (%s) LIMIT %s"
+        )
+        assert first == second == (
+            "SELECT `idstory` FROM `stories` WHERE `storyGlobalId`=?"
+            " AND `series_id` IN (?+) LIMIT ?"
+        )
+
+    def test_slow_queries_are_aggregated_by_shape(self):
+        assert slow_queries.record_slow_query(
+            "SELECT * FROM `series` WHERE `idseries`=1", 300, "GET /series"
+        )
+        slow_queries.record_slow_query(
+            "SELECT * FROM `series` WHERE `idseries`=2", 500, "GET /latest"
+        )
+        slow_queries.store_explain(
+            "SELECT * FROM `series` WHERE `idseries`=3", [{"type": "const"}]
+        )
+        assert not slow_queries.record_slow_query(
+            "SELECT * FROM `series` WHERE `idseries`=4", 400, "GET /latest"
+        )
+
+        [query] = slow_queries.get_slow_queries()
+        assert query["count"] == 3
+        assert query["avg_ms"] == 400
+        assert query["max_ms"] == 500
+        assert query["endpoints"] == {"GET /latest": 2, "GET /series": 1}
+        assert query["explain"] == [{"type": "const"}]
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+
+from database import models
+from endpoints import stories
+from endpoints.response_models import SeriesBasicModel, SeriesPartialModel
+
+
+class TestSparseFields:
+
+    @pytest_asyncio.fixture
+    async def database(self, database):
+        series = await models.Series.create(name="S", seriesGlobalId="s1",
+                                            creator="user")
+        tag = await models.Tag.create(tag="drama")
+        await models.SeriesTagsRel.create(series=series, tag=tag)
+        for number, days in enumerate((-2, -1, 1)):
+            await models.Story.create(
+                series=series, storyGlobalId=f"a{number}", title=f"T{number}",
+                release_date=datetime.now() + timedelta(days=days)
+            )
+
+    @staticmethod
+    def get_series(fields):
+        return stories.get_series(
+            page=1, storyGlobalId=None, sort_by="new", tags_required=[],
+            include_drafts=False, authorization=None, creator=None,
+            fields=fields
+        )
+
+    @pytest.mark.asyncio
+    async def test_series_fields(self, database):
+        full = await self.get_series(None)
+        sparse = await self.get_series("seriesGlobalId,numStories,tagList")
+
+        assert sparse.model_dump(exclude_unset=True)["series"] == [
+            {"seriesGlobalId": "s1", "numStories": 2, "tagList": ["drama"]}
+        ]
+        assert full.series[0].numStories == sparse.series[0].numStories
+        # Without fields= the items keep their required fields:
+        assert type(full.series[0]) is SeriesBasicModel
+        assert type(sparse.series[0]) is SeriesPartialModel
+
+    @pytest.mark.asyncio
+    async def test_story_fields(self, database):
+        response = await stories.get_stories(
+            page=1, seriesGlobalId=None, from_series_of_story=None,
+            sort_by="date", tags_required=[], include_upcoming=0,
+            authorization=None, username=None, fields="storyGlobalId, title"
+        )
+        assert response.model_dump(exclude_unset=True)["stories"] == [
+            {"storyGlobalId": "a0", "title": "T0"},
+            {"storyGlobalId": "a1", "title": "T1"},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_unknown_fields_are_rejected(self, database):
+        with pytest.raises(HTTPException) as error:
+            await self.get_series("name,story_text")
+        assert error.value.status_code == 400
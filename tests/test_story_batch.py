@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+
+from database import models
+from endpoints import stories
+from helpers import story_lookup
+
+
+class TestStoryBatch:
+
+    @pytest_asyncio.fixture
+    async def database(self, database):
+        story_lookup._unknown_story_ids.clear()
+
+    @pytest.mark.asyncio
+    async def test_status_per_id_and_unknown_ids_are_cached(self, database):
+        series = await models.Series.create(name="S", seriesGlobalId="s1",
+                                            creator="user")
+        await models.Story.create(series=series, storyGlobalId="published",
+                                  title="Out", release_date=datetime.now())
+        await models.Story.create(series=series, storyGlobalId="scheduled",
+                                  title="Soon",
+                                  release_date=datetime.now()
+                                  + timedelta(days=1))
+
+        response = await stories.get_story_batch(
+            ids=["published", "scheduled", "missing", "published"]
+        )
+        assert list(response.stories) == ["published", "scheduled",
+                                          "missing"]
+        assert response.stories["published"].title == "Out"
+        assert response.stories["scheduled"].status == "unpublished"
+        assert response.stories["scheduled"].title is None
+        assert response.stories["missing"].status == "not_found"
+
+        # The negative cache answers, even once the id exists:
+        await models.Story.create(series=series, storyGlobalId="missing",
+                                  release_date=datetime.now())
+        response = await stories.get_story_batch(ids=["missing"])
+        assert response.stories["missing"].status == "not_found"
+        assert not (await stories.get_story(storyGlobalId="missing")).isFound
+
+    @pytest.mark.asyncio
+    async def test_ids_of_submissions_are_not_cached(self, database):
+        series = await models.Series.create(name="S", seriesGlobalId="s1",
+                                            creator="user")
+        await models.StorySubmission.create(series=series,
+                                            storyGlobalId="pending")
+
+        response = await stories.get_story_batch(ids=["pending"])
+        assert response.stories["pending"].status == "not_found"
+        assert not (await stories.get_story(storyGlobalId="pending")).isFound
+
+        # Converted, possibly by another worker:
+        await models.Story.create(series=series, storyGlobalId="pending",
+                                  title="Out", description="D", author="A",
+                                  release_date=datetime.now())
+        response = await stories.get_story_batch(ids=["pending"])
+        assert response.stories["pending"].status == "published"
+        assert (await stories.get_story(storyGlobalId="pending")).isFound